@@ -1,52 +1,89 @@
+import os
+import time
+
 import streamlit as st
 import pandas as pd
-import joblib
-import matplotlib.pyplot as plt
-import numpy as np
-from sklearn.metrics import mean_squared_error
 import plotly.graph_objects as go
 
+import forecast_cache
+import instrumentation
+import scenarios
+from model_pool import ModelPool, PoolTimeout
+from model_resolver import ModelResolver, set_label
+from forecasting import (
+    EXOG_COLS,
+    data_version,
+    exog_candidates,
+    forecast_mode,
+    load_data,
+    load_serving_data,
+    prebuilt_flags,
+    rmse as rmse_of,
+    run_forecast,
+    serving_version,
+    split_train_test,
+)
+
 # ---------------------------------------------------
 # 1️⃣ PAGE SETUP
 # ---------------------------------------------------
 st.set_page_config(page_title="SARIMAX Forecast App", layout="wide")
+
+# per-section wall / CPU / memory for this rerun (instrumentation.py);
+# shown with ?diagnostics=1 or APP_DIAGNOSTICS=1
+profile = instrumentation.RerunProfile(mode=forecast_mode())
+profile.section("page_setup")
+
+@st.cache_resource
+def start_metrics_server():
+    # GET /metrics in Prometheus text format when APP_METRICS_PORT is set
+    return instrumentation.serve_metrics()
+
+start_metrics_server()
 st.title("SARIMAX Forecast with Multiple Exogenous Models")
 
 # ---------------------------------------------------
 # 2️⃣ LOAD DATA
 # ---------------------------------------------------
-@st.cache_data
-def load_data():
-    data = pd.read_csv("../../data/processed/fact_shelter.csv")
-    exog = pd.read_csv("../data/datedf.csv")
-
-    data["report_date"] = pd.to_datetime(data["report_date"])
-    exog["month_date"] = pd.to_datetime(exog["month_date"])
+# keyed on the input files' size + mtime, so regenerated CSVs are picked
+# up on the next rerun instead of after a restart
+profile.section("load_data")
 
-    data = data.set_index("report_date").sort_index()
-    exog = exog.set_index("month_date").sort_index()
-
-    data = data.loc["2016-01-01":"2022-12-31"]
-    exog = exog.loc["2016-01-01":"2022-12-31"]
-
-    return data, exog
+@st.cache_data
+def get_data(version):
+    instrumentation.cache_miss("data")
+    return load_data()
 
-data, exog = load_data()
-target = data.squeeze()
+profile.cache("data")
+data, exog = get_data(data_version())
 
 # ---------------------------------------------------
 # 3️⃣ SIDEBAR TOGGLES (RESTORED ORIGINAL VERSION)
 # ---------------------------------------------------
+profile.section("sidebar")
 st.sidebar.header("Exogenous Variables")
 st.sidebar.info(
     "Select which exogenous variables to include in the forecast.\n"
-    "The app will automatically choose the correct SARIMAX model."
+    "The app will automatically choose the correct SARIMAX model.\n"
+    "Combinations without a pre-built model are fitted on first use."
 )
 
 use_covid = st.sidebar.checkbox("Include covid_dummy", value=True)
 use_affordable = st.sidebar.checkbox("Include affordable_demo", value=True)
+with st.sidebar.expander("More exogenous variables"):
+    extra_cols = [
+        col for col in exog_candidates(exog)
+        if col not in EXOG_COLS and st.checkbox(f"Include {col}", value=False)
+    ]
+exog_cols = [col for col, on in zip(EXOG_COLS, (use_covid, use_affordable)) if on] + extra_cols
+profile.tags["exog"] = set_label(exog_cols)
 
-exog_cols = ['covid_dummy', 'affordable_demo']
+# refitted models are published to the registry (model_registry.py); the
+# version is resolved once per rerun, so a switch is picked up on the next
+# rerun without a restart and data + model always come from one version.
+# Sets without a pre-built model are fit on load_data() (model_resolver.py).
+prebuilt = prebuilt_flags(exog_cols)
+model_version = serving_version(*prebuilt) if prebuilt else None
 
 with st.sidebar.expander("What are these exogenous variables?"):
     st.markdown("""
@@ -64,55 +101,115 @@ external shocks and policy influences.
 # ---------------------------------------------------
 # 4️⃣ TRAIN / TEST SPLIT
 # ---------------------------------------------------
-train_size = int(len(target) * 0.8)
-train = target.iloc[:train_size]
-test = target.iloc[train_size:]
+profile.section("split")
+
+@st.cache_data
+def get_version_data(covid, affordable, version):
+    instrumentation.cache_miss("version_data")
+    return load_serving_data(covid, affordable, version)
 
-train_exog = exog[exog_cols].iloc[:train_size].copy()
-test_exog = exog[exog_cols].iloc[train_size:].copy()
+if model_version is not None:
+    # the frame this version was fit and evaluated on
+    profile.cache("version_data")
+    data, exog = get_version_data(*prebuilt, model_version)
+target = data.squeeze()
+train, test, train_exog, test_exog = split_train_test(target, exog, exog_cols)
 
 # ---------------------------------------------------
 # 5️⃣ LOAD THE CORRECT SARIMAX MODEL
+#    (FORECAST_MODE=cache serves precomputed forecasts
+#     from forecast_cache.json and never loads a model)
 # ---------------------------------------------------
-def load_model_by_exog(covid: bool, affordable: bool):
-    if covid and affordable:
-        filename = "../data/sarimax_both.pkl"
-    elif covid and not affordable:
-        filename = "../data/sarimax_covid.pkl"
-    elif not covid and affordable:
-        filename = "../data/sarimax_aff.pkl"
-    else:
-        filename = "../data/sarimax_none.pkl"
-    return joblib.load(open(filename, "rb"))
+# one resolver per process: its LRU of models is shared by every session,
+# and the most-used exog sets are loaded / fit in the background at startup
+@st.cache_resource
+def get_resolver():
+    resolver = ModelResolver()
+    if forecast_mode() != "cache":
+        resolver.warm_up()
+    return resolver
 
+resolver = get_resolver()
+model_tag = resolver.tag(exog_cols, model_version)
+
+def get_model(cols, version):
+    # a miss is loading the artifact, or fitting it in a background process
+    future = resolver.request(cols, version)
+    if future.source != "cache":
+        instrumentation.cache_miss("model")
+    if not future.done():
+        bar = st.progress(0.0)
+        while not future.done():
+            bar.progress(
+                resolver.progress(future),
+                text=f"Fitting {profile.tags['exog']} on first use ({time.monotonic() - future.started:.0f}s)",
+            )
+            time.sleep(0.2)
+        bar.empty()
+    try:
+        return future.result()
+    except Exception as e:
+        st.error(f"Could not fit a model on {', '.join(cols)}: {e}")
+        st.stop()
+
+# cached models are shared by every session: all forecasting goes through
+# the pool (bounded concurrency, per-slot copies where needed)
 @st.cache_resource
-def get_model(covid, affordable):
-    return load_model_by_exog(covid, affordable)
+def get_pool():
+    return ModelPool()
 
-sarimax_model = get_model(use_covid, use_affordable)
+pool = get_pool()
 
-# ---------------------------------------------------
-# 6️⃣ PREPARE EXOG FOR FORECAST
-# ---------------------------------------------------
-expected_cols = sarimax_model.model.exog_names if sarimax_model.model.k_exog > 0 else []
-forecast_exog = test_exog[expected_cols].iloc[:len(test)] if expected_cols else None
+@st.cache_data
+def get_forecast_cache():
+    instrumentation.cache_miss("forecast_cache")
+    return forecast_cache.load_cache()
 
-# ---------------------------------------------------
-# 7️⃣ FORECAST
-# ---------------------------------------------------
-forecast_obj = sarimax_model.get_forecast(steps=len(test), exog=forecast_exog)
-forecast = forecast_obj.predicted_mean
-conf_int = forecast_obj.conf_int()
+use_cache = forecast_mode() == "cache"
 
-# ---------------------------------------------------
-# 8️⃣ METRICS
-# ---------------------------------------------------
-rmse = np.sqrt(mean_squared_error(test.values, forecast.values))
-rmse = round(rmse, 2)
+if use_cache:
+    profile.section("cache_lookup")
+    profile.cache("forecast_cache")
+    if prebuilt is None:
+        st.error("The forecast cache only holds the covid_dummy / affordable_demo models. "
+                 "Unselect the other variables, or use FORECAST_MODE=live.")
+        st.stop()
+    try:
+        forecast, conf_int, rmse, model_summary = forecast_cache.lookup(
+            get_forecast_cache(), *prebuilt, horizon=len(test)
+        )
+    except (FileNotFoundError, KeyError, forecast_cache.StaleCacheError) as e:
+        st.error(f"Forecast cache unavailable: {e}. Rebuild it with `python forecast_cache.py`.")
+        st.stop()
+    rmse = round(rmse, 2)
+else:
+    # a miss here is unpickling / rebuilding the model
+    profile.section("load_model")
+    profile.cache("model")
+    sarimax_model = get_model(exog_cols, model_version)
+
+    # ---------------------------------------------------
+    # 6️⃣ + 7️⃣ PREPARE EXOG AND FORECAST
+    # ---------------------------------------------------
+    profile.section("forecast")
+    try:
+        forecast, conf_int = pool.run(sarimax_model, run_forecast, test, test_exog)
+    except PoolTimeout as e:
+        st.error(f"The forecast service is busy ({e}). Please retry in a moment.")
+        st.stop()
+
+    # ---------------------------------------------------
+    # 8️⃣ METRICS
+    # ---------------------------------------------------
+    profile.section("metrics")
+    rmse = round(rmse_of(test.values, forecast.values), 2)
+    profile.section("model_summary")
+    model_summary = sarimax_model.summary()
 
 # ---------------------------------------------------
 # 9️⃣ INTERACTIVE PLOT WITH PLOTLY
 # ---------------------------------------------------
+profile.section("build_plot")
 fig = go.Figure()
 fig.add_trace(go.Scatter(x=train.index, y=train.values, mode='lines', name='Train'))
 fig.add_trace(go.Scatter(x=test.index, y=test.values, mode='lines', name='Test'))
@@ -127,6 +224,8 @@ fig.update_layout(
 # ---------------------------------------------------
 # 🔟 DISPLAY METRICS + PLOT
 # ---------------------------------------------------
+# (plotly_chart is where the figure gets serialized)
+profile.section("display")
 col1, col2 = st.columns([1,2])
 col1.metric("RMSE", round(rmse), "Average Error in Predicted Shelter Count")
 col2.plotly_chart(fig, use_container_width=True)
@@ -135,7 +234,7 @@ col2.plotly_chart(fig, use_container_width=True)
 # 1️⃣1️⃣ MODEL SUMMARY
 # ---------------------------------------------------
 with st.expander("View SARIMAX Model Summary"):
-    st.text(sarimax_model.summary())
+    st.text(model_summary)
 
 # ---------------------------------------------------
 # DOWNLOAD FORECAST + KPI CARDS
@@ -146,4 +245,132 @@ forecast_df = pd.DataFrame({
 
 col1, col2, col3 = st.columns(3)
 col1.metric("Train Size", len(train))
-col3.metric("Test Size", len(test))
\ No newline at end of file
+col3.metric("Test Size", len(test))
+# ---------------------------------------------------
+# WHAT-IF SCENARIOS
+#    (all paths are priced in one vectorized pass by scenarios.py)
+# ---------------------------------------------------
+profile.section("scenarios")
+st.header("What-if Scenarios")
+
+if use_cache:
+    st.info("Scenarios run the SARIMAX model directly; they are unavailable with FORECAST_MODE=cache.")
+else:
+    sc_col1, sc_col2 = st.columns(2)
+    horizon = sc_col1.slider("Months ahead (from end of training data)", 6, 60, max(len(test), 12))
+    levels = sc_col1.multiselect(
+        "affordable_demo multipliers",
+        [0.0, 0.5, 1.0, 1.5, 2.0, 3.0],
+        default=[0.5, 1.0, 2.0],
+        disabled=not use_affordable,
+    )
+    add_shock = sc_col2.checkbox("Add a COVID-style shock", value=False, disabled=not use_covid)
+    shock_start, shock_len = 0, 0
+    if add_shock:
+        shock_start = sc_col2.slider("Shock starts at month", 1, horizon, 1) - 1
+        shock_len = sc_col2.slider("Shock length (months)", 1, 24, 6)
+
+    # keyed by the resolver's tag, which changes whenever the served model does
+    @st.cache_data
+    def get_exog_response(_model, tag, steps):
+        instrumentation.cache_miss("exog_response")
+        return pool.run(_model, scenarios.exog_response, steps)
+
+    baseline = pool.run(sarimax_model, scenarios.baseline_path, test_exog, horizon)
+    shocks = [None, (shock_start, shock_len)] if add_shock else [None]
+    sc_names, sc_paths = scenarios.scenario_grid(baseline, levels or [1.0], shocks)
+    profile.cache("exog_response")
+    sc_index, sc_stack = scenarios.evaluate_paths(
+        sarimax_model, sc_paths, response=get_exog_response(sarimax_model, model_tag, horizon)
+    )
+
+    sc_fig = go.Figure()
+    sc_fig.add_trace(go.Scatter(x=target.index, y=target.values, mode='lines', name='Actual'))
+    for name, path in zip(sc_names, sc_stack):
+        sc_fig.add_trace(go.Scatter(x=sc_index, y=path[:, scenarios.MEAN], mode='lines', name=name))
+    sc_fig.update_layout(title="Scenario Forecasts", xaxis_title="Date", yaxis_title="Shelter Count")
+    st.plotly_chart(sc_fig, use_container_width=True)
+    st.dataframe(scenarios.summarize(sc_names, sc_index, sc_stack).round(0))
+
+# ---------------------------------------------------
+# MODEL IDENTIFICATION
+#    (ACF / PACF, stationarity tests and candidate orders per series;
+#     series_diagnostics.py caches them on disk by content hash; imported
+#     and computed inline only once the panel is opened)
+# ---------------------------------------------------
+profile.section("series_diagnostics")
+st.header("Model Identification")
+
+@st.cache_data
+def get_series_diagnostics(version):
+    instrumentation.cache_miss("series_diagnostics")
+    return series_diagnostics.diagnose_all(series_diagnostics.input_series(*load_data()), workers=1)
+
+if st.checkbox("Show series diagnostics", value=False):
+    import series_diagnostics
+    profile.cache("series_diagnostics")
+    diagnostics = get_series_diagnostics(data_version())
+    st.dataframe(series_diagnostics.summary_table(diagnostics).drop(columns="cached").round(3))
+
+    series_name = st.selectbox("Series", list(diagnostics))
+    result = diagnostics[series_name]
+    if result["error"]:
+        st.error(f"Diagnostics failed for {series_name}: {result['error']}")
+    else:
+        (p, d, q), (P, D, Q, s) = result["hints"]["order"], result["hints"]["seasonal_order"]
+        st.caption(
+            f"Suggested order ({p},{d},{q}) ({P},{D},{Q},{s}); "
+            f"ACF / PACF after {d} regular and {D} seasonal difference(s), "
+            f"band ±{result['band']:.3f}"
+        )
+        id_col1, id_col2 = st.columns(2)
+        for col, key in ((id_col1, "acf"), (id_col2, "pacf")):
+            lags = list(range(1, len(result[key])))
+            id_fig = go.Figure(go.Bar(x=lags, y=result[key][1:], name=key.upper()))
+            for bound in (result["band"], -result["band"]):
+                id_fig.add_hline(y=bound, line_dash="dash", line_color="gray")
+            id_fig.update_layout(title=key.upper(), xaxis_title="Lag", height=300)
+            col.plotly_chart(id_fig, use_container_width=True)
+        st.dataframe(pd.DataFrame(result["tests"]).T.round(3))
+
+# ---------------------------------------------------
+# DIAGNOSTICS (hidden: ?diagnostics=1 or APP_DIAGNOSTICS=1)
+# ---------------------------------------------------
+last_run = profile.finish()
+
+if st.query_params.get("diagnostics") == "1" or os.environ.get("APP_DIAGNOSTICS") == "1":
+    st.header("Diagnostics")
+    stages = pd.DataFrame(instrumentation.stage_rows())
+    dg_col1, dg_col2 = st.columns(2)
+    dg_col1.subheader("This rerun")
+    dg_col1.caption(
+        f"{last_run['wall_ms']:.0f} ms wall, {last_run['cpu_ms']:.0f} ms CPU, "
+        f"caches: {last_run['caches']}"
+    )
+    dg_col1.dataframe(pd.DataFrame(last_run["stages"]).set_index("stage").round(2))
+    ps = pool.stats()
+    dg_col1.caption(
+        f"model pool: {ps['size']} slots, {ps['runs']} runs, {ps['waited']} queued "
+        f"(max {ps['max_waiting']} waiting, max wait {1000 * ps['max_wait_s']:.1f} ms), "
+        f"{ps['timeouts']} timeouts"
+    )
+    rs = resolver.stats()
+    dg_col1.caption(
+        f"serving {model_tag}; model cache: {rs['models']} models, "
+        f"{rs['nbytes'] / 2**20:.1f} of {rs['max_bytes'] / 2**20:.0f} MB, {rs['hits']} hits, "
+        f"{rs['misses']} misses, {rs['evictions']} evictions, {rs['fits']} fits ({rs['pending']} running)"
+    )
+    dg_col2.subheader(f"Last {stages['run'].nunique()} reruns (this process)")
+    dg_col2.dataframe(
+        stages.groupby(["stage", "exog"], sort=False)["wall_ms"]
+        .describe(percentiles=[0.5, 0.95])[["count", "50%", "95%", "max"]]
+        .round(2)
+    )
+    dg_col1.download_button(
+        "Download timings (JSON lines)", instrumentation.jsonl_lines(),
+        file_name="app_timings.jsonl", mime="application/json",
+    )
+    dg_col2.download_button(
+        "Download metrics (Prometheus text)", instrumentation.prometheus_text(),
+        file_name="app_metrics.prom", mime="text/plain",
+    )
@@ -0,0 +1,184 @@
+"""
+COMPACT MODEL ARTIFACTS
+
+A fitted statsmodels results object pickles the whole training series, the
+smoothed states and every filter output. To forecast we only need:
+
+- the model spec (class, order, seasonal order, trend, exog names)
+- the fitted parameter vector
+- the final filtered state and its covariance
+
+This module saves exactly that as a small JSON file and rebuilds a
+forecast-capable results object from it, so the app no longer depends on
+statsmodels' internal pickle layout.
+
+USAGE
+    python artifacts.py ../data/arima_model.pkl ../data/sarima_model.pkl
+    (writes arima_model.json / sarima_model.json next to each pickle)
+"""
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from forecast_runtime import export_state_space
+
+ARTIFACT_VERSION = 1
+
+
+# ---------------------------------------------------
+# SAVE
+# ---------------------------------------------------
+def _spec_from_results(results) -> dict:
+    model = results.model
+    model_class = type(model).__name__
+
+    # ARIMA carries its trend as an extra 'const' exog column;
+    # only keep the user-facing exog names so we can rebuild the model
+    exog_names = list(model.exog_names or [])
+    if model_class == "ARIMA" and "const" in exog_names:
+        exog_names.remove("const")
+
+    index = model._index
+    freq = getattr(index, "freqstr", None)
+
+    return {
+        "model_class": model_class,
+        "order": list(model.order),
+        "seasonal_order": list(model.seasonal_order),
+        "trend": model.trend,
+        "enforce_stationarity": bool(model.enforce_stationarity),
+        "enforce_invertibility": bool(model.enforce_invertibility),
+        "exog_names": exog_names,
+        "endog_name": model.endog_names,
+        "freq": freq,
+        "last_date": str(index[-1].date()) if freq else None,
+        "nobs": int(results.nobs),
+    }
+
+
+def to_artifact(results) -> dict:
+    """Reduce a fitted SARIMAX/ARIMA results object to a JSON-safe dict."""
+    fr = results.filter_results
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "spec": _spec_from_results(results),
+        "param_names": list(results.model.param_names),
+        "params": np.asarray(results.params, dtype=float).tolist(),
+        "filtered_state": fr.filtered_state[:, -1].tolist(),
+        "filtered_state_cov": fr.filtered_state_cov[:, :, -1].tolist(),
+        "fit_stats": {
+            "aic": float(results.aic),
+            "bic": float(results.bic),
+            "llf": float(results.llf),
+        },
+        "summary": str(results.summary()),
+    }
+
+    # system matrices for the NumPy-only runtime (forecast_runtime.py),
+    # taken from the rebuilt model so they match what from_artifact serves
+    state_space = export_state_space(from_artifact(artifact))
+    if state_space is not None:
+        artifact["state_space"] = state_space
+    return artifact
+
+
+def save_artifact(results, path) -> Path:
+    path = Path(path)
+    path.write_text(json.dumps(to_artifact(results)))
+    return path
+
+
+# ---------------------------------------------------
+# LOAD
+# ---------------------------------------------------
+class CompactResults:
+    """
+    Forecast-capable stand-in for a fitted SARIMAX results object.
+
+    The underlying statsmodels model holds a single missing observation at
+    the last training date, initialised with the stored filtered state, so
+    forecasts continue exactly where the original fit stopped.
+    """
+
+    def __init__(self, artifact: dict, results):
+        self.artifact = artifact
+        self.spec = artifact["spec"]
+        self._results = results
+        self.model = results.model
+        self.params = pd.Series(artifact["params"], index=artifact["param_names"])
+        self.nobs = self.spec["nobs"]
+        self.aic = artifact["fit_stats"]["aic"]
+        self.bic = artifact["fit_stats"]["bic"]
+        self.llf = artifact["fit_stats"]["llf"]
+
+    def get_forecast(self, steps=1, exog=None, **kwargs):
+        return self._results.get_forecast(steps=steps, exog=exog, **kwargs)
+
+    def forecast(self, steps=1, exog=None, **kwargs):
+        return self._results.forecast(steps=steps, exog=exog, **kwargs)
+
+    def summary(self):
+        # the summary needs the training data, so it is rendered at save time
+        return self.artifact["summary"]
+
+
+def build_model(spec: dict, endog, exog):
+    kwargs = dict(
+        order=tuple(spec["order"]),
+        seasonal_order=tuple(spec["seasonal_order"]),
+        trend=spec["trend"],
+        enforce_stationarity=spec.get("enforce_stationarity", True),
+        enforce_invertibility=spec.get("enforce_invertibility", True),
+    )
+    if spec["model_class"] == "ARIMA":
+        from statsmodels.tsa.arima.model import ARIMA
+        return ARIMA(endog, exog=exog, **kwargs)
+
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    return SARIMAX(endog, exog=exog, **kwargs)
+
+
+def from_artifact(artifact: dict) -> CompactResults:
+    if artifact.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported artifact version: {artifact.get('version')}")
+
+    spec = artifact["spec"]
+
+    if spec["freq"]:
+        index = pd.DatetimeIndex([spec["last_date"]], freq=spec["freq"])
+    else:
+        index = pd.RangeIndex(spec["nobs"] - 1, spec["nobs"])
+
+    endog = pd.Series([np.nan], index=index, name=spec["endog_name"])
+    exog = None
+    if spec["exog_names"]:
+        exog = pd.DataFrame(0.0, index=index, columns=spec["exog_names"])
+
+    model = build_model(spec, endog, exog)
+
+    # the "known" initial state is the final filtered state of the original
+    # fit; with a missing observation the filter simply carries it forward
+    state = np.asarray(artifact["filtered_state"])
+    state_cov = np.asarray(artifact["filtered_state_cov"])
+    model.initialize_known(state, state_cov)
+    results = model.filter(np.asarray(artifact["params"]))
+
+    return CompactResults(artifact, results)
+
+
+def load_artifact(path) -> CompactResults:
+    return from_artifact(json.loads(Path(path).read_text()))
+
+
+# ---------------------------------------------------
+# CONVERT EXISTING PICKLES
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import joblib
+
+    for pkl in sys.argv[1:]:
+        out = save_artifact(joblib.load(pkl), Path(pkl).with_suffix(".json"))
+        print(f"{pkl} -> {out} ({out.stat().st_size:,} bytes)")
@@ -0,0 +1,202 @@
+"""
+COLUMNAR ON-DISK CACHE FOR THE PROCESSED TABLES
+
+PURPOSE
+Parsing the processed CSVs (and their dates) on every process start is
+slow, and st.cache_data cannot tell when a CSV has been regenerated. This
+module keeps a columnar copy of each table that is read back memory-mapped
+(no parsing, no copy) and is rebuilt automatically when its source changes.
+Maps are copy-on-write, so callers may modify the frames they get back
+without touching the cache.
+
+LAYOUT
+Each table is cached next to its source file:
+
+    <source dir>/.columnar/<source stem>/
+        meta.json          source fingerprint + column layout
+        <i>.npy            one array per column (names in meta.json)
+
+- numeric and datetime64 columns are stored as-is
+- text columns are stored as int32 category codes (-1 = missing) with
+  the categories in meta.json, and come back as pandas Categoricals
+
+INVALIDATION
+meta.json records the source's size, mtime and sha256. A read first
+compares size + mtime (a stat call); only when those moved is the file
+re-hashed, and only when the content changed is the table rebuilt.
+
+USAGE
+    from columnar_cache import read_table
+    df = read_table(path)                      # cached, memory-mapped
+
+    python columnar_cache.py <csv> [<csv> ...] # (re)build caches, e.g. after the ETL
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+CACHE_DIRNAME = ".columnar"
+
+# date columns per known table; everything else is read with default dtypes
+DATE_COLUMNS = {
+    "fact_shelter": ["report_date"],
+    "fact_demolitions": ["month_date", "date_filed", "date_completed"],
+    "datedf": ["month_date"],
+    "dhs_metrics": ["report_date"],
+}
+
+
+# ---------------------------------------------------
+# FINGERPRINTS
+# ---------------------------------------------------
+def cache_dir(source) -> Path:
+    source = Path(source)
+    return source.parent / CACHE_DIRNAME / source.stem
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def stat_key(path):
+    """Cheap change key for a source file: (size, mtime_ns)."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _read_meta(directory: Path):
+    try:
+        meta = json.loads((directory / "meta.json").read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def _write_meta(directory: Path, meta: dict) -> None:
+    tmp = directory / f"meta.json.{uuid.uuid4().hex}"
+    tmp.write_text(json.dumps(meta, indent=1))
+    os.replace(tmp, directory / "meta.json")
+
+
+def is_fresh(source, meta) -> bool:
+    """True if `meta` describes the current content of `source`."""
+    if meta is None:
+        return False
+    size, mtime_ns = stat_key(source)
+    if (size, mtime_ns) == (meta["size"], meta["mtime_ns"]):
+        return True
+    if size != meta["size"] or file_sha256(source) != meta["sha256"]:
+        return False
+    # touched but unchanged: remember the new mtime so the next check is a stat again
+    meta.update(mtime_ns=mtime_ns)
+    try:
+        _write_meta(cache_dir(source), meta)
+    except OSError:
+        pass
+    return True
+
+
+# ---------------------------------------------------
+# WRITE
+# ---------------------------------------------------
+def read_source(source) -> pd.DataFrame:
+    source = Path(source)
+    return pd.read_csv(source, parse_dates=DATE_COLUMNS.get(source.stem, []))
+
+
+def write_table(source, df: pd.DataFrame = None) -> Path:
+    """
+    (Re)build the cache for `source`. Pass `df` when the caller already
+    holds the table (e.g. the ETL) to skip re-reading the CSV.
+    """
+    source = Path(source)
+    size, mtime_ns = stat_key(source)
+    sha = file_sha256(source)
+    df = read_source(source) if df is None else df
+
+    target = cache_dir(source)
+    staging = target.with_name(f"{target.name}.tmp-{uuid.uuid4().hex}")
+    staging.mkdir(parents=True)
+
+    columns = []
+    for i, (name, col) in enumerate(df.items()):
+        entry = {"name": name, "file": f"{i}.npy"}
+        if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_datetime64_any_dtype(col):
+            values = col.to_numpy()
+        else:
+            cat = col.astype("category")
+            values = cat.cat.codes.to_numpy().astype(np.int32)
+            entry["categories"] = [str(c) for c in cat.cat.categories]
+        np.save(staging / entry["file"], np.ascontiguousarray(values))
+        columns.append(entry)
+
+    _write_meta(staging, {
+        "version": CACHE_VERSION,
+        "source": source.name,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "sha256": sha,
+        "nrows": len(df),
+        "columns": columns,
+    })
+
+    # swap the new directory in; readers holding maps of the old files keep them
+    old = None
+    if target.exists():
+        old = target.with_name(f"{target.name}.old-{uuid.uuid4().hex}")
+        os.replace(target, old)
+    os.replace(staging, target)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+# ---------------------------------------------------
+# READ
+# ---------------------------------------------------
+def _load(directory: Path, meta: dict) -> pd.DataFrame:
+    data = {}
+    for entry in meta["columns"]:
+        values = np.load(directory / entry["file"], mmap_mode="c")
+        if "categories" in entry:
+            data[entry["name"]] = pd.Categorical.from_codes(values, entry["categories"])
+        else:
+            data[entry["name"]] = pd.Series(values, copy=False)
+    # one block per column, so the numeric columns stay views of the maps
+    return pd.DataFrame(data, copy=False)
+
+
+def read_table(source) -> pd.DataFrame:
+    """Return `source` as a DataFrame, from the columnar cache when it is fresh."""
+    source = Path(source)
+    directory = cache_dir(source)
+    meta = _read_meta(directory)
+    if not is_fresh(source, meta):
+        try:
+            directory = write_table(source)
+        except OSError:
+            # read-only checkout: serve the CSV uncached
+            return read_source(source)
+        meta = _read_meta(directory)
+    try:
+        return _load(directory, meta)
+    except FileNotFoundError:
+        # the cache was swapped by a concurrent rebuild between meta and data reads
+        return read_source(source)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(f"{path} -> {write_table(path)}")
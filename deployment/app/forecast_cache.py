@@ -0,0 +1,148 @@
+"""
+PRECOMPUTED FORECAST CACHE
+
+Build step that runs every covid_dummy / affordable_demo model once and
+stores predicted means, confidence intervals, RMSE by horizon and the
+summary text in a single versioned JSON file. The app can then serve
+forecasts as a lookup (FORECAST_MODE=cache) with no Kalman filtering on
+the request path.
+
+The cache is keyed by a hash of the input data and a hash of each model
+artifact; a lookup against stale inputs raises instead of serving old
+numbers.
+
+USAGE
+    python forecast_cache.py                    # horizons 1..len(test)
+    python forecast_cache.py --max-horizon 12
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from forecasting import (
+    MODEL_DIR,
+    MODEL_NAMES,
+    data_hash,
+    load_model_by_exog,
+    load_serving_data,
+    model_hash,
+    model_path,
+    run_forecast,
+    serving_version,
+    split_train_test,
+)
+
+CACHE_VERSION = 1
+CACHE_PATH = MODEL_DIR / "forecast_cache.json"
+
+
+class StaleCacheError(RuntimeError):
+    pass
+
+
+# ---------------------------------------------------
+# BUILD
+# ---------------------------------------------------
+def _entry(covid, affordable, version, max_horizon):
+    # registry versions carry their own data window (model_registry.py)
+    data, exog = load_serving_data(covid, affordable, version)
+    _, test, _, test_exog = split_train_test(data.squeeze(), exog)
+
+    # forecasts need exog values, so the horizon is bounded by the test window
+    max_horizon = len(test) if max_horizon is None else min(max_horizon, len(test))
+    model = load_model_by_exog(covid, affordable, version)
+    forecast, conf_int = run_forecast(model, test, test_exog, steps=max_horizon)
+
+    # RMSE over the first h steps, for every h that has actuals
+    n = min(max_horizon, len(test))
+    sq_err = (test.values[:n] - forecast.values[:n]) ** 2
+    rmse_by_horizon = np.sqrt(np.cumsum(sq_err) / np.arange(1, n + 1))
+
+    return {
+        "model_hash": model_hash(covid, affordable, version),
+        "version": version,
+        "max_horizon": max_horizon,
+        "covid": covid,
+        "affordable": affordable,
+        "index": [d.strftime("%Y-%m-%d") for d in forecast.index],
+        "mean": forecast.values.tolist(),
+        "lower": conf_int.iloc[:, 0].values.tolist(),
+        "upper": conf_int.iloc[:, 1].values.tolist(),
+        "rmse_by_horizon": rmse_by_horizon.tolist(),
+        "summary": str(model.summary()),
+    }
+
+
+def build_cache(max_horizon=None, path=CACHE_PATH):
+    entries = {}
+    for (covid, affordable), name in MODEL_NAMES.items():
+        version = serving_version(covid, affordable)
+        if not model_path(covid, affordable, version).exists():
+            print(f"skipping {name}: no model artifact")
+            continue
+        entries[name] = _entry(covid, affordable, version, max_horizon)
+        print(f"cached {name}" + (f" ({version})" if version else ""))
+
+    cache = {
+        "version": CACHE_VERSION,
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "data_hash": data_hash(),
+        "max_horizon": max((e["max_horizon"] for e in entries.values()), default=0),
+        "entries": entries,
+    }
+    path.write_text(json.dumps(cache))
+    return cache
+
+
+# ---------------------------------------------------
+# READ
+# ---------------------------------------------------
+def load_cache(path=CACHE_PATH) -> dict:
+    cache = json.loads(path.read_text())
+    if cache.get("version") != CACHE_VERSION:
+        raise StaleCacheError(f"Unsupported cache version: {cache.get('version')}")
+    return cache
+
+
+def lookup(cache: dict, covid: bool, affordable: bool, horizon=None, verify=True):
+    """
+    Return (forecast, conf_int, rmse, summary) for one exog combination,
+    shaped like the live path in the app.
+    """
+    name = MODEL_NAMES[(bool(covid), bool(affordable))]
+    if name not in cache["entries"]:
+        raise KeyError(f"{name} is not in the forecast cache")
+    entry = cache["entries"][name]
+
+    if verify:
+        if cache["data_hash"] != data_hash():
+            raise StaleCacheError("input data changed since the forecast cache was built")
+        if entry["model_hash"] != model_hash(covid, affordable):
+            raise StaleCacheError(f"{name} changed since the forecast cache was built")
+
+    max_horizon = entry.get("max_horizon", cache["max_horizon"])
+    horizon = max_horizon if horizon is None else horizon
+    if not 1 <= horizon <= max_horizon:
+        raise ValueError(f"horizon must be between 1 and {max_horizon}")
+
+    index = pd.DatetimeIndex(entry["index"][:horizon], freq="MS")
+    forecast = pd.Series(entry["mean"][:horizon], index=index, name="predicted_mean")
+    conf_int = pd.DataFrame(
+        {"lower": entry["lower"][:horizon], "upper": entry["upper"][:horizon]},
+        index=index,
+    )
+    rmse = entry["rmse_by_horizon"][min(horizon, len(entry["rmse_by_horizon"])) - 1]
+
+    return forecast, conf_int, rmse, entry["summary"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute forecasts for every exog combination.")
+    parser.add_argument("--max-horizon", type=int, default=None)
+    args = parser.parse_args()
+
+    cache = build_cache(args.max_horizon)
+    print(f"wrote {CACHE_PATH} ({len(cache['entries'])} models, horizons 1..{cache['max_horizon']})")
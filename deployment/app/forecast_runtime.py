@@ -0,0 +1,223 @@
+"""
+NUMPY-ONLY FORECAST RUNTIME
+
+CompactResults (artifacts.py) still rebuilds a statsmodels model, so every
+cold start pays for importing statsmodels and scipy. A fitted SARIMAX is a
+linear Gaussian state-space model, and forecasting it only takes the
+system matrices and the final filtered state:
+
+    a(n+1) = T a(n) + c                 P(n+1) = T P(n) T' + RQR'
+    y(n+h) = Z a(n+h) + d + x(n+h)'beta  var(n+h) = Z P(n+h) Z' + H
+
+export_state_space() reads those matrices from a CompactResults once (at
+save time, or via the CLI for existing artifacts) and stores them in the
+artifact's "state_space" section. from_state_space() then answers
+get_forecast() with plain NumPy. Every export is checked against
+statsmodels' get_forecast on random exog paths and is only written when
+means and variances match to CHECK_RTOL.
+
+Only time-invariant systems are exported (trend None / 'n' / 'c', exog as
+regression coefficients); anything else keeps the statsmodels path.
+
+USAGE
+    python forecast_runtime.py ../data/sarimax_*.json    # add state_space sections
+"""
+import json
+import sys
+from pathlib import Path
+from statistics import NormalDist
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+STATE_SPACE_VERSION = 1
+CHECK_STEPS = 36
+CHECK_RTOL = 1e-8
+SUPPORTED_TRENDS = (None, "n", "c")
+
+
+# ---------------------------------------------------
+# EXPORT (needs a statsmodels-backed CompactResults)
+# ---------------------------------------------------
+def export_state_space(compact) -> dict:
+    """
+    System matrices of a CompactResults as a JSON-safe dict, or None when
+    the model is not time-invariant or fails the check against statsmodels.
+    """
+    spec = compact.spec
+    model = compact.model
+    # exog as extra states (mle_regression=False) would make the system time-varying
+    if spec["trend"] not in SUPPORTED_TRENDS or (model.k_exog and not model.mle_regression):
+        return None
+
+    # the stand-in model has all user exog at 0, so its obs intercept is
+    # the constant part (ARIMA's 'const'); exog enter through beta
+    fr = compact._results.filter_results
+    R = fr.selection[:, :, 0]
+    state_space = {
+        "version": STATE_SPACE_VERSION,
+        "design": fr.design[:, :, 0].tolist(),
+        "obs_intercept": fr.obs_intercept[:, 0].tolist(),
+        "obs_cov": fr.obs_cov[:, :, 0].tolist(),
+        "transition": fr.transition[:, :, 0].tolist(),
+        "state_intercept": fr.state_intercept[:, 0].tolist(),
+        "selected_state_cov": (R @ fr.state_cov[:, :, 0] @ R.T).tolist(),
+        "exog_params": [float(compact.params[name]) for name in spec["exog_names"]],
+    }
+    artifact = dict(compact.artifact, state_space=state_space)
+    return state_space if check(compact, from_state_space(artifact)) is not None else None
+
+
+def check(reference, runtime, steps=CHECK_STEPS, seed=0):
+    """
+    Largest relative difference between the two forecasts (mean and
+    variance) on a random exog path, or None if it exceeds CHECK_RTOL.
+    """
+    k = runtime.model.k_exog
+    exog = np.random.default_rng(seed).uniform(0, 100, (steps, k)) if k else None
+    ref = reference.get_forecast(steps=steps, exog=exog)
+    out = runtime.get_forecast(steps=steps, exog=exog)
+
+    worst = 0.0
+    for a, b in ((ref.predicted_mean, out.predicted_mean), (ref.var_pred_mean, out.var_pred_mean)):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        worst = max(worst, float(np.max(np.abs(a - b) / np.maximum(np.abs(a), 1.0))))
+    return worst if worst <= CHECK_RTOL else None
+
+
+# ---------------------------------------------------
+# RUNTIME
+# ---------------------------------------------------
+class RuntimeForecast:
+    """The parts of statsmodels' PredictionResults the app uses."""
+
+    def __init__(self, mean, var, endog_name):
+        self.predicted_mean = mean.rename("predicted_mean")
+        self.var_pred_mean = var.rename("var_pred_mean")
+        self._endog_name = endog_name
+
+    def conf_int(self, alpha=0.05):
+        z = NormalDist().inv_cdf(1 - alpha / 2)
+        sd = np.sqrt(self.var_pred_mean)
+        return pd.DataFrame(
+            {
+                f"lower {self._endog_name}": self.predicted_mean - z * sd,
+                f"upper {self._endog_name}": self.predicted_mean + z * sd,
+            }
+        )
+
+
+class RuntimeResults:
+    """
+    Forecast-only stand-in for CompactResults that never imports
+    statsmodels. Same attributes the app, scenarios and services read.
+    The arrays are read-only and get_forecast keeps its state in locals,
+    so one instance can serve concurrent sessions (see model_pool.py).
+    """
+
+    thread_safe = True
+
+    def __init__(self, artifact: dict):
+        self.artifact = artifact
+        self.spec = artifact["spec"]
+        self.params = pd.Series(artifact["params"], index=artifact["param_names"])
+        self.nobs = self.spec["nobs"]
+        self.aic = artifact["fit_stats"]["aic"]
+        self.bic = artifact["fit_stats"]["bic"]
+        self.llf = artifact["fit_stats"]["llf"]
+        exog_names = list(self.spec["exog_names"])
+        self.model = SimpleNamespace(
+            exog_names=exog_names or None,
+            k_exog=len(exog_names),
+            endog_names=self.spec["endog_name"],
+        )
+
+        ss = artifact["state_space"]
+        self._Z = np.asarray(ss["design"], dtype=float)
+        self._d = np.asarray(ss["obs_intercept"], dtype=float)
+        self._H = np.asarray(ss["obs_cov"], dtype=float)
+        self._T = np.asarray(ss["transition"], dtype=float)
+        self._c = np.asarray(ss["state_intercept"], dtype=float)
+        self._RQR = np.asarray(ss["selected_state_cov"], dtype=float)
+        self._beta = np.asarray(ss["exog_params"], dtype=float)
+        self._state = np.asarray(artifact["filtered_state"], dtype=float)
+        self._state_cov = np.asarray(artifact["filtered_state_cov"], dtype=float)
+        for array in (self._Z, self._d, self._H, self._T, self._c, self._RQR,
+                      self._beta, self._state, self._state_cov):
+            array.flags.writeable = False
+
+    def _index(self, steps):
+        if self.spec["freq"]:
+            start = pd.Timestamp(self.spec["last_date"])
+            return pd.date_range(start, periods=steps + 1, freq=self.spec["freq"])[1:]
+        return pd.RangeIndex(self.nobs, self.nobs + steps)
+
+    def _exog_effect(self, steps, exog):
+        k = len(self._beta)
+        if not k:
+            return np.zeros(steps)
+        if exog is None:
+            raise ValueError(f"Out-of-sample forecasting requires exog {self.spec['exog_names']}")
+        exog = np.asarray(exog, dtype=float).reshape(-1, k)
+        if len(exog) != steps:
+            raise ValueError(f"exog has {len(exog)} rows, expected {steps}")
+        return exog @ self._beta
+
+    def get_forecast(self, steps=1, exog=None, **kwargs):
+        steps = int(steps)
+        effect = self._exog_effect(steps, exog)
+
+        T, Z = self._T, self._Z
+        a = T @ self._state + self._c
+        P = T @ self._state_cov @ T.T + self._RQR
+        mean = np.empty(steps)
+        var = np.empty(steps)
+        for h in range(steps):
+            mean[h] = (Z @ a + self._d)[0]
+            var[h] = (Z @ P @ Z.T + self._H)[0, 0]
+            a = T @ a + self._c
+            P = T @ P @ T.T + self._RQR
+
+        index = self._index(steps)
+        return RuntimeForecast(
+            pd.Series(mean + effect, index=index),
+            pd.Series(var, index=index),
+            self.spec["endog_name"],
+        )
+
+    def forecast(self, steps=1, exog=None, **kwargs):
+        return self.get_forecast(steps, exog).predicted_mean
+
+    def summary(self):
+        return self.artifact["summary"]
+
+
+def has_state_space(artifact: dict) -> bool:
+    return artifact.get("state_space", {}).get("version") == STATE_SPACE_VERSION
+
+
+def from_state_space(artifact: dict) -> RuntimeResults:
+    if not has_state_space(artifact):
+        raise ValueError("Artifact has no state_space section; run forecast_runtime.py on it")
+    return RuntimeResults(artifact)
+
+
+# ---------------------------------------------------
+# ADD state_space TO EXISTING ARTIFACTS
+# ---------------------------------------------------
+if __name__ == "__main__":
+    from artifacts import from_artifact
+
+    for name in sys.argv[1:]:
+        path = Path(name)
+        artifact = json.loads(path.read_text())
+        compact = from_artifact(artifact)
+        state_space = export_state_space(compact)
+        if state_space is None:
+            print(f"{path.name}: not exportable, keeps the statsmodels runtime")
+            continue
+        artifact["state_space"] = state_space
+        diff = check(compact, from_state_space(artifact))
+        path.write_text(json.dumps(artifact))
+        print(f"{path.name}: state_space added (max rel diff {diff:.1e})")
@@ -0,0 +1,312 @@
+"""
+HEADLESS FORECAST SERVICE
+
+Local HTTP/JSON endpoint on top of the same model selection and forecast
+logic as the Streamlit app (forecasting.py), for dashboards and scheduled
+reports that need programmatic access.
+
+- Models are loaded once per worker process and stay resident; a new
+  registry version (model_registry.py) is loaded on its first request.
+- Requests are micro-batched: everything that arrives within a short
+  window for the same (exog set, scenario) is answered by ONE forecast at
+  the largest requested horizon, sliced per request. Concurrent identical
+  requests therefore coalesce into a single computation.
+- Forecasts run in a process pool, so the event loop never blocks on the
+  Kalman filter.
+
+ENDPOINTS
+    GET /health
+    GET /forecast?covid=1&affordable=1&horizon=12&scenario=historical
+
+SCENARIOS
+    historical : exog values from the test window (horizon <= test length
+                 of the version being served, checked per request)
+    persist    : last observed training exog values held constant
+
+USAGE
+    python forecast_service.py serve --port 8502 --workers 2
+    python forecast_service.py client --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from forecasting import (
+    MODEL_NAMES,
+    load_model_by_exog,
+    load_serving_data,
+    serving_version,
+    split_train_test,
+)
+
+SCENARIOS = ("historical", "persist")
+MAX_HORIZON = 60
+
+
+# ---------------------------------------------------
+# WORKER SIDE (runs inside the process pool)
+# ---------------------------------------------------
+_worker_state = {}  # (covid, affordable, version) -> (model, train_exog, test_exog)
+
+
+def _serving(covid, affordable):
+    """Model and exog windows of the version currently served for this combination."""
+    version = serving_version(covid, affordable)
+    key = (covid, affordable, version)
+    if key not in _worker_state:
+        data, exog = load_serving_data(covid, affordable, version)
+        _, _, train_exog, test_exog = split_train_test(data.squeeze(), exog)
+        _worker_state[key] = (load_model_by_exog(covid, affordable, version), train_exog, test_exog)
+    return _worker_state[key]
+
+
+def _init_worker():
+    for covid, affordable in MODEL_NAMES:
+        _serving(covid, affordable)
+
+
+def _scenario_exog(model, train_exog, test_exog, scenario, horizon):
+    cols = model.model.exog_names if model.model.k_exog > 0 else []
+    if not cols:
+        return None
+
+    if scenario == "historical":
+        return test_exog[cols].iloc[:horizon]
+
+    last = train_exog[cols].iloc[[-1]]
+    return pd.concat([last] * horizon, ignore_index=True)
+
+
+def _forecast_job(covid, affordable, scenario, horizon):
+    """
+    Forecast up to `horizon` months, capped at what the served version
+    supports; "limit" tells the batcher which requests exceeded it.
+    """
+    model, train_exog, test_exog = _serving(covid, affordable)
+    # the historical scenario can only run as far as this version's test window
+    limit = len(test_exog) if scenario == "historical" else MAX_HORIZON
+    horizon = min(horizon, limit)
+    if horizon < 1:
+        return {"index": [], "mean": [], "lower": [], "upper": [], "limit": limit}
+
+    exog = _scenario_exog(model, train_exog, test_exog, scenario, horizon)
+    forecast_obj = model.get_forecast(steps=horizon, exog=exog)
+    mean = forecast_obj.predicted_mean
+    conf_int = forecast_obj.conf_int()
+
+    return {
+        "index": [d.strftime("%Y-%m-%d") for d in mean.index],
+        "mean": mean.values.tolist(),
+        "lower": conf_int.iloc[:, 0].values.tolist(),
+        "upper": conf_int.iloc[:, 1].values.tolist(),
+        "limit": limit,
+    }
+
+
+def _horizon_error(limit, scenario):
+    return ValueError(f"horizon must be between 1 and {limit} for the {scenario} scenario")
+
+
+# ---------------------------------------------------
+# MICRO-BATCHER
+# ---------------------------------------------------
+class ForecastBatcher:
+    """
+    Collects requests for `window` seconds, then runs one forecast per
+    (covid, affordable, scenario) at the largest requested horizon.
+    Requests beyond the served version's limit fail with ValueError.
+    """
+
+    def __init__(self, executor, window=0.005):
+        self.executor = executor
+        self.window = window
+        self._pending = defaultdict(list)  # group -> [(horizon, future)]
+        self._flush_handle = None
+        self.stats = {"requests": 0, "computations": 0}
+
+    async def submit(self, covid, affordable, scenario, horizon):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending[(covid, affordable, scenario)].append((horizon, fut))
+        self.stats["requests"] += 1
+
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, defaultdict(list)
+        for group, waiters in pending.items():
+            asyncio.ensure_future(self._run_group(group, waiters))
+
+    async def _run_group(self, group, waiters):
+        loop = asyncio.get_running_loop()
+        horizon = max(h for h, _ in waiters)
+        self.stats["computations"] += 1
+        try:
+            result = await loop.run_in_executor(self.executor, _forecast_job, *group, horizon)
+        except Exception as e:
+            for _, fut in waiters:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        limit = result.pop("limit")
+        for h, fut in waiters:
+            if fut.done():
+                continue
+            if h > limit:
+                fut.set_exception(_horizon_error(limit, group[2]))
+            else:
+                fut.set_result({k: v[:h] for k, v in result.items()})
+
+
+# ---------------------------------------------------
+# HTTP LAYER
+# ---------------------------------------------------
+def _flag(params, name, default):
+    value = params.get(name, [str(int(default))])[0].lower()
+    return value in ("1", "true", "yes")
+
+
+def _parse_forecast_query(query):
+    params = parse_qs(query)
+    scenario = params.get("scenario", ["historical"])[0]
+    if scenario not in SCENARIOS:
+        raise ValueError(f"scenario must be one of {SCENARIOS}")
+
+    # the historical limit depends on the version served; the batcher checks it
+    horizon = int(params.get("horizon", ["12"])[0])
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise _horizon_error(MAX_HORIZON, scenario)
+
+    return _flag(params, "covid", True), _flag(params, "affordable", True), scenario, horizon
+
+
+async def _write_json(writer, status, payload):
+    body = json.dumps(payload).encode()
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    writer.close()
+
+
+def make_handler(batcher):
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode().strip()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed for GET
+
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            if method != "GET":
+                return await _write_json(writer, 404, {"error": "only GET is supported"})
+
+            if url.path == "/health":
+                return await _write_json(writer, 200, {"status": "ok", **batcher.stats})
+
+            if url.path == "/forecast":
+                try:
+                    covid, affordable, scenario, horizon = _parse_forecast_query(url.query)
+                    result = await batcher.submit(covid, affordable, scenario, horizon)
+                except ValueError as e:
+                    return await _write_json(writer, 400, {"error": str(e)})
+
+                return await _write_json(writer, 200, {
+                    "covid": covid,
+                    "affordable": affordable,
+                    "scenario": scenario,
+                    "horizon": horizon,
+                    **result,
+                })
+
+            return await _write_json(writer, 404, {"error": f"unknown path {url.path}"})
+        except Exception as e:
+            await _write_json(writer, 500, {"error": str(e)})
+
+    return handle
+
+
+async def serve(host, port, workers, window):
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    batcher = ForecastBatcher(executor, window=window)
+
+    server = await asyncio.start_server(make_handler(batcher), host, port)
+    print(f"forecast service listening on http://{host}:{port} ({workers} workers)")
+    async with server:
+        await server.serve_forever()
+
+
+# ---------------------------------------------------
+# LOCAL CLIENT STAND-IN
+# ---------------------------------------------------
+def run_client(url, n_requests, concurrency):
+    """Fire a mix of concurrent requests and report latency percentiles."""
+    import itertools
+    import urllib.request
+
+    import numpy as np
+
+    combos = itertools.cycle(
+        (c, a, s, h)
+        for c in (0, 1) for a in (0, 1) for s in SCENARIOS for h in (6, 12, 17)
+    )
+    queries = [
+        f"{url}/forecast?covid={c}&affordable={a}&scenario={s}&horizon={h}"
+        for c, a, s, h in itertools.islice(combos, n_requests)
+    ]
+
+    def fetch(q):
+        start = time.perf_counter()
+        with urllib.request.urlopen(q) as resp:
+            json.loads(resp.read())
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = np.array(list(pool.map(fetch, queries))) * 1000
+    elapsed = time.perf_counter() - start
+
+    with urllib.request.urlopen(f"{url}/health") as resp:
+        health = json.loads(resp.read())
+
+    print(f"{n_requests} requests in {elapsed:.2f}s ({n_requests / elapsed:.1f} req/s)")
+    print("latency ms  p50={:.1f}  p95={:.1f}  p99={:.1f}".format(
+        *np.percentile(latencies, [50, 95, 99])
+    ))
+    print(f"server: {health['requests']} requests, {health['computations']} forecast computations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless SARIMAX forecast service.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8502)
+    p_serve.add_argument("--workers", type=int, default=2)
+    p_serve.add_argument("--batch-window-ms", type=float, default=5.0)
+
+    p_client = sub.add_parser("client")
+    p_client.add_argument("--url", default="http://127.0.0.1:8502")
+    p_client.add_argument("--requests", type=int, default=200)
+    p_client.add_argument("--concurrency", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.workers, args.batch_window_ms / 1000))
+    else:
+        run_client(args.url, args.requests, args.concurrency)
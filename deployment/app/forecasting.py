@@ -0,0 +1,204 @@
+"""
+SHARED FORECASTING LOGIC
+
+Everything the Streamlit app needs to produce a forecast, without any
+Streamlit calls, so that offline jobs (forecast cache, services, training)
+can reuse exactly the same data loading, split and model selection.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from columnar_cache import read_table, stat_key
+from forecast_runtime import from_state_space, has_state_space
+from model_registry import ModelRegistry
+
+APP_DIR = Path(__file__).resolve().parent
+MODEL_DIR = APP_DIR.parent / "data"
+PROCESSED_DIR = APP_DIR.parents[1] / "data" / "processed"
+
+SHELTER_PATH = PROCESSED_DIR / "fact_shelter.csv"
+EXOG_PATH = MODEL_DIR / "datedf.csv"
+
+EXOG_COLS = ['covid_dummy', 'affordable_demo']
+TRAIN_RATIO = 0.8
+
+# refitted versions (python/refit_models.py); names the registry has no
+# current version for are served from deployment/data
+REGISTRY = ModelRegistry()
+# `version` argument: resolve the registry's current version at call time
+# (None = the deployment/data file); callers that need the data and the
+# model of one rerun to agree resolve once and pass the version on
+CURRENT = "current"
+
+# (covid, affordable) -> artifact / registry name
+MODEL_NAMES = {
+    (True, True): "sarimax_both",
+    (True, False): "sarimax_covid",
+    (False, True): "sarimax_aff",
+    (False, False): "sarimax_none",
+}
+
+
+def exog_key(cols) -> tuple:
+    """Order-independent key for a set of exog columns."""
+    return tuple(sorted(set(cols)))
+
+
+def exog_candidates(exog) -> list:
+    """Columns of the exog frame a model can be fit on."""
+    return [c for c in exog.columns if c != "shelter_count"]
+
+
+def prebuilt_flags(cols):
+    """(covid, affordable) of the pre-built model fit on exactly `cols`, else None."""
+    key = exog_key(cols)
+    for flags in MODEL_NAMES:
+        if key == exog_key(col for col, flag in zip(EXOG_COLS, flags) if flag):
+            return flags
+    return None
+
+
+# ---------------------------------------------------
+# DATA
+# ---------------------------------------------------
+def load_data(shelter_path=SHELTER_PATH, exog_path=EXOG_PATH):
+    """(shelter counts, exog) over the default 2016-2022 window."""
+    # memory-mapped columnar copies, rebuilt whenever the CSVs change
+    data = read_table(shelter_path)
+    exog = read_table(exog_path)
+
+    data = data.set_index("report_date").sort_index()
+    exog = exog.set_index("month_date").sort_index()
+
+    data = data.loc["2016-01-01":"2022-12-31"]
+    exog = exog.loc["2016-01-01":"2022-12-31"]
+
+    return data, exog
+
+
+def load_serving_data(covid: bool, affordable: bool, version=CURRENT):
+    """
+    (shelter counts, exog) the served model for this combination was fit
+    and evaluated on: its registry version's frame, else load_data().
+    """
+    name = MODEL_NAMES[(bool(covid), bool(affordable))]
+    version = REGISTRY.current(name) if version == CURRENT else version
+    if version is None:
+        return load_data()
+    frame = REGISTRY.frame(name, version)
+    data = frame[["shelter_count"]].rename_axis("report_date")
+    return data, frame.drop(columns="shelter_count")
+
+
+def split_train_test(target, exog, exog_cols=EXOG_COLS, ratio=TRAIN_RATIO):
+    train_size = int(len(target) * ratio)
+    train = target.iloc[:train_size]
+    test = target.iloc[train_size:]
+
+    train_exog = exog[exog_cols].iloc[:train_size].copy()
+    test_exog = exog[exog_cols].iloc[train_size:].copy()
+
+    return train, test, train_exog, test_exog
+
+
+def data_version():
+    """Cheap key that changes whenever an input file is rewritten (for st.cache_data)."""
+    return tuple(stat_key(path) for path in (SHELTER_PATH, EXOG_PATH))
+
+
+def data_hash() -> str:
+    """Content hash of every input file the forecasts depend on."""
+    h = hashlib.sha256()
+    for path in (SHELTER_PATH, EXOG_PATH):
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+# ---------------------------------------------------
+# MODELS
+# ---------------------------------------------------
+def serving_version(covid: bool, affordable: bool):
+    """Registry version served for this combination (None = deployment/data file)."""
+    return REGISTRY.current(MODEL_NAMES[(bool(covid), bool(affordable))])
+
+
+def model_path(covid: bool, affordable: bool, version=CURRENT) -> Path:
+    """
+    Path of the model for this exog combination: a registry version, else
+    deployment/data (.json preferred over .pkl).
+    """
+    name = MODEL_NAMES[(bool(covid), bool(affordable))]
+    version = REGISTRY.current(name) if version == CURRENT else version
+    if version is not None:
+        return REGISTRY.artifact_path(name, version)
+    base = MODEL_DIR / name
+    if base.with_suffix(".json").exists():
+        return base.with_suffix(".json")
+    return base.with_suffix(".pkl")
+
+
+def load_model(path):
+    """
+    Forecast-capable model from a .json artifact or a full .pkl.
+
+    Artifacts with a state_space section are served by the NumPy runtime
+    unless FORECAST_RUNTIME=statsmodels; statsmodels (and joblib for
+    pickles) is only imported when actually needed.
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        artifact = json.loads(path.read_text())
+        if forecast_runtime() == "numpy" and has_state_space(artifact):
+            return from_state_space(artifact)
+
+        from artifacts import from_artifact
+        return from_artifact(artifact)
+
+    import joblib
+    return joblib.load(open(path, "rb"))
+
+
+def load_model_by_exog(covid: bool, affordable: bool, version=CURRENT):
+    # prefer the compact params-only artifact, fall back to the full pickle
+    return load_model(model_path(covid, affordable, version))
+
+
+def model_hash(covid: bool, affordable: bool, version=CURRENT) -> str:
+    return hashlib.sha256(model_path(covid, affordable, version).read_bytes()).hexdigest()
+
+
+# ---------------------------------------------------
+# FORECAST
+# ---------------------------------------------------
+def forecast_exog_for(model, test_exog, steps):
+    expected_cols = model.model.exog_names if model.model.k_exog > 0 else []
+    return test_exog[expected_cols].iloc[:steps] if expected_cols else None
+
+
+def rmse(actual, predicted) -> float:
+    actual = np.asarray(actual, dtype=float)
+    predicted = np.asarray(predicted, dtype=float)
+    return float(np.sqrt(np.mean((actual - predicted) ** 2)))
+
+
+def run_forecast(model, test, test_exog, steps=None):
+    """Forecast `steps` months past the training data (default: the test window)."""
+    steps = len(test) if steps is None else steps
+    forecast_obj = model.get_forecast(steps=steps, exog=forecast_exog_for(model, test_exog, steps))
+    forecast = forecast_obj.predicted_mean
+    conf_int = forecast_obj.conf_int()
+    return forecast, conf_int
+
+
+def forecast_runtime() -> str:
+    """'numpy' forecasts from exported state-space matrices, 'statsmodels' rebuilds the model."""
+    return os.environ.get("FORECAST_RUNTIME", "numpy").lower()
+
+
+def forecast_mode() -> str:
+    """'live' runs the Kalman filter per request, 'cache' only reads the precomputed cache."""
+    return os.environ.get("FORECAST_MODE", "live").lower()
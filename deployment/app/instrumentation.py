@@ -0,0 +1,267 @@
+"""
+PER-STAGE TIMING FOR APP RERUNS
+
+Records, for every numbered section of app.py, the wall time, CPU time
+and resident-memory delta, and groups them into one record per rerun,
+tagged with the selected exog combination and which caches were hit.
+
+- RerunProfile.section(name) closes the running section and opens the
+  next one, mirroring the numbered blocks of the script; stage(name) is
+  the context-manager form for nested or optional blocks.
+- profile.cache(name) registers a cache lookup and cache_miss(name) is
+  called INSIDE the st.cache_* function body. The body only runs on a
+  miss, so a registered cache that is never marked was a hit.
+- finish() stores the rerun in a process-wide ring buffer (HISTORY) that
+  survives reruns and sessions, adds it to the cumulative totals behind
+  the Prometheus counters, and writes it as one JSON line to the
+  "app.timing" logger (and to $APP_TIMING_LOG, if set).
+
+EXPORT
+    jsonl_lines()        structured log of the buffered reruns
+    prometheus_text()    Prometheus text exposition of every rerun since
+                         process start (not just the buffered ones, so the
+                         counters never go backwards)
+    serve_metrics(port)  background GET /metrics endpoint ($APP_METRICS_PORT)
+
+CPU time is process-wide, so under concurrent sessions it includes the
+other sessions' work; wall time is per stage. Memory is the RSS delta
+from /proc/self/statm and is None where that is unavailable.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HISTORY_SIZE = 500
+LOG_PATH_ENV = "APP_TIMING_LOG"
+METRICS_PORT_ENV = "APP_METRICS_PORT"
+
+logger = logging.getLogger("app.timing")
+
+HISTORY = deque(maxlen=HISTORY_SIZE)
+_lock = threading.Lock()
+
+
+def _new_totals():
+    # reruns: exog -> n; stages: (stage, exog) -> [n, wall s, cpu s];
+    # caches: (name, result) -> n
+    return {"reruns": {}, "stages": {}, "caches": {}}
+
+
+TOTALS = _new_totals()
+_local = threading.local()
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# ---------------------------------------------------
+# RECORDING
+# ---------------------------------------------------
+class RerunProfile:
+    """Stage timings for one script run."""
+
+    def __init__(self, **tags):
+        self.tags = tags
+        self.caches = {}  # name -> "hit" | "miss"
+        self.stages = []
+        self.started = datetime.now(timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._open = None
+        _local.current = self
+
+    def _start(self, name):
+        return name, time.perf_counter(), time.process_time(), _rss_bytes()
+
+    def _stop(self, started):
+        name, wall, cpu, rss = started
+        after = _rss_bytes()
+        self.stages.append({
+            "stage": name,
+            "wall_ms": (time.perf_counter() - wall) * 1000,
+            "cpu_ms": (time.process_time() - cpu) * 1000,
+            "rss_delta_mb": None if rss is None or after is None else (after - rss) / 2**20,
+        })
+
+    def section(self, name=None):
+        """End the running section and start `name` (None just ends it)."""
+        if self._open is not None:
+            self._stop(self._open)
+        self._open = self._start(name) if name else None
+
+    @contextmanager
+    def stage(self, name):
+        started = self._start(name)
+        try:
+            yield
+        finally:
+            self._stop(started)
+
+    def cache(self, name):
+        """Register a cache lookup; stays a hit unless cache_miss(name) runs."""
+        self.caches.setdefault(name, "hit")
+
+    def finish(self) -> dict:
+        self.section(None)
+        record = {
+            "time": self.started.isoformat(timespec="milliseconds"),
+            **self.tags,
+            "caches": dict(self.caches),
+            "wall_ms": (time.perf_counter() - self._wall) * 1000,
+            "cpu_ms": (time.process_time() - self._cpu) * 1000,
+            "stages": self.stages,
+        }
+        with _lock:
+            HISTORY.append(record)
+            _accumulate(TOTALS, record)
+        _log(record)
+        if getattr(_local, "current", None) is self:
+            _local.current = None
+        return record
+
+
+def current():
+    """The profile of the rerun running on this thread, if any."""
+    return getattr(_local, "current", None)
+
+
+def cache_miss(name):
+    profile = current()
+    if profile is not None:
+        profile.caches[name] = "miss"
+
+
+def _log(record):
+    line = json.dumps(record, default=str)
+    logger.info(line)
+    path = os.environ.get(LOG_PATH_ENV)
+    if path:
+        with _lock, open(path, "a") as f:
+            f.write(line + "\n")
+
+
+# ---------------------------------------------------
+# EXPORT
+# ---------------------------------------------------
+def snapshot() -> list:
+    with _lock:
+        return list(HISTORY)
+
+
+def jsonl_lines(records=None) -> str:
+    records = snapshot() if records is None else records
+    return "".join(json.dumps(r, default=str) + "\n" for r in records)
+
+
+def stage_rows(records=None) -> list:
+    """Flat rows (one per stage per rerun) for a DataFrame."""
+    records = snapshot() if records is None else records
+    rows = []
+    for run, r in enumerate(records):
+        tags = {k: v for k, v in r.items() if k not in ("stages", "caches", "wall_ms", "cpu_ms")}
+        for s in r["stages"]:
+            rows.append({"run": run, **tags, **s})
+    return rows
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in labels.items())
+
+
+def _accumulate(totals, r):
+    exog = r.get("exog", "")
+    totals["reruns"][exog] = totals["reruns"].get(exog, 0) + 1
+    for s in r["stages"]:
+        acc = totals["stages"].setdefault((s["stage"], exog), [0, 0.0, 0.0])
+        acc[0] += 1
+        acc[1] += s["wall_ms"] / 1000
+        acc[2] += s["cpu_ms"] / 1000
+    for name, result in r["caches"].items():
+        key = (name, result)
+        totals["caches"][key] = totals["caches"].get(key, 0) + 1
+
+
+def prometheus_text(records=None) -> str:
+    """
+    Totals per stage / exog set and cache hit counts, in Prometheus text
+    format: cumulative since process start, or over `records` if given.
+    """
+    if records is None:
+        with _lock:
+            reruns = dict(TOTALS["reruns"])
+            stage_stats = {k: list(v) for k, v in TOTALS["stages"].items()}
+            cache_stats = dict(TOTALS["caches"])
+    else:
+        totals = _new_totals()
+        for r in records:
+            _accumulate(totals, r)
+        reruns, stage_stats, cache_stats = totals["reruns"], totals["stages"], totals["caches"]
+
+    lines = [
+        "# HELP app_reruns_total Script reruns recorded.",
+        "# TYPE app_reruns_total counter",
+    ]
+    lines += [f"app_reruns_total{{{_labels(exog=e)}}} {n}" for e, n in sorted(reruns.items())]
+    lines += [
+        "# HELP app_stage_wall_seconds Wall time per app section.",
+        "# TYPE app_stage_wall_seconds summary",
+    ]
+    for (stage, exog), (n, wall, _) in sorted(stage_stats.items()):
+        labels = _labels(stage=stage, exog=exog)
+        lines.append(f"app_stage_wall_seconds_sum{{{labels}}} {wall:.6f}")
+        lines.append(f"app_stage_wall_seconds_count{{{labels}}} {n}")
+    lines += [
+        "# HELP app_stage_cpu_seconds_total Process CPU time per app section.",
+        "# TYPE app_stage_cpu_seconds_total counter",
+    ]
+    for (stage, exog), (_, _, cpu) in sorted(stage_stats.items()):
+        lines.append(f"app_stage_cpu_seconds_total{{{_labels(stage=stage, exog=exog)}}} {cpu:.6f}")
+    lines += [
+        "# HELP app_cache_lookups_total Streamlit cache lookups by result.",
+        "# TYPE app_cache_lookups_total counter",
+    ]
+    lines += [
+        f"app_cache_lookups_total{{{_labels(cache=name, result=result)}}} {n}"
+        for (name, result), n in sorted(cache_stats.items())
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """
+    Start GET /metrics on a daemon thread (port defaults to $APP_METRICS_PORT).
+    Returns the server, or None when no port is configured.
+    """
+    port = port if port is not None else os.environ.get(METRICS_PORT_ENV)
+    if port in (None, ""):
+        return None
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,247 @@
+"""
+CONCURRENT-SESSION LOAD TEST FOR THE STREAMLIT APP
+
+Simulates N users against one local `streamlit run app.py` worker. Each
+simulated session speaks Streamlit's own websocket protocol
+(/_stcore/stream, protobuf BackMsg / ForwardMsg) like a browser tab:
+it runs the script once, finds the covid_dummy / affordable_demo
+checkboxes, then keeps toggling one of them and requesting a rerun. The
+latency of a rerun is the time from the request to the server's
+script_finished message, i.e. the full server-side cost including
+Plotly serialization, but not browser rendering.
+
+By default the script starts its own headless server (with
+APP_METRICS_PORT set, see instrumentation.py) and stops it at the end;
+--url points it at an instance that is already running instead. For
+each session count the report shows rerun throughput, latency
+percentiles, errors and, when the server exposes /metrics, the app
+sections with the highest mean time at that load. The last line names
+the largest session count whose p95 stays within --slo-ms: how many
+concurrent users one worker supports.
+
+USAGE
+    python load_test.py --sessions 1 2 4 8 16 --reruns 20 --slo-ms 1000
+    python load_test.py --url http://127.0.0.1:8501 --sessions 8
+    FORECAST_MODE=cache python load_test.py    # (env is passed to the server it starts)
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+CHECKBOX_LABELS = ("Include covid_dummy", "Include affordable_demo")
+STAGE_METRIC = re.compile(r'^app_stage_wall_seconds_(sum|count)\{stage="([^"]+)",exog="[^"]*"\} (\S+)$')
+
+
+# ---------------------------------------------------
+# ONE SIMULATED SESSION (websocket client)
+# ---------------------------------------------------
+class Session:
+    def __init__(self, url, timeout):
+        self.ws_url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.timeout = timeout
+        self.checkboxes = {}  # label -> [widget id, value]
+        self.ws = None
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self.ws = await websocket_connect(self.ws_url, subprotocols=["streamlit"],
+                                          max_message_size=200 * 2**20)
+
+    async def rerun(self):
+        """Request a rerun with the current checkbox values; returns the app exceptions shown."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        for widget_id, value in self.checkboxes.values():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.bool_value = value
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+
+        errors = []
+        while True:
+            payload = await asyncio.wait_for(self.ws.read_message(), self.timeout)
+            if payload is None:
+                raise ConnectionError("server closed the websocket")
+            fwd = ForwardMsg()
+            fwd.ParseFromString(payload)
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                which = element.WhichOneof("type")
+                if which == "checkbox" and element.checkbox.label in CHECKBOX_LABELS:
+                    box = element.checkbox
+                    current = self.checkboxes.get(box.label)
+                    self.checkboxes[box.label] = [box.id, current[1] if current else box.default]
+                elif which == "exception":
+                    errors.append(element.exception.message)
+                elif which == "alert" and element.alert.format == element.alert.ERROR:
+                    errors.append(element.alert.body)
+            elif kind == "script_finished":
+                if fwd.script_finished != fwd.FINISHED_EARLY_FOR_RERUN:
+                    return errors
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+
+async def run_session(url, reruns, seed, timeout, latencies, errors):
+    rng = random.Random(seed)
+    session = Session(url, timeout)
+    try:
+        await session.connect()
+        errors.extend(await session.rerun())  # first run only warms the session up
+        for _ in range(reruns):
+            if session.checkboxes:
+                box = session.checkboxes[rng.choice(sorted(session.checkboxes))]
+                box[1] = not box[1]
+            start = time.perf_counter()
+            shown = await session.rerun()
+            latencies.append(time.perf_counter() - start)
+            errors.extend(shown)
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        session.close()
+
+
+# ---------------------------------------------------
+# SERVER-SIDE STAGE TIMES (/metrics from instrumentation.py)
+# ---------------------------------------------------
+def stage_totals(metrics_url):
+    """stage -> [seconds, count] summed over exog sets, or None without /metrics."""
+    if not metrics_url:
+        return None
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=5) as resp:
+            text = resp.read().decode()
+    except OSError:
+        return None
+    totals = {}
+    for line in text.splitlines():
+        m = STAGE_METRIC.match(line)
+        if m:
+            kind, stage, value = m.groups()
+            totals.setdefault(stage, [0.0, 0.0])[kind == "count"] += float(value)
+    return totals
+
+
+def slowest_stages(before, after, top=3):
+    if before is None or after is None:
+        return ""
+    means = {}
+    for stage, (seconds, count) in after.items():
+        prev = before.get(stage, [0.0, 0.0])
+        if count > prev[1]:
+            means[stage] = 1000 * (seconds - prev[0]) / (count - prev[1])
+    ranked = sorted(means.items(), key=lambda kv: -kv[1])[:top]
+    return ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in ranked)
+
+
+# ---------------------------------------------------
+# LOAD LEVELS
+# ---------------------------------------------------
+async def load_level(url, sessions, reruns, timeout, seed=0, metrics_url=None):
+    latencies, errors = [], []
+    before = stage_totals(metrics_url)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(url, reruns, seed + s, timeout, latencies, errors) for s in range(sessions)
+    ))
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    row = {
+        "sessions": sessions,
+        "reruns": len(ms),
+        "errors": len(errors),
+        "reruns_per_s": len(ms) / elapsed if elapsed else np.nan,
+    }
+    for p in (50, 95, 99):
+        row[f"p{p}_ms"] = np.percentile(ms, p) if len(ms) else np.nan
+    row["max_ms"] = ms.max() if len(ms) else np.nan
+    row["slowest_sections"] = slowest_stages(before, stage_totals(metrics_url))
+    return row, errors
+
+
+def start_server(port, metrics_port, timeout=60):
+    env = dict(os.environ, APP_METRICS_PORT=str(metrics_port))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(APP_PATH),
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=APP_PATH.parent, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError(f"streamlit did not come up on port {port} within {timeout}s")
+
+
+async def main(args):
+    # one untimed session first: loads data and models into the server's caches
+    await load_level(args.url, 1, 0, args.timeout)
+    rows = []
+    for n in args.sessions:
+        row, errors = await load_level(args.url, n, args.reruns, args.timeout, args.seed, args.metrics_url)
+        rows.append(row)
+        print(f"{n:>3} sessions: p50 {row['p50_ms']:.0f} ms, p95 {row['p95_ms']:.0f} ms, "
+              f"{row['reruns_per_s']:.1f} reruns/s, {row['errors']} errors")
+        for message in sorted(set(errors))[:3]:
+            print(f"      {message.splitlines()[0] if message else message}")
+    return pd.DataFrame(rows).set_index("sessions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="running instance (default: start one)")
+    parser.add_argument("--metrics-url", default=None, help="its /metrics endpoint, if any")
+    parser.add_argument("--port", type=int, default=8599, help="port for the server this script starts")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--reruns", type=int, default=20, help="checkbox toggles per session")
+    parser.add_argument("--slo-ms", type=float, default=1000.0, help="p95 rerun latency target")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per rerun")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        server = start_server(args.port, args.port + 1)
+        args.url = f"http://127.0.0.1:{args.port}"
+        args.metrics_url = f"http://127.0.0.1:{args.port + 1}/metrics"
+    try:
+        report = asyncio.run(main(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60):
+        print()
+        print(report.round(1).to_string())
+
+    ok = report[(report["p95_ms"] <= args.slo_ms) & (report["errors"] == 0)]
+    if ok.empty:
+        print(f"\nno tested session count meets p95 <= {args.slo_ms:g} ms")
+    else:
+        print(f"\n{ok.index.max()} concurrent sessions meet p95 <= {args.slo_ms:g} ms on this worker")
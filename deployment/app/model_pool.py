@@ -0,0 +1,116 @@
+"""
+SHARED MODEL POOL FOR CONCURRENT SESSIONS
+
+Every Streamlit session runs its script on its own thread, and
+st.cache_resource hands all of them the same model object. A statsmodels
+results object is not safe to forecast from concurrently (get_forecast
+builds and filters a temporary extension of the shared model), and even
+the NumPy runtime should not be hammered by an unbounded number of
+threads on one worker.
+
+ModelPool gives:
+- read-only shared parameters: the cached model is the prototype and is
+  never used for forecasting directly. NumPy runtime models
+  (forecast_runtime.RuntimeResults, thread_safe = True) hold read-only
+  arrays and are shared as-is; anything else gets one private copy per
+  slot, built once from the prototype's artifact (or a deepcopy) and
+  dropped with the prototype, so models evicted from the resolver's LRU
+  (model_resolver.py) do not stay alive in the pool.
+- bounded concurrency: at most `size` forecasts run at once; further
+  callers queue for a free slot, up to `timeout` seconds, then get
+  PoolTimeout.
+- stats(): runs, queue waits and the deepest queue seen, for the app's
+  diagnostics panel and the load test.
+
+Size and timeout default to $MODEL_POOL_SIZE (4) and $MODEL_POOL_TIMEOUT (30 s).
+"""
+import copy
+import os
+import queue
+import threading
+import time
+import weakref
+
+DEFAULT_SIZE = 4
+DEFAULT_TIMEOUT = 30.0
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+def worker_copy(model):
+    """Private copy of a model for one pool slot (the model itself when it is thread-safe)."""
+    if getattr(model, "thread_safe", False):
+        return model
+    artifact = getattr(model, "artifact", None)
+    if artifact is not None:
+        from artifacts import from_artifact
+        return from_artifact(artifact)
+    return copy.deepcopy(model)
+
+
+class ModelPool:
+    def __init__(self, size=None, timeout=None):
+        self.size = int(size or os.environ.get("MODEL_POOL_SIZE", DEFAULT_SIZE))
+        self.timeout = float(timeout or os.environ.get("MODEL_POOL_TIMEOUT", DEFAULT_TIMEOUT))
+        self._slots = queue.SimpleQueue()
+        for slot in range(self.size):
+            self._slots.put(slot)
+        # slot -> {prototype: private copy}, held only as long as the prototype
+        self._scratch = [weakref.WeakKeyDictionary() for _ in range(self.size)]
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "waited": 0, "wait_s": 0.0, "max_wait_s": 0.0,
+                       "waiting": 0, "max_waiting": 0, "timeouts": 0}
+
+    def _acquire(self):
+        try:
+            slot = self._slots.get_nowait()
+        except queue.Empty:
+            slot = self._wait_for_slot()
+        with self._lock:
+            self._stats["runs"] += 1
+        return slot
+
+    def _wait_for_slot(self):
+        with self._lock:
+            self._stats["waiting"] += 1
+            self._stats["max_waiting"] = max(self._stats["max_waiting"], self._stats["waiting"])
+        start = time.perf_counter()
+        try:
+            return self._slots.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"no free model slot within {self.timeout:g}s ({self.size} slots busy)")
+        finally:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self._stats["waiting"] -= 1
+                self._stats["waited"] += 1
+                self._stats["wait_s"] += waited
+                self._stats["max_wait_s"] = max(self._stats["max_wait_s"], waited)
+
+    def _model_for(self, slot, prototype):
+        if getattr(prototype, "thread_safe", False):
+            return prototype
+        scratch = self._scratch[slot]
+        model = scratch.get(prototype)
+        if model is None:
+            model = scratch[prototype] = worker_copy(prototype)
+        return model
+
+    def run(self, prototype, fn, *args, **kwargs):
+        """fn(model, *args, **kwargs) on this slot's copy of `prototype`."""
+        slot = self._acquire()
+        try:
+            return fn(self._model_for(slot, prototype), *args, **kwargs)
+        finally:
+            self._slots.put(slot)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["mean_wait_ms"] = 1000 * stats["wait_s"] / stats["runs"] if stats["runs"] else 0.0
+        return stats
@@ -0,0 +1,209 @@
+"""
+VERSIONED MODEL REGISTRY
+
+The deployed models used to be fixed files in deployment/data, picked by
+name. Refits (python/refit_models.py) publish into this registry
+instead, and the app serves whatever version is current for each name.
+
+LAYOUT
+    deployment/data/registry/<name>/
+        index.json              {"current": "v0003", "history": [...]}
+        v0001/                  immutable once published
+            model.json          compact artifact (artifacts.py)
+            frame.csv           month_date, shelter_count + exog the model
+                                was fit and evaluated on
+            meta.json           window, split, holdout metrics, parent version
+
+PUBLISH / SWITCH
+- A version is written to a staging directory and renamed into place, so
+  a version directory either does not exist or is complete.
+- The current version is the only mutable state: index.json, replaced
+  atomically (write + os.replace). A reader sees the old or the new
+  version, never a mix, and readers never take a lock.
+- history is an append-only log of publish / activate / rollback events.
+  rollback() returns to the version that was current before the current
+  one was activated, down to no version at all (the legacy file in
+  deployment/data).
+- Writers serialize on a per-name lock file (POSIX only).
+
+Names without an index.json (or with current = null) fall back to
+deployment/data/<name>.json / .pkl in forecasting.model_path().
+
+USAGE
+    python model_registry.py                          # current versions
+    python model_registry.py sarimax_both             # versions + history
+    python model_registry.py sarimax_both --rollback
+    python model_registry.py sarimax_both --activate v0002
+"""
+import argparse
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writer assumed
+    fcntl = None
+
+REGISTRY_DIR = Path(__file__).resolve().parent.parent / "data" / "registry"
+INDEX = "index.json"
+ARTIFACT = "model.json"
+FRAME = "frame.csv"
+META = "meta.json"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _write_json(path: Path, obj) -> None:
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+    tmp.write_text(json.dumps(obj, indent=1, default=str))
+    os.replace(tmp, path)
+
+
+def _stack(history):
+    """Activated versions, most recent last, after replaying rollbacks."""
+    stack = []
+    for event in history:
+        if event["action"] == "rollback":
+            stack.pop()
+        else:
+            stack.append(event["version"])
+    return stack
+
+
+class ModelRegistry:
+    def __init__(self, root=None):
+        self.root = Path(root) if root is not None else REGISTRY_DIR
+        self._index_cache = {}  # name -> ((size, mtime_ns), index)
+
+    # ---------------------------------------------------
+    # READ (no locks; safe while a writer is publishing)
+    # ---------------------------------------------------
+    def index(self, name) -> dict:
+        path = self.root / name / INDEX
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return {"current": None, "history": []}
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self._index_cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = self._index_cache[name] = (key, json.loads(path.read_text()))
+        return cached[1]
+
+    def current(self, name):
+        """Current version id for `name`, or None."""
+        return self.index(name)["current"]
+
+    def version_dir(self, name, version) -> Path:
+        return self.root / name / version
+
+    def artifact_path(self, name, version=None) -> Path:
+        return self.version_dir(name, version or self.current(name)) / ARTIFACT
+
+    def meta(self, name, version=None) -> dict:
+        return json.loads((self.version_dir(name, version or self.current(name)) / META).read_text())
+
+    def frame(self, name, version=None):
+        import pandas as pd
+
+        path = self.version_dir(name, version or self.current(name)) / FRAME
+        return pd.read_csv(path, parse_dates=["month_date"]).set_index("month_date").asfreq("MS")
+
+    def versions(self, name) -> list:
+        directory = self.root / name
+        if not directory.exists():
+            return []
+        return sorted(p.name for p in directory.iterdir() if p.is_dir() and p.name.startswith("v"))
+
+    # ---------------------------------------------------
+    # WRITE
+    # ---------------------------------------------------
+    @contextmanager
+    def _locked(self, name):
+        directory = self.root / name
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield directory
+
+    def _record(self, name, action, version):
+        # writers re-read the file instead of trusting the stat-keyed cache
+        path = self.root / name / INDEX
+        history = json.loads(path.read_text())["history"] if path.exists() else []
+        history.append({"action": action, "version": version, "at": _now()})
+        stack = _stack(history)
+        current = stack[-1] if stack else None
+        _write_json(path, {"current": current, "history": history})
+        return current
+
+    def publish(self, name, artifact: dict, frame, meta: dict, activate=True) -> str:
+        """Write a new immutable version; make it current unless activate=False."""
+        with self._locked(name) as directory:
+            staging = directory / f".staging-{uuid.uuid4().hex}"
+            staging.mkdir()
+            (staging / ARTIFACT).write_text(json.dumps(artifact))
+            frame.to_csv(staging / FRAME, date_format="%Y-%m-%d", index_label="month_date")
+
+            existing = self.versions(name)
+            version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+            meta = dict(meta, name=name, version=version, parent=self.current(name), created_at=_now())
+            _write_json(staging / META, meta)
+            os.rename(staging, directory / version)
+
+            if activate:
+                self._record(name, "publish", version)
+        return version
+
+    def activate(self, name, version) -> str:
+        with self._locked(name):
+            if not (self.version_dir(name, version) / META).exists():
+                raise KeyError(f"{name} has no version {version}")
+            return self._record(name, "activate", version)
+
+    def rollback(self, name):
+        """Return to the previously active version (None = legacy model file)."""
+        with self._locked(name):
+            index = self.index(name)
+            if not _stack(index["history"]):
+                raise ValueError(f"{name} has no registry version to roll back")
+            return self._record(name, "rollback", index["current"])
+
+
+def _describe(registry, name):
+    current = registry.current(name)
+    for version in registry.versions(name):
+        meta = registry.meta(name, version)
+        mark = "*" if version == current else " "
+        print(f"{mark} {version}  through {meta.get('data_through')}  rmse {meta.get('rmse', float('nan')):.1f} "
+              f"(incumbent {meta.get('incumbent_rmse', float('nan')):.1f})  {meta['created_at']}")
+    for event in registry.index(name)["history"]:
+        print(f"    {event['at']}  {event['action']:<8} {event['version']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("name", nargs="?")
+    parser.add_argument("--root", type=Path, default=REGISTRY_DIR)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--rollback", action="store_true")
+    group.add_argument("--activate", metavar="VERSION")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.name is None:
+        names = sorted(p.name for p in args.root.iterdir() if p.is_dir()) if args.root.exists() else []
+        for name in names:
+            print(f"{name:<16} {registry.current(name) or '(legacy file)'}")
+    elif args.rollback:
+        print(f"{args.name}: now serving {registry.rollback(args.name) or 'the legacy file'}")
+    elif args.activate:
+        print(f"{args.name}: now serving {registry.activate(args.name, args.activate)}")
+    else:
+        _describe(registry, args.name)
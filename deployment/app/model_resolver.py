@@ -0,0 +1,399 @@
+"""
+MODELS FOR ANY SET OF EXOG COLUMNS
+
+forecasting.MODEL_NAMES maps the two covid_dummy / affordable_demo flags
+to four hand-built files. ModelResolver serves a model for any subset of
+the exog columns in datedf.csv, keyed by the set of columns (order does
+not matter):
+
+1. pre-built : one of the four MODEL_NAMES sets -> its registry version
+               or deployment/data file (forecasting.model_path)
+2. fitted    : a model fit earlier for this set on the same input data
+               -> deployment/data/fitted/<data hash>/<columns>.json
+3. fit       : anything else is fit (FIT_SPEC, the pre-built models'
+               orders) on the app's train split in a background process.
+               request() returns a Future right away so the UI can show
+               progress; the artifact is written to 2. for later runs.
+               Concurrent requests for a set being fit share one fit.
+
+Models are kept in a memory-bounded LRU (ModelCache, sized by pickled
+size, $MODEL_CACHE_MB, default 256) shared by every session: the app
+holds one resolver per process (st.cache_resource).
+
+Each served model has a tag, "<name>@<registry version | file>" or
+"fitted/<data hash>/<columns>". It changes whenever the model served for
+a set does (new registry version, regenerated CSVs), so it is the LRU key
+and a safe key for downstream caches.
+
+Requests are counted per set in deployment/data/exog_usage.json (written
+at most every USAGE_FLUSH_S seconds, and at exit); warm_up() loads or fits the
+most-used sets ($MODEL_WARM_UP, default 4) in the background at startup.
+Fits run in a pool of $MODEL_FIT_WORKERS (2) threads: the app is a threaded
+Streamlit server, so forking it can deadlock on a lock held by another
+thread, and spawn / forkserver children re-run __main__, which under
+Streamlit is app.py itself.
+
+USAGE
+    python model_resolver.py covid_dummy aff_demo_lag1      # resolve, fitting if needed
+    python model_resolver.py --usage
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import pickle
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from forecasting import (
+    CURRENT,
+    MODEL_DIR,
+    MODEL_NAMES,
+    data_hash,
+    data_version,
+    exog_key,
+    load_data,
+    load_model,
+    model_path,
+    prebuilt_flags,
+    serving_version,
+    split_train_test,
+)
+
+FITTED_DIR = MODEL_DIR / "fitted"
+USAGE_PATH = MODEL_DIR / "exog_usage.json"
+
+DEFAULT_CACHE_MB = 256
+DEFAULT_FIT_WORKERS = 2
+DEFAULT_WARM_UP = 4
+USAGE_FLUSH_S = 30.0
+# progress estimate until the first fit of this process has finished
+EXPECTED_FIT_S = 5.0
+
+# sets without a pre-built model get the order the pre-built ones use
+FIT_SPEC = {
+    "model_class": "SARIMAX",
+    "order": [1, 0, 0],
+    "seasonal_order": [1, 1, 0, 12],
+    "trend": None,
+    "enforce_stationarity": False,
+    "enforce_invertibility": True,
+}
+
+logger = logging.getLogger("app.models")
+
+
+def set_label(cols) -> str:
+    """The pre-built model's name, else sarimax[col+col]."""
+    flags = prebuilt_flags(cols)
+    if flags is not None:
+        return MODEL_NAMES[flags]
+    return f"sarimax[{'+'.join(exog_key(cols))}]"
+
+
+def _usage_name(key) -> str:
+    return "+".join(key)
+
+
+def _write_json(path: Path, obj) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+    tmp.write_text(json.dumps(obj))
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------
+# FIT (runs inside the process pool)
+# ---------------------------------------------------
+def fit_artifact(spec, endog, exog) -> dict:
+    """Fit `spec` on (endog, exog) and return its compact artifact."""
+    import warnings
+
+    from artifacts import build_model, to_artifact
+
+    # built first: importing statsmodels installs its own warning filters
+    model = build_model(spec, endog, exog)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return to_artifact(model.fit(disp=False))
+
+
+# ---------------------------------------------------
+# LRU
+# ---------------------------------------------------
+def model_nbytes(model) -> int:
+    """Approximate in-memory size of a model: its pickled size."""
+    try:
+        return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return len(json.dumps(getattr(model, "artifact", None)))
+
+
+class ModelCache:
+    """Thread-safe LRU of models, bounded by their total approximate size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()  # tag -> (model, nbytes), least recently used first
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, tag):
+        with self._lock:
+            entry = self._entries.get(tag)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(tag)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, tag, model):
+        nbytes = model_nbytes(model)
+        with self._lock:
+            old = self._entries.pop(tag, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[tag] = (model, nbytes)
+            self.nbytes += nbytes
+            # the newest model stays even if it alone is over the bound
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+                self._stats["evictions"] += 1
+        return model
+
+    def tags(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, models=len(self._entries), nbytes=self.nbytes, max_bytes=self.max_bytes)
+
+
+# ---------------------------------------------------
+# RESOLVER
+# ---------------------------------------------------
+def _resolved(model, source) -> Future:
+    future = Future()
+    future.source = source
+    future.set_result(model)
+    return future
+
+
+class ModelResolver:
+    def __init__(self, max_bytes=None, workers=None, fitted_dir=FITTED_DIR, usage_path=USAGE_PATH):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("MODEL_CACHE_MB", DEFAULT_CACHE_MB)) * 2**20)
+        self.cache = ModelCache(max_bytes)
+        self.workers = int(workers or os.environ.get("MODEL_FIT_WORKERS", DEFAULT_FIT_WORKERS))
+        self.fitted_dir = Path(fitted_dir)
+        self.usage_path = Path(usage_path)
+        self.usage = Counter(self._read_usage())
+        self._usage_flushed = time.monotonic()
+        atexit.register(self.flush_usage)
+        self._lock = threading.Lock()
+        self._pending = {}  # tag -> Future of a load / fit in progress
+        self._executor = None
+        self._data = None  # (data_version(), data hash, shelter counts, exog)
+        self._fit_seconds = deque(maxlen=20)
+        self._stats = {"fits": 0, "fit_errors": 0}
+
+    # ---------------------------------------------------
+    # SOURCES
+    # ---------------------------------------------------
+    def _input_data(self):
+        """Current input data and its content hash, re-read when the files change."""
+        version = data_version()
+        with self._lock:
+            state = self._data
+        if state is None or state[0] != version:
+            data, exog = load_data()
+            state = (version, data_hash()[:12], data, exog)
+            with self._lock:
+                self._data = state
+        return state
+
+    def _source(self, key, version=CURRENT):
+        """(tag, artifact path) of the model served for `key`."""
+        flags = prebuilt_flags(key)
+        if flags is not None:
+            version = serving_version(*flags) if version == CURRENT else version
+            return f"{MODEL_NAMES[flags]}@{version or 'file'}", model_path(*flags, version)
+        digest = self._input_data()[1]
+        name = _usage_name(key)
+        return f"fitted/{digest}/{name}", self.fitted_dir / digest / f"{name}.json"
+
+    def tag(self, cols, version=CURRENT) -> str:
+        """Identity of the model served for `cols` (see module docstring)."""
+        return self._source(exog_key(cols), version)[0]
+
+    # ---------------------------------------------------
+    # RESOLVE
+    # ---------------------------------------------------
+    def request(self, cols, version=CURRENT, count=True) -> Future:
+        """
+        Future of the model for `cols`. It is already done unless a fit had
+        to be started; future.source is "cache", "file" or "fit". `version`
+        pins the registry version of pre-built sets (see forecasting.CURRENT).
+        """
+        key = exog_key(cols)
+        if count:
+            self._count(key)
+        tag, path = self._source(key, version)
+        model = self.cache.get(tag)
+        if model is not None:
+            return _resolved(model, "cache")
+
+        with self._lock:
+            future = self._pending.get(tag)
+            if future is not None:
+                return future
+            future = self._pending[tag] = Future()
+            future.source = "file" if path.exists() else "fit"
+            future.started = time.monotonic()
+
+        if future.source == "file":
+            self._finish(tag, future, lambda: load_model(path))
+        else:
+            self._start_fit(tag, key, path, future)
+        return future
+
+    def get(self, cols, version=CURRENT, timeout=None):
+        return self.request(cols, version).result(timeout)
+
+    def _finish(self, tag, future, load):
+        try:
+            model = self.cache.put(tag, load())
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(tag, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._pending.pop(tag, None)
+        future.set_result(model)
+
+    def _start_fit(self, tag, key, path, future):
+        _, _, data, exog = self._input_data()
+        train, _, train_exog, _ = split_train_test(data.squeeze(), exog, list(key))
+        spec = dict(FIT_SPEC, exog_names=list(key))
+        try:
+            fit = self._pool().submit(fit_artifact, spec, train.asfreq("MS"), train_exog.asfreq("MS"))
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(tag, None)
+            future.set_exception(e)
+            return
+        logger.info("fitting %s in the background", tag)
+        fit.add_done_callback(lambda done: self._finish(tag, future, lambda: self._save_fit(future, path, done)))
+
+    def _save_fit(self, future, path, done):
+        try:
+            artifact = done.result()
+        except Exception:
+            with self._lock:
+                self._stats["fit_errors"] += 1
+            raise
+        _write_json(path, artifact)
+        with self._lock:
+            self._stats["fits"] += 1
+            self._fit_seconds.append(time.monotonic() - future.started)
+        return load_model(path)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model-fit")
+            return self._executor
+
+    def expected_fit_seconds(self) -> float:
+        with self._lock:
+            return statistics.median(self._fit_seconds) if self._fit_seconds else EXPECTED_FIT_S
+
+    def progress(self, future) -> float:
+        """Estimated fraction done of a pending request, from recent fit times (0..0.99)."""
+        if future.done():
+            return 1.0
+        elapsed = time.monotonic() - getattr(future, "started", time.monotonic())
+        return min(0.99, elapsed / self.expected_fit_seconds())
+
+    # ---------------------------------------------------
+    # USAGE + WARM-UP
+    # ---------------------------------------------------
+    def _read_usage(self) -> dict:
+        try:
+            counts = json.loads(self.usage_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return {exog_key(name.split("+") if name else []): int(n) for name, n in counts.items()}
+
+    def _count(self, key):
+        with self._lock:
+            self.usage[key] += 1
+            flush = time.monotonic() - self._usage_flushed >= USAGE_FLUSH_S
+            if flush:
+                self._usage_flushed = time.monotonic()
+        if flush:
+            self.flush_usage()
+
+    def flush_usage(self):
+        with self._lock:
+            counts = {_usage_name(key): n for key, n in self.usage.most_common()}
+        try:
+            _write_json(self.usage_path, counts)
+        except OSError as e:  # read-only deployment: usage just is not persisted
+            logger.warning("could not write %s: %s", self.usage_path, e)
+
+    def warm_up(self, n=None) -> threading.Thread:
+        """Load or fit the `n` most-used sets on a background thread."""
+        n = int(os.environ.get("MODEL_WARM_UP", DEFAULT_WARM_UP)) if n is None else n
+        with self._lock:
+            keys = [key for key, _ in self.usage.most_common(n)]
+
+        def run():
+            futures = {}
+            for key in keys:
+                try:
+                    futures[key] = self.request(key, count=False)
+                except Exception as e:
+                    logger.warning("warm-up of %s failed: %s", set_label(key), e)
+            for key, future in futures.items():
+                if future.exception() is not None:
+                    logger.warning("warm-up of %s failed: %s", set_label(key), future.exception())
+
+        thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update(self._stats, pending=len(self._pending))
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("columns", nargs="*", help="exog columns (none = no exog)")
+    parser.add_argument("--usage", action="store_true", help="print the request counts per set")
+    args = parser.parse_args()
+
+    resolver = ModelResolver()
+    if args.usage:
+        for key, n in resolver.usage.most_common():
+            print(f"{n:>8}  {set_label(key)}")
+    else:
+        start = time.perf_counter()
+        future = resolver.request(args.columns, count=False)
+        model = future.result()
+        print(f"{resolver.tag(args.columns)} ({future.source}, {time.perf_counter() - start:.2f}s)")
+        print(model.summary())
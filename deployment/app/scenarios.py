@@ -0,0 +1,161 @@
+"""
+BATCHED WHAT-IF SCENARIOS FOR THE SARIMAX MODELS
+
+PURPOSE
+Answer "what if affordable demolitions double next year?" for hundreds of
+exogenous paths at once, instead of one get_forecast call per path.
+
+HOW IT WORKS
+In SARIMAX the regression enters the observation equation
+(y_t = x_t'beta + SARIMA noise), so with fixed parameters:
+- the forecast mean is linear in the future exog path, and
+- the forecast variance does not depend on it at all.
+exog_response() therefore runs k+1 forecasts (exog = 0, then a unit path
+per exog column) and every scenario is one einsum over those responses:
+
+    mean[n, h] = base[h] + sum_j paths[n, h, j] * effect[h, j]
+    lower/upper = mean -/+ the (shared) interval half-width
+
+Results come back stacked as an array of shape (scenarios, steps, 3) with
+[..., 0] = mean, [..., 1] = lower, [..., 2] = upper.
+
+Paths start the month after the model's training data. scenario_grid()
+builds a parametric grid around a baseline path: affordable_demo scaled
+by each level, crossed with COVID-style shocks (covid_dummy = 1 for a
+window of months).
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+MEAN, LOWER, UPPER = 0, 1, 2
+
+AFFORDABLE_COL = "affordable_demo"
+SHOCK_COL = "covid_dummy"
+
+
+def model_exog_names(model) -> list:
+    return list(model.model.exog_names) if model.model.k_exog > 0 else []
+
+
+def forecast_index(model, steps):
+    return model.get_forecast(steps=steps, exog=_zeros(model, steps)).predicted_mean.index
+
+
+def _zeros(model, steps):
+    k = len(model_exog_names(model))
+    return np.zeros((steps, k)) if k else None
+
+
+# ---------------------------------------------------
+# RESPONSE TO EXOG (k + 1 forecasts per model / horizon / alpha)
+# ---------------------------------------------------
+def exog_response(model, steps, alpha=0.05):
+    """
+    Returns (index, base_mean, half_width, effect):
+    base_mean (steps,) is the forecast with all exog at 0, half_width
+    (steps, 2) the distance from the mean to the lower / upper bound, and
+    effect (steps, k) the change in the mean per unit of each exog column.
+    """
+    names = model_exog_names(model)
+    base = model.get_forecast(steps=steps, exog=_zeros(model, steps))
+    base_mean = base.predicted_mean.to_numpy()
+    conf = np.asarray(base.conf_int(alpha=alpha))
+    half_width = np.column_stack([base_mean - conf[:, 0], conf[:, 1] - base_mean])
+
+    effect = np.empty((steps, len(names)))
+    for j in range(len(names)):
+        unit = np.zeros((steps, len(names)))
+        unit[:, j] = 1.0
+        effect[:, j] = model.get_forecast(steps=steps, exog=unit).predicted_mean.to_numpy() - base_mean
+
+    return base.predicted_mean.index, base_mean, half_width, effect
+
+
+def evaluate_paths(model, paths, alpha=0.05, response=None):
+    """
+    Forecast every exog path in one vectorized pass.
+
+    `paths` is an array (scenarios, steps, k) with columns in the model's
+    exog order (or a list of DataFrames holding those columns). Pass a
+    precomputed `response` (from exog_response) to skip the k+1 forecasts.
+    Returns (index, stacked) with stacked of shape (scenarios, steps, 3).
+    """
+    names = model_exog_names(model)
+    if not isinstance(paths, np.ndarray):
+        paths = np.stack([np.asarray(p[names], dtype=float) for p in paths]) if names \
+            else np.zeros((len(paths), len(paths[0]), 0))
+    paths = np.asarray(paths, dtype=float)
+    if paths.ndim != 3 or paths.shape[2] != len(names):
+        raise ValueError(f"paths must have shape (scenarios, steps, {len(names)}) for exog {names}")
+
+    steps = paths.shape[1]
+    index, base_mean, half_width, effect = response or exog_response(model, steps, alpha)
+
+    stacked = np.empty(paths.shape[:2] + (3,))
+    stacked[..., MEAN] = base_mean + np.einsum("nhk,hk->nh", paths, effect)
+    stacked[..., LOWER] = stacked[..., MEAN] - half_width[:, 0]
+    stacked[..., UPPER] = stacked[..., MEAN] + half_width[:, 1]
+    return index, stacked
+
+
+# ---------------------------------------------------
+# SCENARIO CONSTRUCTION
+# ---------------------------------------------------
+def baseline_path(model, test_exog, steps) -> pd.DataFrame:
+    """
+    Observed exog over the test window, then the last observed row held
+    constant for any months past the data.
+    """
+    names = model_exog_names(model)
+    index = forecast_index(model, steps)
+    observed = test_exog[names].iloc[:steps] if names else pd.DataFrame(index=test_exog.index[:steps])
+    base = observed.set_axis(index[:len(observed)])
+    return base.reindex(index).ffill().fillna(0.0)
+
+
+def scenario_grid(baseline: pd.DataFrame, affordable_levels=(1.0,), shocks=(None,)):
+    """
+    Cross affordable_demo multipliers with COVID-style shocks.
+
+    `shocks` holds None (baseline covid_dummy) or (first_step, n_months)
+    windows where covid_dummy is set to 1 on top of the baseline. Columns
+    the baseline does not have are left alone, so the grid collapses for
+    models without them. Returns (names, paths) with paths shaped
+    (scenarios, steps, k) in the baseline's column order.
+    """
+    cols = list(baseline.columns)
+    base = baseline.to_numpy(dtype=float)
+    steps = len(base)
+
+    names, paths = [], []
+    for level, shock in itertools.product(affordable_levels, shocks):
+        path = base.copy()
+        label = []
+        if AFFORDABLE_COL in cols:
+            path[:, cols.index(AFFORDABLE_COL)] *= level
+            label.append(f"affordable x{level:g}")
+        if shock is not None and SHOCK_COL in cols:
+            first, length = shock
+            path[first:min(first + length, steps), cols.index(SHOCK_COL)] = 1.0
+            label.append(f"shock m{first + 1}-{first + length}")
+        names.append(", ".join(label) or "baseline")
+        paths.append(path)
+
+    # drop duplicates from dimensions the model does not use
+    unique = dict(zip(names, paths))
+    return list(unique), np.stack(list(unique.values())) if unique else np.empty((0, steps, len(cols)))
+
+
+def summarize(names, index, stacked) -> pd.DataFrame:
+    """One row per scenario: mean over the horizon and the final month with its interval."""
+    return pd.DataFrame(
+        {
+            "scenario": names,
+            "avg_forecast": stacked[..., MEAN].mean(axis=1),
+            f"forecast_{index[-1]:%Y-%m}": stacked[:, -1, MEAN],
+            "lower": stacked[:, -1, LOWER],
+            "upper": stacked[:, -1, UPPER],
+        }
+    ).set_index("scenario")
@@ -0,0 +1,383 @@
+"""
+TIME-SERIES DIAGNOSTICS FOR MODEL IDENTIFICATION
+
+The deployed orders, (1,0,0)(1,1,0,12), were read off ACF / PACF plots
+and unit-root tests outside the repo. This module computes those
+diagnostics for any number of monthly series and turns them into
+candidate orders:
+
+    tests           ADF (H0: unit root) and KPSS (H0: stationary) on the
+                    level, the first, the seasonal and both differences
+    decomposition   STL strength of trend and seasonality (0..1, Wang,
+                    Smith & Hyndman 2006)
+    acf / pacf      lags 0..nlags of the series after the suggested
+                    differencing, with the +-z/sqrt(n) band
+    ljung_box       Q and p-value at every lag of the differenced series
+    residual        Ljung-Box of the residuals of the hinted model: is
+                    anything left for more AR / MA terms?
+    hints           D = 1 if the seasonal strength is >= 0.64, d = 0 if
+                    ADF and KPSS agree the (seasonally differenced)
+                    series is stationary, p / q the leading significant
+                    PACF / ACF lags (<= max_p / max_q), P / Q whether the
+                    PACF / ACF is significant at the seasonal lag
+
+ACF is one FFT per series and Ljung-Box a cumulative sum, so all lags
+cost the same; PACF is a Durbin-Levinson recursion on the ACF. Series are
+diagnosed in parallel (forked processes) from the CLI and train_models.py,
+which are single-threaded; the app diagnoses inline (workers=1) rather than
+forking from its threaded server. scipy / statsmodels are imported on
+first use, so importing this module stays cheap.
+
+Results are cached as JSON in deployment/data/diagnostics/, keyed by a
+hash of the series values, its first month and the settings: only new or
+changed series are recomputed. The app, train_models.py --hints and this
+CLI share the cache.
+
+USAGE
+    python series_diagnostics.py                    # shelter_count + every datedf.csv column
+    python series_diagnostics.py --table ../../data/processed/dhs_metrics.csv --workers 4
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from forecasting import MODEL_DIR, exog_candidates
+
+CACHE_DIR = MODEL_DIR / "diagnostics"
+
+# bump VERSION whenever diagnose() changes what it computes: it is part of
+# the cache key
+SETTINGS = {
+    "version": 1,
+    "nlags": 24,
+    "season": 12,
+    "alpha": 0.05,
+    "max_p": 3,
+    "max_q": 3,
+}
+# nsdiffs() threshold of R's forecast package
+SEASONAL_STRENGTH = 0.64
+
+
+# ---------------------------------------------------
+# SERIES
+# ---------------------------------------------------
+def input_series(data, exog) -> dict:
+    """shelter_count and every exog column of load_data(), by name."""
+    series = {"shelter_count": data["shelter_count"]}
+    series.update((col, exog[col]) for col in exog_candidates(exog))
+    return series
+
+
+def monthly(series: pd.Series) -> pd.Series:
+    """First to last valid month, one row per month, interior gaps interpolated."""
+    series = series.astype(float)
+    series.index = pd.DatetimeIndex(series.index).to_period("M").to_timestamp()
+    series = series[~series.index.duplicated(keep="last")].sort_index()
+    series = series.loc[series.first_valid_index():series.last_valid_index()].asfreq("MS")
+    return series.interpolate()
+
+
+def series_hash(series: pd.Series, settings: dict) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    h.update(str(series.index[0].date()).encode())
+    h.update(np.ascontiguousarray(series.to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+# ---------------------------------------------------
+# STATISTICS (all lags at once)
+# ---------------------------------------------------
+def acf(x, nlags) -> np.ndarray:
+    """Sample autocorrelation at lags 0..nlags (statsmodels' acf, adjusted=False)."""
+    x = np.asarray(x, dtype=float) - np.mean(x)
+    size = 1 << (2 * len(x) - 1).bit_length()
+    spectrum = np.fft.rfft(x, size)
+    cov = np.fft.irfft(spectrum * np.conj(spectrum), size)[: nlags + 1]
+    if cov[0] <= 0:
+        return np.r_[1.0, np.zeros(nlags)]
+    return cov / cov[0]
+
+
+def pacf(r) -> np.ndarray:
+    """Partial autocorrelation from an ACF (Durbin-Levinson)."""
+    out = np.zeros(len(r))
+    out[0] = 1.0
+    a = np.empty(0)
+    for k in range(1, len(r)):
+        den = 1.0 - a @ r[1:k]
+        kk = (r[k] - a @ r[k - 1:0:-1]) / den if den > 1e-12 else 0.0
+        a = np.append(a - kk * a[::-1], kk)
+        out[k] = kk
+    return out
+
+
+def ljung_box(r, n, dof=0):
+    """(Q, p-value) at lags 1..len(r)-1 from the ACF `r` of n observations."""
+    from scipy.stats import chi2
+
+    lags = np.arange(1, len(r))
+    q = n * (n + 2) * np.cumsum(r[1:] ** 2 / (n - lags))
+    df = lags - dof
+    p = np.full(len(lags), np.nan)
+    p[df > 0] = chi2.sf(q[df > 0], df[df > 0])
+    return q, p
+
+
+def difference(x, d, D, season) -> np.ndarray:
+    x = np.asarray(x, dtype=float)
+    for _ in range(D):
+        x = x[season:] - x[:-season]
+    for _ in range(d):
+        x = np.diff(x)
+    return x
+
+
+def leading_significant(values, band, limit) -> int:
+    """Number of consecutive lags from lag 1 outside the band (at most `limit`)."""
+    outside = np.abs(values[1: limit + 1]) > band
+    return int(np.argmin(outside)) if not outside.all() else len(outside)
+
+
+# ---------------------------------------------------
+# ONE SERIES (runs inside the process pool)
+# ---------------------------------------------------
+def _tests(x, alpha) -> dict:
+    from statsmodels.tsa.stattools import adfuller, kpss
+
+    row = {"n": len(x)}
+    try:
+        row["adf_stat"], row["adf_p"] = (float(v) for v in adfuller(x, autolag="AIC")[:2])
+    except Exception:
+        row["adf_stat"] = row["adf_p"] = None
+    try:
+        # p-values outside the table are clipped to [0.01, 0.1]
+        row["kpss_stat"], row["kpss_p"] = (float(v) for v in kpss(x, regression="c", nlags="auto")[:2])
+    except Exception:
+        row["kpss_stat"] = row["kpss_p"] = None
+    row["stationary"] = (
+        row["adf_p"] is not None and row["kpss_p"] is not None
+        and row["adf_p"] < alpha and row["kpss_p"] > alpha
+    )
+    return row
+
+
+def _strengths(x, season) -> dict:
+    from statsmodels.tsa.seasonal import STL
+
+    res = STL(x, period=season, robust=True).fit()
+    remainder = res.resid
+    return {
+        "trend_strength": float(max(0.0, 1 - np.var(remainder) / np.var(res.trend + remainder))),
+        "seasonal_strength": float(max(0.0, 1 - np.var(remainder) / np.var(res.seasonal + remainder))),
+    }
+
+
+def _residual_check(x, order, seasonal_order, nlags, alpha) -> dict:
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    trend = "c" if order[1] + seasonal_order[1] == 0 else None
+    res = SARIMAX(x, order=order, seasonal_order=seasonal_order, trend=trend,
+                  enforce_stationarity=False).fit(disp=False)
+    # skip the burn-in of the differencing
+    resid = np.asarray(res.resid)[order[1] + seasonal_order[1] * seasonal_order[3]:]
+    nlags = min(nlags, len(resid) // 2)
+    dof = order[0] + order[2] + seasonal_order[0] + seasonal_order[2]
+    q, p = ljung_box(acf(resid, nlags), len(resid), dof)
+    return {
+        "q": q.tolist(),
+        "p": p.tolist(),
+        "white_noise": bool(np.nan_to_num(p[-1], nan=1.0) > alpha),
+        "converged": bool(res.mle_retvals.get("converged", False)),
+    }
+
+
+def diagnose(job) -> dict:
+    """Every diagnostic for one series; never raises (failures go to "error")."""
+    import warnings
+
+    import statsmodels.tsa.api  # noqa: F401  (its warning filters first, ours on top)
+    from scipy.stats import norm
+
+    name, key, values, start, settings = job
+    season, alpha = settings["season"], settings["alpha"]
+    began = time.perf_counter()
+    row = {"name": name, "hash": key, "start": start, "n": len(values), "error": ""}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            seasonal = len(values) >= 2 * season + 2
+            row["tests"] = {
+                f"d{d}D{D}": _tests(difference(values, d, D, season), alpha)
+                for D in ((0, 1) if seasonal else (0,))
+                for d in (0, 1)
+            }
+            row.update(_strengths(values, season) if seasonal
+                       else {"trend_strength": None, "seasonal_strength": None})
+
+            D = int(seasonal and row["seasonal_strength"] >= SEASONAL_STRENGTH)
+            d = 0 if row["tests"][f"d0D{D}"]["stationary"] else 1
+            x = difference(values, d, D, season)
+            nlags = min(settings["nlags"], len(x) // 2 - 1)
+            r = acf(x, nlags)
+            partial = pacf(r)
+            band = float(norm.ppf(1 - alpha / 2) / np.sqrt(len(x)))
+            q_stat, p_value = ljung_box(r, len(x))
+
+            P = int(nlags >= season and abs(partial[season]) > band)
+            Q = int(nlags >= season and abs(r[season]) > band)
+            order = [leading_significant(partial, band, settings["max_p"]), d,
+                     leading_significant(r, band, settings["max_q"])]
+            seasonal_order = [P, D, Q, season]
+
+            row.update(
+                acf=r.tolist(),
+                pacf=partial.tolist(),
+                band=band,
+                ljung_box={"q": q_stat.tolist(), "p": p_value.tolist()},
+                hints={"order": order, "seasonal_order": seasonal_order},
+            )
+            try:
+                row["residual"] = _residual_check(values, tuple(order), tuple(seasonal_order),
+                                                  settings["nlags"], alpha)
+            except Exception as e:
+                row["residual"] = {"error": f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.perf_counter() - began, 3)
+    return row
+
+
+# ---------------------------------------------------
+# BATCH + CACHE
+# ---------------------------------------------------
+def _executor(workers):
+    # fork only: spawn / forkserver children re-import __main__; callers
+    # are the single-threaded CLIs, the app passes workers=1
+    if "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _write_json(path: Path, obj) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+    tmp.write_text(json.dumps(obj))
+    os.replace(tmp, path)
+
+
+def diagnose_all(series, workers=None, cache_dir=CACHE_DIR, force=False, **settings) -> dict:
+    """
+    name -> diagnose() result for every series (a dict of Series or a
+    DataFrame), in input order. Cached results are read from `cache_dir`
+    ("cached": True); the rest are computed across `workers` processes
+    (1 = inline) and written there.
+    """
+    settings = dict(SETTINGS, **settings)
+    cache_dir = Path(cache_dir)
+    results, jobs, paths = {}, [], {}
+    for name, values in dict(series.items()).items():
+        values = monthly(values)
+        key = series_hash(values, settings)
+        path = cache_dir / f"{key[:32]}.json"
+        if path.is_file() and not force:
+            try:
+                results[name] = dict(json.loads(path.read_text()), name=name, cached=True)
+                continue
+            except ValueError:
+                pass  # torn or stale file: recompute
+        paths[name] = path
+        jobs.append((name, key, values.to_numpy(), str(values.index[0].date()), settings))
+
+    if len(jobs) > 1 and workers != 1:
+        with _executor(workers) as pool:
+            rows = list(pool.map(diagnose, jobs))
+    else:
+        rows = [diagnose(job) for job in jobs]
+
+    for row in rows:
+        if not row["error"]:
+            _write_json(paths[row["name"]], row)
+        results[row["name"]] = dict(row, cached=False)
+    return {name: results[name] for name in series.keys()}
+
+
+# ---------------------------------------------------
+# HINTS + SUMMARY
+# ---------------------------------------------------
+def hint_grid(result, spread=1, max_p=SETTINGS["max_p"], max_q=SETTINGS["max_q"]) -> dict:
+    """
+    train_models.order_grid() arguments around the hinted order: p / q
+    +-spread, P / Q either way, d and D as hinted.
+    """
+    (p, d, q), (P, D, Q, s) = result["hints"]["order"], result["hints"]["seasonal_order"]
+
+    def around(v, top):
+        return list(range(max(0, v - spread), min(top, v + spread) + 1))
+
+    return {"p": around(p, max_p), "d": [d], "q": around(q, max_q),
+            "P": [0, 1], "D": [D], "Q": [0, 1], "s": s}
+
+
+def summary_table(results) -> pd.DataFrame:
+    """One row per series: stationarity, strengths, hinted order, residual check."""
+    rows = []
+    for name, r in results.items():
+        if r["error"]:
+            rows.append({"series": name, "error": r["error"]})
+            continue
+        level = r["tests"]["d0D0"]
+        residual = r.get("residual", {})
+        rows.append({
+            "series": name,
+            "n": r["n"],
+            "adf_p": level["adf_p"],
+            "kpss_p": level["kpss_p"],
+            "trend_strength": r["trend_strength"],
+            "seasonal_strength": r["seasonal_strength"],
+            "order": tuple(r["hints"]["order"]),
+            "seasonal_order": tuple(r["hints"]["seasonal_order"]),
+            "residual_lb_p": residual["p"][-1] if "p" in residual else None,
+            "white_noise": residual.get("white_noise"),
+            "cached": r["cached"],
+            "error": "",
+        })
+    return pd.DataFrame(rows).set_index("series")
+
+
+if __name__ == "__main__":
+    from columnar_cache import read_table
+    from forecasting import load_data
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", type=Path, default=None,
+                        help="diagnose every column of this wide table (first column = date) instead")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="recompute cached series")
+    parser.add_argument("--nlags", type=int, default=SETTINGS["nlags"])
+    parser.add_argument("--alpha", type=float, default=SETTINGS["alpha"])
+    args = parser.parse_args()
+
+    if args.table:
+        frame = read_table(args.table)
+        series = frame.set_index(frame.columns[0])
+    else:
+        series = input_series(*load_data())
+
+    start = time.perf_counter()
+    results = diagnose_all(series, args.workers, force=args.force, nlags=args.nlags, alpha=args.alpha)
+    table = summary_table(results)
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        print(table.drop(columns="error" if not table["error"].any() else []).round(3).to_string())
+    print(f"{len(table)} series ({int(table['cached'].sum())} cached) in {time.perf_counter() - start:.1f}s "
+          f"-> {CACHE_DIR}")
@@ -0,0 +1,206 @@
+"""
+ROLLING-ORIGIN BACKTESTING
+
+PURPOSE
+The app scores each model on a single 80/20 split. This script measures
+forecast stability instead: it walks the forecast origin forward one month
+at a time and records the error at every horizon.
+
+WORKFLOW
+1. Load the shelter series (fact_shelter.csv) and exog (datedf.csv) the
+   same way the app does.
+2. For every deployed exog variant (sarimax_both/covid/aff/none.json),
+   fit the variant's spec once on the first `initial` months.
+3. Walk the origin forward:
+      expanding : results.extend(...) filters only the new month into the
+                  existing state (no refit, no re-filtering of history)
+      sliding   : results.apply(...) re-filters the last `window` months
+                  with the fitted parameters (no refit)
+   Optionally refit parameters every `refit_every` origins.
+4. Build an (origin x horizon) error matrix per variant and compute RMSE
+   and MAPE per horizon and per origin with vectorized NumPy reductions.
+5. Variants x schemes run in parallel across a process pool.
+
+OUTPUTS (deployment/data/)
+- backtest_by_horizon.csv
+- backtest_by_origin.csv
+
+USAGE
+    python backtest.py --initial 48 --horizon 12 --scheme expanding sliding
+"""
+import argparse
+import json
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from forecasting import MODEL_DIR, MODEL_NAMES, load_data  # noqa: E402
+
+BY_HORIZON_PATH = MODEL_DIR / "backtest_by_horizon.csv"
+BY_ORIGIN_PATH = MODEL_DIR / "backtest_by_origin.csv"
+
+
+# ---------------------------------------------------
+# DATA + SPECS
+# ---------------------------------------------------
+def load_series():
+    data, exog = load_data()
+    target = data["shelter_count"].asfreq("MS").astype(float)
+    exog = exog.asfreq("MS")
+    return target, exog
+
+
+def load_variant_specs():
+    """Model spec of every deployed exog variant, read from its compact artifact."""
+    specs = {}
+    for name in MODEL_NAMES.values():
+        path = MODEL_DIR / f"{name}.json"
+        if path.exists():
+            specs[name] = json.loads(path.read_text())["spec"]
+    return specs
+
+
+def _fit(spec, y, x):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(
+        y,
+        exog=x,
+        order=tuple(spec["order"]),
+        seasonal_order=tuple(spec["seasonal_order"]),
+        trend=spec["trend"],
+        enforce_stationarity=spec.get("enforce_stationarity", True),
+        enforce_invertibility=spec.get("enforce_invertibility", True),
+    )
+    return model.fit(disp=False)
+
+
+# ---------------------------------------------------
+# BACKTEST ONE VARIANT
+# ---------------------------------------------------
+def backtest_variant(job):
+    """
+    Return the (origin x horizon) matrices of actuals and forecasts.
+
+    Origins are the index positions where the forecast starts; row i
+    forecasts target[origins[i] : origins[i] + horizon].
+    """
+    name, spec, scheme, target, exog, initial, horizon, window, refit_every = job
+    cols = spec["exog_names"]
+    x_all = exog[cols] if cols else None
+
+    def x(a, b):
+        return None if x_all is None else x_all.iloc[a:b]
+
+    n = len(target)
+    origins = range(initial, n)
+    forecasts = np.full((len(origins), horizon), np.nan)
+    actuals = np.full((len(origins), horizon), np.nan)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        res = _fit(spec, target.iloc[:initial], x(0, initial))
+
+        for i, t in enumerate(origins):
+            if i > 0:
+                # a window longer than --initial uses every month until it fills
+                start = max(0, t - window) if scheme == "sliding" else 0
+                if refit_every and i % refit_every == 0:
+                    res = _fit(spec, target.iloc[start:t], x(start, t))
+                elif scheme == "expanding":
+                    # filter only the newly observed month into the state
+                    res = res.extend(target.iloc[t - 1:t], exog=x(t - 1, t))
+                else:
+                    res = res.apply(target.iloc[start:t], exog=x(start, t))
+
+            steps = min(horizon, n - t)
+            forecasts[i, :steps] = res.forecast(steps=steps, exog=x(t, t + steps)).values
+            actuals[i, :steps] = target.values[t:t + steps]
+
+    return name, scheme, target.index[initial:], actuals, forecasts
+
+
+# ---------------------------------------------------
+# METRICS (vectorized over origins and horizons)
+# ---------------------------------------------------
+def error_metrics(actuals, forecasts, axis):
+    err = forecasts - actuals
+    rmse = np.sqrt(np.nanmean(err ** 2, axis=axis))
+    mape = np.nanmean(np.abs(err) / np.abs(actuals), axis=axis) * 100
+    count = np.sum(~np.isnan(err), axis=axis)
+    return rmse, mape, count
+
+
+def summarize(results):
+    by_horizon, by_origin = [], []
+    for name, scheme, origin_dates, actuals, forecasts in results:
+        rmse, mape, count = error_metrics(actuals, forecasts, axis=0)
+        by_horizon.append(pd.DataFrame({
+            "variant": name,
+            "scheme": scheme,
+            "horizon": np.arange(1, actuals.shape[1] + 1),
+            "rmse": rmse,
+            "mape": mape,
+            "n_origins": count,
+        }))
+
+        rmse, mape, count = error_metrics(actuals, forecasts, axis=1)
+        by_origin.append(pd.DataFrame({
+            "variant": name,
+            "scheme": scheme,
+            "origin": origin_dates,
+            "rmse": rmse,
+            "mape": mape,
+            "n_horizons": count,
+        }))
+    return pd.concat(by_horizon, ignore_index=True), pd.concat(by_origin, ignore_index=True)
+
+
+def run_backtest(schemes=("expanding", "sliding"), initial=48, horizon=12,
+                 window=None, refit_every=0, workers=None):
+    target, exog = load_series()
+    specs = load_variant_specs()
+    window = initial if window is None else window
+
+    jobs = [
+        (name, spec, scheme, target, exog, initial, horizon, window, refit_every)
+        for name, spec in specs.items()
+        for scheme in schemes
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(backtest_variant, jobs))
+
+    return summarize(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of every exog variant.")
+    parser.add_argument("--scheme", nargs="+", choices=["expanding", "sliding"],
+                        default=["expanding", "sliding"])
+    parser.add_argument("--initial", type=int, default=48, help="months in the first training window")
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--window", type=int, default=None,
+                        help="sliding window length (default: --initial)")
+    parser.add_argument("--refit-every", type=int, default=0,
+                        help="re-estimate parameters every N origins (0 = never)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    by_horizon, by_origin = run_backtest(
+        args.scheme, args.initial, args.horizon, args.window, args.refit_every, args.workers
+    )
+    by_horizon.to_csv(BY_HORIZON_PATH, index=False)
+    by_origin.to_csv(BY_ORIGIN_PATH, index=False)
+
+    print(
+        by_horizon.pivot_table(index="horizon", columns=["variant", "scheme"], values="rmse")
+        .round(0)
+        .to_string()
+    )
+    print(f"\nwrote {BY_HORIZON_PATH.name} and {BY_ORIGIN_PATH.name}")
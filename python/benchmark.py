@@ -0,0 +1,405 @@
+"""
+BENCHMARK SUITE (ETL, EDA QUERIES, MODEL LOAD AND FORECAST HOT PATHS)
+
+PURPOSE
+Tell whether a change makes the project faster or slower before the data
+volume or the number of served models is scaled up.
+
+WHAT IS MEASURED
+For every scale factor (1x, 10x, 100x copies of fact_demolitions):
+  etl.build_facts      the create_schema.py stages demo.read -> demo.facts
+                       (pipeline.py, every stage forced, outputs memoized as in
+                       a real build) over a synthetic raw DCP extract rebuilt
+                       from data/processed/fact_demolitions.csv
+  etl.db_load          upsert facts, dims and shelters into a fresh database
+  etl.rollups          refresh_rollups + refresh_features (every month dirty)
+  etl.csv_export       fact_demolitions.csv
+  etl.columnar_cache   columnar_cache.write_table of fact_demolitions.csv
+  eda.ztest_counts     the queries eda_hypothesistest.py runs
+  eda.monthly_counts
+  eda.shelter_counts
+  eda.duration_stats
+Once, against the deployed files:
+  etl.dhs_clean        dhs_etl.shelter_facts over data/DHS_Data_Dashboard.csv
+  etl.dhs_metrics      dhs_etl.metrics_wide (every metric column) over the same file
+  app.load_data.cold   load_data() of temporary copies of the CSVs, their
+                       columnar cache removed before every run
+  app.load_data.warm   load_data() from the columnar cache
+  app.load_model.<m>   load_model_by_exog for each exog combination
+  app.get_forecast.<m> run_forecast over the test window
+  app.summary.<m>      results.summary()
+
+Each benchmark reports the median wall time over --repeat runs (after an
+untimed warm-up run) and the peak Python heap (tracemalloc, one extra
+instrumented run; memory held inside SQLite is not included). Untimed setup (synthetic files, fresh
+database copies) runs before every repetition.
+
+BASELINE
+Results are compared against python/benchmark_baseline.json: a benchmark
+regresses when its fastest run exceeds the baseline's by more than
+--threshold (default 25%, and by at least --min-delta-ms; --etl-min-delta-ms
+for the disk-bound etl.* benchmarks) or its peak memory by more than
+--mem-threshold. The fastest run, not the median, is compared because
+scheduler and I/O noise only ever add time. The exit
+status is 1 when anything regressed. Timings are machine-specific:
+record a baseline on the machine you compare on (--save-baseline).
+
+USAGE
+    python benchmark.py                         # 1x + 10x, compare to baseline
+    python benchmark.py --scales 1 10 100 --repeat 5
+    python benchmark.py --only app. --save-baseline
+"""
+import argparse
+import json
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+import columnar_cache  # noqa: E402
+import eda_queries  # noqa: E402
+from create_schema import build_stages  # noqa: E402
+from db_loader import connect, ensure_schema, refresh_rollups, transaction, upsert  # noqa: E402
+from demolition_etl import (  # noqa: E402
+    dimension_frames,
+    forprofit_ownership,
+    nonprofit_ownership,
+    public_ownership,
+)
+from dhs_etl import metrics_wide, shelter_facts  # noqa: E402
+from fact_tables import read_facts_csv  # noqa: E402
+from feature_store import refresh_features  # noqa: E402
+from forecasting import (  # noqa: E402
+    EXOG_PATH,
+    MODEL_NAMES,
+    PROCESSED_DIR,
+    SHELTER_PATH,
+    load_data,
+    load_model_by_exog,
+    run_forecast,
+    split_train_test,
+)
+from pipeline import Pipeline  # noqa: E402
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+DHS_PATH = REPO_DIR / "data" / "DHS_Data_Dashboard.csv"
+BASELINE_PATH = Path(__file__).resolve().parent / "benchmark_baseline.json"
+
+EDA_START, EDA_END = "2016-01-01", "2023-01-01"
+
+
+# ---------------------------------------------------
+# HARNESS
+# ---------------------------------------------------
+def measure(fn, setup=None, repeat=3):
+    """Median wall time of fn(setup()) over `repeat` runs, plus peak heap of one run."""
+    # untimed warm-up: lazy imports and first-call caches are not what we measure
+    fn(setup() if setup else None)
+
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = setup() if setup else None
+    tracemalloc.start()
+    try:
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "peak_mb": peak / 2**20,
+        "repeat": repeat,
+    }
+
+
+class Suite:
+    def __init__(self, repeat=3, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def run(self, name, fn, setup=None):
+        if not self.wanted(name):
+            return
+        result = measure(fn, setup, self.repeat)
+        self.results[name] = result
+        print(f"{name:<40} {result['seconds'] * 1e3:>10.2f} ms {result['peak_mb']:>9.1f} MB")
+
+
+# ---------------------------------------------------
+# SYNTHETIC DATA
+# ---------------------------------------------------
+def synthetic_extract(path, scale, seed=0):
+    """
+    Raw DCP extract with `scale` copies of every fact_demolitions row (new
+    BINs per copy) plus ~20% rows the ETL filters out, in the raw layout.
+    """
+    rng = np.random.default_rng(seed)
+    facts = read_facts_csv(PROCESSED_DIR / "fact_demolitions.csv")
+    n = len(facts)
+
+    owners = {
+        1: sorted(forprofit_ownership),
+        2: sorted(nonprofit_ownership),
+        3: sorted(public_ownership),
+    }
+
+    frames = []
+    for copy in range(scale):
+        ownership = np.empty(n, dtype=object)
+        for oid, names in owners.items():
+            mask = (facts["ownership_id"] == oid).to_numpy()
+            ownership[mask] = rng.choice(names, mask.sum())
+        frames.append(pd.DataFrame({
+            "Job_Number": np.arange(n) + copy * n,
+            "Job_Type": np.where(facts["job_typeid"] == 1, "New Building", "Demolition"),
+            "Job_Status": "5. Completed Construction",
+            # BINs are 7 digits; copies stay within int32 up to 200x
+            "BIN": facts["bin"].to_numpy("int64") + copy * 10**7,
+            "Boro": facts["borough"].cat.codes.to_numpy() + 1,
+            "ResidFlag": "Residential",
+            "NonresFlag": "",
+            "DateFiled": facts["date_filed"].dt.strftime("%m/%d/%Y").to_numpy(),
+            "DateComplt": facts["date_completed"].dt.strftime("%m/%d/%Y").to_numpy(),
+            "Ownership": ownership,
+        }))
+    raw = pd.concat(frames, ignore_index=True)
+
+    # rows the filters drop: other job types / statuses
+    noise = raw.sample(frac=0.2, random_state=seed)
+    noise["Job_Type"] = "Alteration"
+    noise["Job_Status"] = "3. Permitted"
+    raw = pd.concat([raw, noise], ignore_index=True).sample(frac=1.0, random_state=seed)
+
+    # unused columns, so the reader has to skip realistic row widths
+    for i in range(20):
+        raw[f"Filler_{i}"] = rng.integers(0, 1000, len(raw))
+
+    raw.to_csv(path, index=False)
+
+
+def build_facts(extract, workdir):
+    """demo.read -> demo.facts exactly as create_schema.py runs them (full build, nothing cached)."""
+    workdir = Path(workdir)
+    stages = build_stages(demolitions=extract, dhs=DHS_PATH, db=workdir / "unused.db",
+                          processed_dir=workdir / "processed", datedf=workdir / "datedf.csv")
+    pipeline = Pipeline(stages, workdir / "pipeline", workers=1)
+    pipeline.run(["demo.facts"], force=["all"], log=None)
+    ids = pipeline.value("demo.dimensions")
+    return [pipeline.value("demo.facts")], dict(ids["ownership"]), dict(ids["jobtype"])
+
+
+def load_db(db_path, chunks, ownership_ids, jobtype_ids, shelters):
+    conn = connect(db_path)
+    ensure_schema(conn)
+    dim_ownership, dim_jobtype = dimension_frames(ownership_ids, jobtype_ids)
+    with transaction(conn):
+        for chunk in chunks:
+            upsert(conn, "fact_demolitions", chunk)
+        upsert(conn, "dim_ownership", dim_ownership, update=False)
+        upsert(conn, "dim_jobtype", dim_jobtype, update=False)
+        upsert(conn, "fact_shelters", shelters)
+    conn.close()
+
+
+def fresh_path(workdir, name):
+    path = Path(workdir) / name
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    return path
+
+
+# ---------------------------------------------------
+# BENCHMARKS
+# ---------------------------------------------------
+def bench_scale(suite, scale, workdir):
+    tag = f"@{scale}x"
+    extract = Path(workdir) / f"extract_{scale}x.csv"
+    synthetic_extract(extract, scale)
+    shelters = shelter_facts(pd.read_csv(DHS_PATH))
+
+    suite.run(f"etl.build_facts{tag}", lambda _: build_facts(extract, workdir))
+    chunks, ownership_ids, jobtype_ids = build_facts(extract, workdir)
+
+    suite.run(
+        f"etl.db_load{tag}",
+        lambda db: load_db(db, chunks, ownership_ids, jobtype_ids, shelters),
+        setup=lambda: fresh_path(workdir, "bench_load.db"),
+    )
+
+    # a loaded database whose rollups are still pending
+    loaded = fresh_path(workdir, f"loaded_{scale}x.db")
+    load_db(loaded, chunks, ownership_ids, jobtype_ids, shelters)
+
+    def copy_loaded():
+        target = fresh_path(workdir, "bench_rollups.db")
+        shutil.copy(loaded, target)
+        return target
+
+    def rollups(db):
+        conn = connect(db)
+        with transaction(conn):
+            refresh_features(conn, refresh_rollups(conn))
+        conn.close()
+
+    suite.run(f"etl.rollups{tag}", rollups, setup=copy_loaded)
+
+    csv_path = Path(workdir) / "fact_demolitions.csv"
+
+    def export(_):
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(csv_path, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+
+    suite.run(f"etl.csv_export{tag}", export)
+    export(None)
+    suite.run(f"etl.columnar_cache{tag}", lambda _: columnar_cache.write_table(csv_path, read_facts_csv(csv_path)))
+
+    # EDA queries against the fully refreshed database
+    rollups(loaded)
+    conn = sqlite3.connect(loaded)
+    suite.run(f"eda.ztest_counts{tag}", lambda _: eda_queries.ownership_ztest_counts(conn, EDA_START, EDA_END))
+    suite.run(f"eda.monthly_counts{tag}", lambda _: eda_queries.monthly_counts(conn, EDA_START, EDA_END))
+    suite.run(f"eda.shelter_counts{tag}", lambda _: eda_queries.shelter_counts(conn, EDA_START, EDA_END))
+    suite.run(f"eda.duration_stats{tag}", lambda _: eda_queries.duration_stats(conn, EDA_START, EDA_END))
+    conn.close()
+
+
+def bench_app(suite, workdir):
+    suite.run("etl.dhs_clean", lambda _: shelter_facts(pd.read_csv(DHS_PATH)))
+    suite.run("etl.dhs_metrics", lambda _: metrics_wide(pd.read_csv(DHS_PATH)))
+
+    # cold reads build the cache of copies, never touching the deployed caches
+    copies = Path(workdir) / "load_data"
+    copies.mkdir()
+    sources = [Path(shutil.copy2(source, copies / source.name)) for source in (SHELTER_PATH, EXOG_PATH)]
+
+    def drop_cache():
+        for source in sources:
+            shutil.rmtree(columnar_cache.cache_dir(source), ignore_errors=True)
+
+    suite.run("app.load_data.cold", lambda _: load_data(*sources), setup=drop_cache)
+    load_data()
+    suite.run("app.load_data.warm", lambda _: load_data())
+
+    data, exog = load_data()
+    _, test, _, test_exog = split_train_test(data.squeeze(), exog)
+    for flags, name in MODEL_NAMES.items():
+        suite.run(f"app.load_model.{name}", lambda _, f=flags: load_model_by_exog(*f))
+        model = load_model_by_exog(*flags)
+        suite.run(f"app.get_forecast.{name}", lambda _, m=model: run_forecast(m, test, test_exog))
+        suite.run(f"app.summary.{name}", lambda _, m=model: str(m.summary()))
+
+
+# ---------------------------------------------------
+# BASELINE COMPARISON
+# ---------------------------------------------------
+def compare(results, baseline, threshold, mem_threshold, min_delta_ms=2.0, etl_min_delta_ms=150.0):
+    rows = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        # ETL runs write CSVs / databases: +-50 ms of I/O jitter even on an unchanged tree
+        floor_ms = etl_min_delta_ms if name.startswith("etl.") else min_delta_ms
+        # fastest runs: noise only ever adds time, so the minimum is the stable statistic
+        time_ratio = cur["min_seconds"] / base["min_seconds"] if base["min_seconds"] else np.nan
+        mem_ratio = cur["peak_mb"] / base["peak_mb"] if base["peak_mb"] else np.nan
+        rows.append({
+            "benchmark": name,
+            "baseline_ms": base["min_seconds"] * 1e3,
+            "current_ms": cur["min_seconds"] * 1e3,
+            "time_ratio": time_ratio,
+            "baseline_mb": base["peak_mb"],
+            "current_mb": cur["peak_mb"],
+            "mem_ratio": mem_ratio,
+            # jitter below the floor is not a regression
+            "regressed": bool(
+                (time_ratio > 1 + threshold and (cur["min_seconds"] - base["min_seconds"]) * 1e3 > floor_ms)
+                or mem_ratio > 1 + mem_threshold
+            ),
+        })
+    return pd.DataFrame(rows)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name starts with one of these prefixes")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--mem-threshold", type=float, default=0.25, help="allowed peak memory growth")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument("--etl-min-delta-ms", type=float, default=150.0,
+                        help="the same floor for the etl.* benchmarks")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--out", type=Path, help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    suite = Suite(repeat=args.repeat, only=args.only)
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        bench_app(suite, workdir)
+        if not args.only or any(not prefix.startswith("app.") for prefix in args.only):
+            for scale in args.scales:
+                bench_scale(suite, scale, workdir)
+
+    report = {"environment": environment(), "results": suite.results}
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=1))
+
+    status = 0
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())["results"]
+        table = compare(suite.results, baseline, args.threshold, args.mem_threshold,
+                        args.min_delta_ms, args.etl_min_delta_ms)
+        if not table.empty:
+            print()
+            print(table.round(2).to_string(index=False))
+            regressed = table.loc[table["regressed"], "benchmark"].tolist()
+            if regressed:
+                print(f"\nREGRESSED (> {args.threshold:.0%} time or > {args.mem_threshold:.0%} memory): {', '.join(regressed)}")
+                status = 1
+
+    if args.save_baseline:
+        if args.baseline.exists():
+            # keep entries for benchmarks this run skipped
+            previous = json.loads(args.baseline.read_text())["results"]
+            report["results"] = {**previous, **suite.results}
+        args.baseline.write_text(json.dumps(report, indent=1))
+        print(f"\nbaseline written to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
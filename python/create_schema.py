@@ -1,23 +1,91 @@
 # %%
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# %%
-# PATH TO DEMOLITION AND HOMELESS DATA (add to your own path)
-demolition_path = "/Users/beans/Desktop/TeamHousing/data/HousingDB_post2010.csv"
-homeless_path = "/Users/beans/Desktop/TeamHousing/data/DHS_Data_Dashboard.csv"
-
-demo_raw=pd.read_csv(demolition_path)
-homeless_raw=pd.read_csv(homeless_path)
+"""
+STAR-SCHEMA BUILD FOR nyc_demolitions.db AS A PIPELINE OF STAGES
+
+PURPOSE
+Build the processed tables, the database and the model features from the
+two raw extracts. The build is a DAG of named stages (pipeline.py): each
+stage's output is memoized by content hash, the demolition and DHS
+branches run concurrently, and a rerun only recomputes the stages whose
+code, parameters or inputs changed. Editing one transformation no longer
+re-parses the raw extracts.
+
+STAGES
+    state            database watermarks + dimension ids (--incremental),
+                     or the published defaults (full build)
+    demo.read        DCP extract read in chunks, only the rows meeting the
+                     filtering criteria kept (compact dtypes)
+    demo.filter      the watermark (incremental runs)
+    demo.features    completion time, month, ownership, one row per BIN
+    demo.dimensions  ownership / job type ids
+    demo.facts       fact_demolitions rows
+    dhs.read         DHS dashboard export
+    dhs.shelters     fact_shelters rows
+    dhs.metrics      every dashboard metric, wide (fact_dhs_metrics)
+    db.load          upserts in one transaction, rollups, watermarks
+    export.csv       data/processed CSVs (from the database when incremental)
+    features.datedf  deployment/data/datedf.csv
+    cache.columnar   columnar copies of every written table
+
+Stage outputs are kept in data/processed/.pipeline/ (see --cache-dir).
+
+USAGE
+    python create_schema.py                          # full build, cached stages skipped
+    python create_schema.py --incremental            # only records past the watermarks
+    python create_schema.py --list
+    python create_schema.py --only demo.facts        # one stage and what it needs
+    python create_schema.py --force demo.features    # rerun a stage even if cached
+    python create_schema.py --force all --demolitions /path/to/HousingDB_post2010.csv
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
 
+import pandas as pd
 
-# %%
-homeless_raw['Report Date'] = pd.to_datetime(
-    homeless_raw['Report Date'],
-    errors='coerce'
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from columnar_cache import file_sha256, write_table  # noqa: E402
+import db_loader  # noqa: E402
+from db_loader import connect, ensure_schema, refresh_rollups, transaction, upsert  # noqa: E402
+import demolition_etl  # noqa: E402
+import dhs_etl  # noqa: E402
+import feature_store  # noqa: E402
+from demolition_etl import (  # noqa: E402
+    DEFAULT_JOBTYPE_IDS,
+    DEFAULT_OWNERSHIP_IDS,
+    CHUNKSIZE,
+    add_features,
+    assign_ids,
+    dedupe_bins,
+    dimension_frames,
+    read_filtered,
+    to_fact,
 )
+from dhs_etl import long_to_wide, metrics_long, metrics_wide, shelter_facts  # noqa: E402
+from eda_queries import DB_PATH  # noqa: E402
+from fact_tables import read_facts_csv  # noqa: E402
+from feature_store import EXOG_PATH, refresh_features, write_datedf  # noqa: E402
+from forecasting import PROCESSED_DIR  # noqa: E402
+from incremental_load import dimension_ids, export_processed, filter_since, get_watermark, set_watermark  # noqa: E402
+from pipeline import Pipeline, Stage  # noqa: E402
+
+# RAW EXTRACTS (override with --demolitions / --dhs)
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+DEMOLITION_PATH = DATA_DIR / "HousingDB_post2010.csv"
+HOMELESS_PATH = DATA_DIR / "DHS_Data_Dashboard.csv"
+
+# PROCESSED DIMENSION / FACT TABLES, by file name under --processed-dir
+PROCESSED_FILES = {
+    "dim_jobtype": "dim_jobtype.csv",
+    "dim_ownership": "dim_ownership.csv",
+    "fact_demolitions": "fact_demolitions.csv",
+    "fact_shelters": "fact_shelter.csv",
+    "dhs_metrics": "dhs_metrics.csv",
+}
+
+PIPELINE_DIRNAME = ".pipeline"
 
 # %% [markdown]
 # # Filtered Datasets Specifications & Processing
@@ -102,273 +170,262 @@ homeless_raw['Report Date'] = pd.to_datetime(
 # 
 
 # %%
-# ------------------------------------------------------------------
-# 0. Create a working copy
-# ------------------------------------------------------------------
-demo_eda = demo_raw.copy()
-
-# ------------------------------------------------------------------
-# 1. Ensure proper data types
-# ------------------------------------------------------------------
-demo_eda['DateFiled'] = pd.to_datetime(demo_eda['DateFiled'], errors='coerce')
-demo_eda['DateComplt'] = pd.to_datetime(demo_eda['DateComplt'], errors='coerce')
-
-# ------------------------------------------------------------------
-# 2. Apply filtering criteria
-# ------------------------------------------------------------------
-demo_eda = demo_eda[
-    (demo_eda['Job_Type'].isin(['New Building', 'Demolition'])) &
-    (demo_eda['Job_Status'] == '5. Completed Construction') &
-    (demo_eda['ResidFlag'] == 'Residential') &
-    (demo_eda['NonresFlag'].isna()) &
-    (demo_eda['DateFiled'].notna()) &
-    (demo_eda['DateComplt'].notna())
-]
-
-# ------------------------------------------------------------------
-# 3. Feature engineering: time to demolition completion & 
-#    Aggregating date of completion to first of month
-# ------------------------------------------------------------------
-demo_eda['time_of_completion'] = (
-    demo_eda['DateComplt'] - demo_eda['DateFiled']
-).dt.days
-
-# Remove invalid durations
-demo_eda = demo_eda[demo_eda['time_of_completion'] >= 0]
-
-# Creating a new column with the first day of the month
-demo_eda['MonthDate'] = demo_eda['DateComplt'].values.astype('datetime64[M]')
-
-# ------------------------------------------------------------------
-# 4. Ownership cleaning
-#    - Preserve all ownership categories
-#    - Remove blanks / NaNs
-# ------------------------------------------------------------------
-demo_eda = demo_eda[demo_eda['Ownership'].notna()]
-
-demo_eda['ownership_clean'] = demo_eda['Ownership'].str.strip()
-
-# ------------------------------------------------------------------
-# 5. Affordability proxy feature
-# ------------------------------------------------------------------
-public_ownership = [
-    'Government, City: HPD',
-    'Government, City: Partnership',
-    'Government, City: City Agency',
-    'Government, Unspecified: Government Agency',
-    'Government, City: NYCHA/HHC',
-    'Government, City: Corporation',
-    'Government, City: Individual',
-    'Government, City: Other',
-    'Government, City: NYCHA',
-    'Government, City: HHC',
-    'Government, City: DCAS',
-    'Government, State: NY State',
-    'Government, City: SCA',
-    'Government, City: Unspecified',
-    'Government, City: DOE'
-]
-
-nonprofit_ownership = [
-    'Private Non-Profit: Other ',
-    'Private Non-Profit: Corporation',
-    'Private Non-Profit: Individual',
-    'Private Non-Profit: Partnership',
-    'Private Non-Profit: Condo/Co-Op',
-    'Private Non-Profit: Unspecified'
-]
-
-forprofit_ownership = [
-    'Private For-Profit: Individual',
-    'Private For-Profit: Partnership',
-    'Private For-Profit: Corporation',
-    'Private For-Profit: Other',
-    'Private For-Profit: Condo/Co-Op',
-    'Private For-Profit: Unspecified'
-]
-
-def classify_affordability(owner):
-    if owner in public_ownership or owner in nonprofit_ownership:
-        return 'Affordable (Government / Non-Profit)'
-    elif owner in forprofit_ownership:
-        return 'Non-Affordable (Private For-Profit)'
-    else:
-        return 'Unknown'
-
-demo_eda['housing_affordability_proxy'] = (
-    demo_eda['ownership_clean']
-    .apply(classify_affordability)
-)
-# ------------------------------------------------------------------
-# 6. Dropping BIN duplicates
-# ------------------------------------------------------------------
-demo_eda = demo_eda.drop_duplicates(subset='BIN')
-
-# ------------------------------------------------------------------
-# 7. Keep EDA-relevant fields
-# ------------------------------------------------------------------
-demo_eda = demo_eda[
-    [
-        'BIN',
-        'Job_Type',
-        'MonthDate',
-        'DateFiled',
-        'DateComplt',
-        'Boro',
-        'ownership_clean',
-        'housing_affordability_proxy',
-        'time_of_completion'
-    ]
-]
-
 # ============================================================
-# HOMELESSNESS DATA (DHS) — EDA PIPELINE
-# Dataset name: homeless_raw
+# STATE — WATERMARKS AND DIMENSION IDS
 # ============================================================
+# `--incremental` only transforms and upserts records on or after the
+# high-water marks stored in the database by the last run, and keeps the
+# database's dimension ids; a full build starts from the published ids
+def read_state(db, incremental):
+    """Watermarks and dimension ids to build on."""
+    if not incremental:
+        return {
+            "demolitions": None,
+            "shelters": None,
+            "ownership": DEFAULT_OWNERSHIP_IDS.copy(),
+            "jobtype": DEFAULT_JOBTYPE_IDS.copy(),
+        }
+    conn = connect(db)
+    ensure_schema(conn)
+    state = {
+        "demolitions": get_watermark(conn, "demolitions"),
+        "shelters": get_watermark(conn, "shelters"),
+        "ownership": dimension_ids(conn, "dim_ownership", "ownership_id", "ownership_clean", [])
+        or DEFAULT_OWNERSHIP_IDS.copy(),
+        "jobtype": dimension_ids(conn, "dim_jobtype", "job_typeid", "job_type", []) or DEFAULT_JOBTYPE_IDS.copy(),
+    }
+    conn.close()
+    print(f"Incremental load since: demolitions={state['demolitions']}, shelters={state['shelters']}")
+    return state
 
-# ------------------------------------------------------------------
-# 1. Create a working copy
-# ------------------------------------------------------------------
-homeless_eda = homeless_raw.copy()
-
-# ------------------------------------------------------------------
-# 2. Ensure proper data types
-# ------------------------------------------------------------------
-homeless_eda['Report Date'] = pd.to_datetime(
-    homeless_eda['Report Date'],
-    errors='coerce'
-)
-
-# ------------------------------------------------------------------
-# 3. Filter to study period (already monthly aggregated)
-# ------------------------------------------------------------------
-homeless_eda = homeless_eda[
-    (homeless_eda['Report Date'].notna())
-]
-
-# ------------------------------------------------------------------
-# 4. Keep and rename core field
-# ------------------------------------------------------------------
-homeless_eda = homeless_eda[
-    ['Report Date', 'FWC Unique Individuals by Age - Total']
-].rename(
-    columns={'FWC Unique Individuals by Age - Total': 'shelter_count'}
-)
-
-# ------------------------------------------------------------------
-# 5. Keeping EDA-relevant fields
-# ------------------------------------------------------------------
-
-homeless_eda = homeless_eda[
-    [
-    'Report Date',
-    'shelter_count'
-    ]
-]
-
-homeless_eda = homeless_eda.drop_duplicates(subset=['Report Date'])
 
+# %%
 # ============================================================
-# FINAL EDA DATASETS
+# DEMOLITION DATA (DCP)
 # ============================================================
-
-# demo_eda         → building-level demolition data
-# homeless_eda     → monthly shelter population (already aggregated)
-
+# The specification above, implemented in demolition_etl.py:
+#   read        only the required columns, with explicit dtypes, `chunksize`
+#               rows at a time; the filtering criteria are applied per chunk
+#               so only passing rows are held and memoized
+#   filter      (incremental runs) the DateComplt watermark
+#   features    time_of_completion / MonthDate, negative durations removed,
+#               ownership cleaning, ownership group and affordability proxy
+#               as categorical lookups, BIN duplicates dropped (first kept)
+#   dimensions  ids for the ownership groups / job types seen; new
+#               categories get the next id, existing ids are never moved
+#   facts       rows in the fact_demolitions layout
+def read_demolitions(path, chunksize):
+    """Raw DCP extract rows meeting the filtering criteria, read in chunks."""
+    return read_filtered(path, chunksize=chunksize)
 
 
+def filter_demolitions(rows, state):
+    """Rows completed on or after the watermark."""
+    return filter_since(rows, "DateComplt", state["demolitions"]).reset_index(drop=True)
 
-# %%
-# removing periods and commas from shelter_count and convering to integer
-homeless_eda['shelter_count'] = homeless_eda['shelter_count'].str.replace('.','').str.replace(',','').astype(int)
-
-# %%
-# checking BIN count
-demo_eda['BIN'].count()
-# %% [markdown]
-# # CREATING FACT / DIM TABLE FOR STAR SCHEMA
 
-# %%
-# OWNERSHIP COLUMN INTO DIMENSION TABLE
-    # finding all unique values of ownership column, removing all characters outside of 'Government', 'Private Non-Profit', 'Private For-Profit'
-unique_ownership = demo_eda['ownership_clean'].apply(lambda x: x.split(':')[0])
-unique_ownership = unique_ownership.apply(lambda x: x.split(',')[0]).unique()
-unique_ownership = pd.DataFrame({'Ownership_ID': [1,2,3], 'ownership_clean':unique_ownership})
-    # creates a dataframe to merge with that has ownership ID and each unique type of ownership
-unique_ownership
+def demolition_features(rows):
+    """Completion time, month and ownership classification, one row per BIN."""
+    return dedupe_bins(add_features(rows))
 
-# JOB_TYPE COLUMN INTO DIMENSION TABLE
-unique_jobtype = pd.DataFrame({'Job_TypeID': [1,2], 'Job_Type':demo_eda['Job_Type'].unique()})
-    # dataframe to merge with Job_TypeID with each unique type of Job_Type
-unique_jobtype
 
-# MERGE BACK TO FACT TABLE
-fact_demolitions = demo_eda[['BIN','Job_Type','ownership_clean','Boro','MonthDate','DateFiled','DateComplt','time_of_completion']]
-fact_demolitions['ownership_clean'] = fact_demolitions['ownership_clean'].apply(lambda x: x.split(':')[0])
-fact_demolitions['ownership_clean'] = fact_demolitions['ownership_clean'].apply(lambda x: x.split(',')[0])
-fact_demolitions = fact_demolitions.merge(unique_ownership[['Ownership_ID','ownership_clean']],on='ownership_clean',how='left')
-fact_demolitions = fact_demolitions.merge(unique_jobtype[['Job_TypeID','Job_Type']], on='Job_Type',how='left')
-fact_demolitions = fact_demolitions.drop(columns={'ownership_clean','Job_Type'},axis=1)
+def demolition_dimensions(eda, state):
+    """Ownership / job type ids, extended with the categories in this load."""
+    ownership_ids, jobtype_ids = dict(state["ownership"]), dict(state["jobtype"])
+    assign_ids(eda, ownership_ids, jobtype_ids)
+    return {"ownership": ownership_ids, "jobtype": jobtype_ids}
 
-# MAPPING 'Boro' COLUMN TO ITS BOROUGH CODE ON DATA DICTIONARY
-boromap = {1:'Manhattan',2:'Bronx',3:'Brooklyn',4:'Queens',5:'Staten Island'}
-fact_demolitions['Boro'] = fact_demolitions['Boro'].map(boromap)
 
-fact_demolitions = fact_demolitions[['MonthDate','BIN','Job_TypeID','Ownership_ID','Boro','DateFiled','DateComplt','time_of_completion']]
+def demolition_facts(eda, ids):
+    """fact_demolitions rows."""
+    return to_fact(eda, dict(ids["ownership"]), dict(ids["jobtype"]))
 
 
-# changing format of times to not include days
-#fact_demolitions['MonthDate'] = fact_demolitions['MonthDate'].dt.strftime('%m/%Y')
-#homeless_eda['Report Date'] = homeless_eda['Report Date'].dt.strftime('%m/%Y')
-
-
-# renaming columns to remove spaces / add underlines / make more interpretable
-fact_demolitions.rename(columns={'MonthDate':'Month_Date','Boro':'Borough','DateFiled':'Date_Filed','DateComplt':'Date_Completed'},inplace=True)
-homeless_eda.rename(columns={'Report Date':'Report_Date'},inplace=True)
-
-# quick clean to make all headers lowercase
-fact_demolitions.columns = map(str.lower, fact_demolitions.columns)
-homeless_eda.columns = map(str.lower, homeless_eda.columns)
-unique_jobtype.columns = map(str.lower, unique_jobtype.columns)
-unique_ownership.columns = map(str.lower, unique_ownership.columns)
+# %%
+# ============================================================
+# HOMELESSNESS DATA (DHS)
+# ============================================================
+# implemented in dhs_etl.py:
+#   Report Date parsed, missing dates dropped, (incremental runs) the
+#   shelter watermark, duplicate report dates dropped;
+#   'FWC Unique Individuals by Age - Total' kept as shelter_count, periods /
+#   commas removed and cast to integer; every other dashboard metric
+#   (census, age bands, placements, rates) parsed in one vectorized pass
+#   into a wide float table, stored long in fact_dhs_metrics and forecast
+#   by forecast_metrics.py
+def read_dhs(path):
+    """DHS dashboard export."""
+    return pd.read_csv(path)
 
-# fixing datatypes to avoid errors when inserting into SQL table
-fact_demolitions['borough'] = fact_demolitions['borough'].astype('string')
 
+def dhs_shelters(raw, state):
+    """fact_shelters rows (report_date, shelter_count)."""
+    return shelter_facts(raw, since=state["shelters"])
 
-# all of the tables for the SQL, two dim, two fact
-#display(fact_demolitions.head(),unique_ownership.head(),unique_jobtype.head(), homeless_eda.head())
 
-# PATHS TO PROCESSED DIMENSION/FACT TABLES
-processed_jobtypedim = "/Users/beans/Desktop/TeamHousing/data/processed/dim_jobtype.csv"
-processed_ownershipdim = "/Users/beans/Desktop/TeamHousing/data/processed/dim_ownership.csv"
-processed_fact_demolitions = "/Users/beans/Desktop/TeamHousing/data/processed/fact_demolitions.csv"
-processed_homeless_eda = "/Users/beans/Desktop/TeamHousing/data/processed/fact_shelter.csv"
+def dhs_metrics(raw, state):
+    """Every dashboard metric per report, wide."""
+    return metrics_wide(raw, since=state["shelters"])
 
 
-unique_jobtype.to_csv(processed_jobtypedim,index=False)
-unique_ownership.to_csv(processed_ownershipdim,index=False)
-fact_demolitions.to_csv(processed_fact_demolitions,index=False)
-homeless_eda.to_csv(processed_homeless_eda,index=False)
+# %% [markdown]
+# # CREATING FACT / DIM TABLE FOR STAR SCHEMA
 
 # %%
-# CONNECTING TO DATABASE AND IMPORTING DATA
-import sqlite3
+# LOADING THE DATABASE
+# every table is upserted on its natural key (db_loader.py) inside a single
+# transaction, so reruns are idempotent and a failed load leaves the
+# database untouched
+def load_database(facts, ids, shelters, metrics, db):
+    """Upsert every table, refresh rollups / features, move the watermarks."""
+    conn = connect(db)
+    ensure_schema(conn)
+    dim_ownership, dim_jobtype = dimension_frames(ids["ownership"], ids["jobtype"])
+    with transaction(conn):
+        n_demo = upsert(conn, "fact_demolitions", facts)
+        # existing dimension ids are never moved
+        upsert(conn, "dim_ownership", dim_ownership, update=False)
+        upsert(conn, "dim_jobtype", dim_jobtype, update=False)
+        n_shelter = upsert(conn, "fact_shelters", shelters)
+        upsert(conn, "fact_dhs_metrics", metrics_long(metrics))
+
+        # monthly rollups and exogenous features: only the months touched by
+        # this load are recomputed
+        months = refresh_rollups(conn)
+        refresh_features(conn, months)
+
+        # move the watermarks forward so the next run can be incremental
+        set_watermark(conn, "demolitions", facts["date_completed"].max() if len(facts) else None)
+        set_watermark(conn, "shelters", shelters["report_date"].max() if len(shelters) else None)
+    conn.close()
+
+    print(f"Upserted {len(facts)} demolition facts and {n_shelter} shelter reports; refreshed {len(months)} months")
+    return {"demolitions": n_demo, "shelters": n_shelter, "months": [str(m) for m in months]}
 
 
-# PATH TO DATABASE
-databasepath = "/Users/beans/Desktop/TeamHousing/data/processed/nyc_demolitions.db"
-conn = sqlite3.connect(databasepath)
+# %%
+# CSV EXPORTS
+def export_frames(facts, ids, shelters, metrics, paths):
+    """Processed CSVs from this build's tables (full build)."""
+    dim_ownership, dim_jobtype = dimension_frames(ids["ownership"], ids["jobtype"])
+    dim_jobtype.to_csv(paths["dim_jobtype"], index=False)
+    dim_ownership.to_csv(paths["dim_ownership"], index=False)
+    facts.to_csv(paths["fact_demolitions"], index=False)
+    shelters.to_csv(paths["fact_shelters"], index=False)
+    metrics.to_csv(paths["dhs_metrics"], index=False)
+    return {table: file_sha256(path) for table, path in paths.items()}
+
+
+def export_database(loaded, db, paths):
+    """Processed CSVs from the database (incremental runs only hold the delta)."""
+    conn = connect(db)
+    export_processed(conn, {table: paths[table] for table in paths if table != "dhs_metrics"})
+    long_to_wide(
+        pd.read_sql_query("SELECT report_date, metric, value FROM fact_dhs_metrics", conn, parse_dates=["report_date"])
+    ).to_csv(paths["dhs_metrics"], index=False)
+    conn.close()
+    return {table: file_sha256(path) for table, path in paths.items()}
+
+
+# regenerate the model features; the file is only rewritten when it changed
+def model_features(loaded, db, path):
+    """Model features (datedf.csv) from the database."""
+    conn = connect(db)
+    if write_datedf(conn, path):
+        print(f"Updated {path}")
+    conn.close()
+    return file_sha256(path)
 
-# LOADING CSV DATA
-# using if_exists append to remain with same schema
-unique_jobtype.to_sql('dim_jobtype', conn, if_exists='append',index=False)
-unique_ownership.to_sql('dim_ownership', conn, if_exists='append',index=False)
-fact_demolitions.to_sql('fact_demolitions', conn, if_exists='append',index=False)
-homeless_eda.to_sql('fact_shelters', conn, if_exists='append',index=False)
 
-conn.close()
+# %%
+# COLUMNAR CACHE
+# refresh the memory-mapped copies the app / training read, so the first
+# reader after a load does not pay for parsing the new CSVs; fact tables
+# are cached in their compact dtypes (fact_tables.py)
+def columnar_cache(exported, features, paths, datedf):
+    """Columnar copies of every processed table and datedf.csv."""
+    for table in ["dim_jobtype", "dim_ownership", "dhs_metrics"]:
+        write_table(paths[table])
+    write_table(datedf)
+    for table in ["fact_demolitions", "fact_shelters"]:
+        write_table(paths[table], read_facts_csv(paths[table]))
+    return {"tables": sorted(exported), "datedf": features}
 
 
+# %%
+# ============================================================
+# PIPELINE
+# ============================================================
+def build_stages(demolitions=DEMOLITION_PATH, dhs=HOMELESS_PATH, db=DB_PATH,
+                 processed_dir=PROCESSED_DIR, datedf=EXOG_PATH, incremental=False,
+                 chunksize=CHUNKSIZE) -> list:
+    db, datedf = str(db), str(datedf)
+    paths = {table: str(Path(processed_dir) / name) for table, name in PROCESSED_FILES.items()}
+    if incremental:
+        export = Stage("export.csv", export_database, deps=["db.load"], params={"db": db, "paths": paths},
+                       outputs=paths.values(), code=[export_processed, long_to_wide])
+    else:
+        export = Stage("export.csv", export_frames,
+                       deps=["demo.facts", "demo.dimensions", "dhs.shelters", "dhs.metrics"],
+                       params={"paths": paths}, outputs=paths.values(), code=[dimension_frames])
+    return [
+        # the database is read on every incremental run: it changes under us
+        Stage("state", read_state, params={"db": db, "incremental": incremental},
+              memo=not incremental, code=[get_watermark, dimension_ids]),
+        Stage("demo.read", read_demolitions, files={"path": demolitions},
+              params={"chunksize": chunksize}, code=[demolition_etl]),
+        Stage("demo.filter", filter_demolitions, deps=["demo.read", "state"], code=[filter_since]),
+        Stage("demo.features", demolition_features, deps=["demo.filter"], code=[demolition_etl]),
+        Stage("demo.dimensions", demolition_dimensions, deps=["demo.features", "state"], code=[demolition_etl]),
+        Stage("demo.facts", demolition_facts, deps=["demo.features", "demo.dimensions"], code=[demolition_etl]),
+        Stage("dhs.read", read_dhs, files={"path": dhs}),
+        Stage("dhs.shelters", dhs_shelters, deps=["dhs.read", "state"], code=[dhs_etl]),
+        Stage("dhs.metrics", dhs_metrics, deps=["dhs.read", "state"], code=[dhs_etl]),
+        Stage("db.load", load_database,
+              deps=["demo.facts", "demo.dimensions", "dhs.shelters", "dhs.metrics"],
+              params={"db": db}, outputs=[db], code=[db_loader, refresh_features, set_watermark]),
+        export,
+        Stage("features.datedf", model_features, deps=["db.load"], params={"db": db, "path": datedf},
+              outputs=[datedf], code=[feature_store]),
+        Stage("cache.columnar", columnar_cache, deps=["export.csv", "features.datedf"],
+              params={"paths": paths, "datedf": datedf}, code=[write_table, read_facts_csv]),
+    ]
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incremental", action="store_true", help="only load records past the watermarks")
+    parser.add_argument("--demolitions", type=Path, default=DEMOLITION_PATH, help="raw DCP HousingDB extract")
+    parser.add_argument("--dhs", type=Path, default=HOMELESS_PATH, help="DHS dashboard export")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--processed-dir", type=Path, default=PROCESSED_DIR)
+    parser.add_argument("--datedf", type=Path, default=EXOG_PATH, help="model features the app / trainer read")
+    parser.add_argument("--cache-dir", type=Path, default=None,
+                        help=f"stage outputs (default <processed-dir>/{PIPELINE_DIRNAME})")
+    parser.add_argument("--only", nargs="+", default=None, metavar="STAGE",
+                        help="run these stages (and the stages they need) only")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE",
+                        help="rerun these stages even if cached ('all' for every stage)")
+    parser.add_argument("--workers", type=int, default=2, help="stages run at once")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="DCP extract rows read at a time")
+    parser.add_argument("--list", action="store_true", help="list the stages and their last run, then exit")
+    args = parser.parse_args()
+
+    stages = build_stages(args.demolitions, args.dhs, args.db, args.processed_dir, args.datedf, args.incremental,
+                          args.chunksize)
+    cache_dir = args.cache_dir or args.processed_dir / PIPELINE_DIRNAME
+    pipeline = Pipeline(stages, cache_dir, workers=args.workers)
+
+    if args.list:
+        with pd.option_context("display.width", 200, "display.max_colwidth", 80):
+            print(pipeline.status().to_string())
+        sys.exit(0)
+
+    start = time.perf_counter()
+    try:
+        rows = pipeline.run(args.only, args.force)
+    except KeyError as e:
+        parser.error(str(e))
+    ran = [row["stage"] for row in rows if row["state"] == "ran"]
+    print(f"{len(ran)} of {len(rows)} stages ran, {len(rows) - len(ran)} cached, "
+          f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,192 @@
+"""
+BULK, IDEMPOTENT LOADER FOR nyc_demolitions.db
+
+PURPOSE
+Replace pandas `to_sql(..., if_exists='append')` with a loader whose cost
+scales with the delta being loaded and that can be rerun safely.
+
+HOW IT WORKS
+- connect() tunes the connection for bulk loads:
+      WAL journal (readers are not blocked while we load),
+      synchronous=NORMAL, a 64 MB page cache, in-memory temp storage.
+- ensure_schema() applies sql/data_procrssing.sql (idempotent DDL):
+      natural keys on every table (fact_shelters gets a unique
+      report_date), plus the covering index
+      fact_demolitions(month_date, job_typeid, ownership_id, borough).
+  Older databases are de-duplicated first so the keys can be created.
+- Triggers queue every month whose facts change; refresh_rollups()
+  rebuilds agg_demolitions_monthly (month x borough x ownership group x
+  job type counts and duration sums) for those months only, and
+  feature_store.refresh_features() the exogenous base features
+  (feature_demolitions_monthly) from it.
+- upsert() writes a DataFrame with batched executemany
+  INSERT ... ON CONFLICT(<natural key>) DO UPDATE, inside an explicit
+  transaction opened by transaction().
+
+USAGE
+    python db_loader.py path/to/nyc_demolitions.db      # migrate an existing database
+"""
+import sqlite3
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "sql" / "data_procrssing.sql"
+
+# natural key of every table the pipeline writes
+NATURAL_KEYS = {
+    "dim_ownership": ["ownership_clean"],
+    "dim_jobtype": ["job_type"],
+    "fact_demolitions": ["bin"],
+    "fact_shelters": ["report_date"],
+    "fact_dhs_metrics": ["report_date", "metric"],
+}
+
+BATCH_SIZE = 10_000
+
+
+# ------------------------------------------------------------------
+# CONNECTION + SCHEMA
+# ------------------------------------------------------------------
+def connect(path) -> sqlite3.Connection:
+    # autocommit mode: transactions are opened explicitly with transaction()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+DEDUPE_SHELTERS = """
+DELETE FROM fact_shelters
+WHERE rowid NOT IN (SELECT MAX(rowid) FROM fact_shelters GROUP BY report_date);
+"""
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Apply the idempotent DDL (tables, indexes, rollup triggers) in one transaction."""
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    # keep the latest row per report_date so the unique key can be created
+    dedupe = DEDUPE_SHELTERS if "fact_shelters" in tables else ""
+
+    # executescript: the trigger bodies contain ';', so the file cannot be split
+    try:
+        conn.executescript("BEGIN IMMEDIATE;\n" + dedupe + SCHEMA_PATH.read_text() + "\nCOMMIT;")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    conn.execute("ANALYZE")
+
+
+# ------------------------------------------------------------------
+# UPSERTS
+# ------------------------------------------------------------------
+def _sql_values(df: pd.DataFrame):
+    """Rows as plain Python values, with datetimes in SQLite's text format."""
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+    out = out.astype(object).where(out.notna(), None)
+    return list(out.itertuples(index=False, name=None))
+
+
+def upsert(conn, table: str, df: pd.DataFrame, update=True, batch_size=BATCH_SIZE) -> int:
+    """
+    Insert `df` into `table`, resolving conflicts on the table's natural key.
+
+    update=True overwrites the existing row's other columns; update=False
+    keeps the existing row (used for dimensions, whose ids must not move).
+    Call inside transaction() so all batches commit together.
+    """
+    if df.empty:
+        return 0
+
+    cols = list(df.columns)
+    keys = NATURAL_KEYS[table]
+    others = [c for c in cols if c not in keys]
+    if update and others:
+        # rows that are unchanged are skipped, so reruns write nothing
+        conflict = (
+            "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in others)
+            + " WHERE " + " OR ".join(f"{c} IS NOT excluded.{c}" for c in others)
+        )
+    else:
+        conflict = "DO NOTHING"
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+        f"ON CONFLICT({', '.join(keys)}) {conflict}"
+    )
+
+    # converted batch by batch, so a whole-table frame is never held as tuples
+    for start in range(0, len(df), batch_size):
+        conn.executemany(sql, _sql_values(df.iloc[start:start + batch_size]))
+    return len(df)
+
+
+# ------------------------------------------------------------------
+# ROLLUPS
+# ------------------------------------------------------------------
+def refresh_rollups(conn) -> list:
+    """
+    Recompute agg_demolitions_monthly for the months the triggers marked
+    dirty, then clear the queue. Returns the refreshed months, so derived
+    tables (feature_store.py) can refresh the same ones.
+    Call inside the load's transaction() so facts and rollups commit together.
+    """
+    months = [r[0] for r in conn.execute("SELECT month_date FROM agg_dirty_months ORDER BY month_date")]
+    if not months:
+        return []
+
+    conn.execute(
+        """
+        DELETE FROM agg_demolitions_monthly
+        WHERE month_date IN (SELECT month_date FROM agg_dirty_months)
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO agg_demolitions_monthly
+        SELECT month_date, borough, ownership_id, job_typeid,
+               COUNT(*),
+               SUM(time_of_completion),
+               SUM(time_of_completion * time_of_completion),
+               MIN(time_of_completion),
+               MAX(time_of_completion)
+        FROM fact_demolitions
+        WHERE month_date IN (SELECT month_date FROM agg_dirty_months)
+        GROUP BY month_date, borough, ownership_id, job_typeid
+        """
+    )
+    conn.execute("DELETE FROM agg_dirty_months")
+    return months
+
+
+if __name__ == "__main__":
+    from feature_store import refresh_features
+
+    for db in sys.argv[1:]:
+        conn = connect(db)
+        ensure_schema(conn)
+        with transaction(conn):
+            months = refresh_rollups(conn)
+            refresh_features(conn, months)
+        indexes = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")]
+        conn.close()
+        print(f"{db}: schema up to date ({len(indexes)} indexes, {len(months)} rollup months refreshed)")
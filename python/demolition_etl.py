@@ -0,0 +1,232 @@
+"""
+CHUNKED ETL FOR THE DCP HOUSING EXTRACT
+
+PURPOSE
+Turn the raw DCP Housing Database extract into fact_demolitions rows
+without ever holding the whole extract in memory, so the same code can
+process the full citywide history and not just the post-2010 slice.
+
+HOW IT WORKS
+- Only the 9 columns the pipeline uses are read, with explicit dtypes
+  (low-cardinality text as categoricals), `chunksize` rows at a time.
+- Filters, completion duration and month bucketing are vectorized.
+- Ownership cleaning, the ownership group (Government / Private
+  Non-Profit / Private For-Profit) and the affordability proxy are
+  computed once per *category* and broadcast through categorical codes,
+  instead of running Python functions row by row.
+- BIN de-duplication keeps the first occurrence, as before.
+- The steps (read_filtered, filter_rows, add_features, dedupe_bins,
+  assign_ids, to_fact) are separate functions, so create_schema.py can
+  run and memoize them as pipeline stages. read_filtered() applies the
+  filtering criteria `chunksize` rows at a time and keeps only the rows
+  that pass, in compact dtypes; the later stages work on those rows as
+  one frame, and to_fact() gives them the compact dtypes of
+  fact_tables.py (int32 keys, categorical borough decoded straight from
+  the Boro code, int16 durations).
+
+Peak memory is bounded by `chunksize` raw rows plus the rows that pass
+the filters (and the stage outputs derived from them), not by the size
+of the extract.
+"""
+import pandas as pd
+
+from fact_tables import BOROUGHS, as_typed, borough_from_codes
+
+USECOLS = [
+    'BIN', 'Job_Type', 'Job_Status', 'ResidFlag', 'NonresFlag',
+    'DateFiled', 'DateComplt', 'Ownership', 'Boro',
+]
+
+DTYPES = {
+    'BIN': 'Int64',
+    'Job_Type': 'category',
+    'Job_Status': 'category',
+    'ResidFlag': 'category',
+    'NonresFlag': 'category',
+    'DateFiled': 'string',
+    'DateComplt': 'string',
+    'Ownership': 'category',
+    'Boro': 'Int8',
+}
+
+CHUNKSIZE = 100_000
+JOB_TYPES = ['New Building', 'Demolition']
+BOROMAP = dict(enumerate(BOROUGHS, start=1))
+
+# ids of the published dim tables (data/processed/dim_*.csv)
+DEFAULT_OWNERSHIP_IDS = {'Private For-Profit': 1, 'Private Non-Profit': 2, 'Government': 3}
+DEFAULT_JOBTYPE_IDS = {'New Building': 1, 'Demolition': 2}
+
+FACT_COLUMNS = [
+    'month_date', 'bin', 'job_typeid', 'ownership_id', 'borough',
+    'date_filed', 'date_completed', 'time_of_completion',
+]
+
+# ------------------------------------------------------------------
+# Affordability proxy lookups (ownership strings are compared stripped)
+# ------------------------------------------------------------------
+public_ownership = {
+    'Government, City: HPD',
+    'Government, City: Partnership',
+    'Government, City: City Agency',
+    'Government, Unspecified: Government Agency',
+    'Government, City: NYCHA/HHC',
+    'Government, City: Corporation',
+    'Government, City: Individual',
+    'Government, City: Other',
+    'Government, City: NYCHA',
+    'Government, City: HHC',
+    'Government, City: DCAS',
+    'Government, State: NY State',
+    'Government, City: SCA',
+    'Government, City: Unspecified',
+    'Government, City: DOE',
+}
+
+nonprofit_ownership = {
+    'Private Non-Profit: Other',
+    'Private Non-Profit: Corporation',
+    'Private Non-Profit: Individual',
+    'Private Non-Profit: Partnership',
+    'Private Non-Profit: Condo/Co-Op',
+    'Private Non-Profit: Unspecified',
+}
+
+forprofit_ownership = {
+    'Private For-Profit: Individual',
+    'Private For-Profit: Partnership',
+    'Private For-Profit: Corporation',
+    'Private For-Profit: Other',
+    'Private For-Profit: Condo/Co-Op',
+    'Private For-Profit: Unspecified',
+}
+
+
+def classify_affordability(owner):
+    if owner in public_ownership or owner in nonprofit_ownership:
+        return 'Affordable (Government / Non-Profit)'
+    elif owner in forprofit_ownership:
+        return 'Non-Affordable (Private For-Profit)'
+    else:
+        return 'Unknown'
+
+
+def ownership_group(owner):
+    """'Government, City: HPD' -> 'Government', 'Private For-Profit: Other' -> 'Private For-Profit'."""
+    return owner.split(':')[0].split(',')[0]
+
+
+def _map_categories(series: pd.Series, func) -> pd.Series:
+    """Apply `func` to each category once and broadcast the result through the codes."""
+    series = series.astype('category')
+    lookup = {c: func(c) for c in series.cat.categories}
+    return series.map(lookup)
+
+
+# ------------------------------------------------------------------
+# TRANSFORMS
+# ------------------------------------------------------------------
+def filter_rows(chunk: pd.DataFrame, since=None) -> pd.DataFrame:
+    """Raw extract rows -> rows meeting the filtering criteria, dates parsed."""
+    date_filed = pd.to_datetime(chunk['DateFiled'], errors='coerce')
+    date_complt = pd.to_datetime(chunk['DateComplt'], errors='coerce')
+
+    keep = (
+        chunk['Job_Type'].isin(JOB_TYPES).to_numpy()
+        & (chunk['Job_Status'] == '5. Completed Construction').to_numpy()
+        & (chunk['ResidFlag'] == 'Residential').to_numpy()
+        & chunk['NonresFlag'].isna().to_numpy()
+        & date_filed.notna().to_numpy()
+        & date_complt.notna().to_numpy()
+        & chunk['Ownership'].notna().to_numpy()
+    )
+    if since is not None:
+        keep &= (date_complt >= since).to_numpy()
+
+    out = pd.DataFrame({
+        'BIN': chunk['BIN'].to_numpy()[keep],
+        'Job_Type': chunk['Job_Type'].to_numpy()[keep],
+        'DateFiled': date_filed.to_numpy()[keep],
+        'DateComplt': date_complt.to_numpy()[keep],
+        'Boro': chunk['Boro'].to_numpy()[keep],
+        'Ownership': chunk['Ownership'].to_numpy()[keep],
+    })
+    return out
+
+
+def compact_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """filter_rows() output with low-cardinality text as categoricals (same dtypes for every chunk)."""
+    return rows.astype({'Job_Type': 'category', 'Ownership': 'category', 'Boro': 'Int8'})
+
+
+def add_features(out: pd.DataFrame) -> pd.DataFrame:
+    """Filtered rows -> cleaned EDA rows (completion time, month, ownership)."""
+    # new columns go on a shallow copy: the input may be a cached stage output
+    out = out.copy(deep=False)
+    out['time_of_completion'] = (out['DateComplt'] - out['DateFiled']).dt.days
+    out = out[out['time_of_completion'] >= 0]
+    out['MonthDate'] = out['DateComplt'].values.astype('datetime64[M]')
+
+    # string cleaning and classification run per category, not per row
+    out['ownership_clean'] = _map_categories(out['Ownership'], str.strip)
+    out['housing_affordability_proxy'] = _map_categories(out['ownership_clean'], classify_affordability)
+    out['ownership_group'] = _map_categories(out['ownership_clean'], ownership_group)
+
+    return out.drop(columns='Ownership')
+
+
+def dedupe_bins(eda: pd.DataFrame) -> pd.DataFrame:
+    """Drop rows without a BIN and BIN duplicates, keeping the first occurrence."""
+    eda = eda[eda['BIN'].notna()]
+    return eda.drop_duplicates(subset='BIN')
+
+
+def assign_ids(eda: pd.DataFrame, ownership_ids: dict, jobtype_ids: dict) -> None:
+    """Give ownership groups / job types not in the id maps the next free id (in place)."""
+    for name in pd.unique(eda['ownership_group'].astype(object)):
+        ownership_ids.setdefault(name, max(ownership_ids.values(), default=0) + 1)
+    for name in pd.unique(eda['Job_Type'].astype(object)):
+        jobtype_ids.setdefault(name, max(jobtype_ids.values(), default=0) + 1)
+
+
+def to_fact(eda: pd.DataFrame, ownership_ids: dict, jobtype_ids: dict) -> pd.DataFrame:
+    """Cleaned EDA rows -> fact_demolitions rows, assigning ids to unseen categories."""
+    assign_ids(eda, ownership_ids, jobtype_ids)
+    fact = pd.DataFrame({
+        'month_date': eda['MonthDate'],
+        'bin': eda['BIN'].to_numpy('int64'),
+        'job_typeid': _map_categories(eda['Job_Type'], jobtype_ids.get).to_numpy('int64'),
+        'ownership_id': _map_categories(eda['ownership_group'], ownership_ids.get).to_numpy('int64'),
+        'borough': borough_from_codes(eda['Boro']),
+        'date_filed': eda['DateFiled'],
+        'date_completed': eda['DateComplt'],
+        'time_of_completion': eda['time_of_completion'],
+    }, index=eda.index)[FACT_COLUMNS]
+    return as_typed(fact, 'fact_demolitions')
+
+
+# ------------------------------------------------------------------
+# READ
+# ------------------------------------------------------------------
+def read_filtered(path, chunksize=CHUNKSIZE) -> pd.DataFrame:
+    """
+    filter_rows() of the whole raw extract at `path` (no watermark), read
+    `chunksize` rows at a time: only rows that pass are ever held together.
+    """
+    reader = pd.read_csv(path, usecols=USECOLS, dtype=DTYPES, chunksize=chunksize)
+    chunks = [compact_rows(filter_rows(chunk)) for chunk in reader]
+    if not chunks:  # header only
+        return compact_rows(filter_rows(pd.read_csv(path, usecols=USECOLS, dtype=DTYPES, nrows=0)))
+    # categories differ per chunk; concat falls back to object, so re-compact once
+    return compact_rows(pd.concat(chunks, ignore_index=True))
+
+
+def dimension_frames(ownership_ids: dict, jobtype_ids: dict):
+    """dim_ownership / dim_jobtype frames in the published column layout."""
+    dim_ownership = pd.DataFrame(
+        {'ownership_id': list(ownership_ids.values()), 'ownership_clean': list(ownership_ids.keys())}
+    ).sort_values('ownership_id')
+    dim_jobtype = pd.DataFrame(
+        {'job_typeid': list(jobtype_ids.values()), 'job_type': list(jobtype_ids.keys())}
+    ).sort_values('job_typeid')
+    return dim_ownership, dim_jobtype
@@ -0,0 +1,120 @@
+"""
+ETL FOR THE DHS DATA DASHBOARD EXTRACT
+
+PURPOSE
+Turn the DHS dashboard export (one row per monthly report) into
+fact_shelters rows and, for every metric column of the export (census by
+household type, single adults by gender, age bands, race / ethnicity,
+placements, percentages), fact_dhs_metrics rows. Kept as functions, like
+demolition_etl.py, so create_schema.py, forecast_metrics.py and the
+benchmark suite run exactly the same code.
+
+The dashboard formats numbers as text: counts as "20,394." and rates as
+"84%" or "59.67%". parse_metrics() cleans every metric column in one
+vectorized pass: the cells of all columns are flattened into one string
+array, thousands separators and percent signs are stripped with one
+regex, and the result is cast to float and reshaped back. Rates stay in
+percent; their metric names end in _pct.
+
+TABLES
+    metrics_wide()   report_date + one float column per metric (metric_name)
+    metrics_long()   fact_dhs_metrics: (report_date, metric, value), one row
+                     per reported value, keyed on (report_date, metric)
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from fact_tables import as_typed
+from incremental_load import filter_since
+
+REPORT_DATE = 'Report Date'
+SHELTER_COLUMN = 'FWC Unique Individuals by Age - Total'
+
+# everything that is not part of the number ("20,394." and "62.%" parse
+# as floats once these are gone)
+NUMBER_NOISE = re.compile(r'[,%\s]')
+PERCENT_SUFFIX = '_pct'
+
+
+def _cells(frame: pd.DataFrame) -> pd.Series:
+    """Every cell of `frame` as one string Series (row-major)."""
+    return pd.Series(frame.to_numpy(dtype=object).ravel(), dtype='string')
+
+
+def parse_metrics(frame: pd.DataFrame) -> pd.DataFrame:
+    """Dashboard text cells -> floats (blank / unparseable -> NaN), all columns at once."""
+    cleaned = _cells(frame).str.replace(NUMBER_NOISE, '', regex=True)
+    values = pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return pd.DataFrame(values.reshape(frame.shape), index=frame.index, columns=frame.columns)
+
+
+def percent_columns(frame: pd.DataFrame) -> list:
+    """Columns with at least one value reported as a percentage."""
+    has_pct = _cells(frame).str.contains('%', regex=False).fillna(False).to_numpy(dtype=bool)
+    return list(frame.columns[has_pct.reshape(frame.shape).any(axis=0)])
+
+
+def metric_name(column: str) -> str:
+    """'FWC  Unique Individuals by Age- 18 thru 20' -> 'fwc_unique_individuals_by_age_18_thru_20'"""
+    return re.sub(r'[^a-z0-9]+', '_', column.lower()).strip('_')
+
+
+def metric_columns(raw: pd.DataFrame) -> dict:
+    """Metric name -> dashboard column, for every column except the report date."""
+    columns = [c for c in raw.columns if c != REPORT_DATE]
+    rates = set(percent_columns(raw[columns]))
+    return {metric_name(c) + (PERCENT_SUFFIX if c in rates else ''): c for c in columns}
+
+
+def metric_unit(metric: str) -> str:
+    return 'percent' if metric.endswith(PERCENT_SUFFIX) else 'count'
+
+
+def parse_count(series: pd.Series) -> pd.Series:
+    """'20,394.' -> 20394 (counts only; rates go through parse_metrics())"""
+    return series.str.replace('.', '', regex=False).str.replace(',', '', regex=False).astype(int)
+
+
+def _reports(raw: pd.DataFrame, since=None) -> pd.DataFrame:
+    # 1-3. parsed report dates, valid and on or after the watermark
+    # (already monthly aggregated); 4. one row per report
+    reports = raw.copy(deep=False)
+    reports[REPORT_DATE] = pd.to_datetime(reports[REPORT_DATE], errors='coerce')
+    reports = reports[reports[REPORT_DATE].notna()]
+    reports = filter_since(reports, REPORT_DATE, since)
+    return reports.drop_duplicates(subset=[REPORT_DATE])
+
+
+def shelter_facts(raw: pd.DataFrame, since=None) -> pd.DataFrame:
+    """DHS dashboard rows -> fact_shelters rows (report_date, shelter_count)."""
+    eda = _reports(raw[[REPORT_DATE, SHELTER_COLUMN]], since)
+
+    # 5. core field
+    return as_typed(pd.DataFrame({
+        'report_date': eda[REPORT_DATE],
+        'shelter_count': parse_count(eda[SHELTER_COLUMN]),
+    }), 'fact_shelters')
+
+
+def metrics_wide(raw: pd.DataFrame, since=None) -> pd.DataFrame:
+    """DHS dashboard rows -> report_date + every metric as a float column, oldest first."""
+    reports = _reports(raw, since)
+    columns = metric_columns(raw)
+    values = parse_metrics(reports[list(columns.values())]).set_axis(list(columns), axis=1)
+    wide = pd.concat([reports[REPORT_DATE].rename('report_date'), values], axis=1)
+    return wide.sort_values('report_date', ignore_index=True)
+
+
+def metrics_long(wide: pd.DataFrame) -> pd.DataFrame:
+    """metrics_wide() -> fact_dhs_metrics rows; missing values are not stored."""
+    long = wide.melt(id_vars='report_date', var_name='metric', value_name='value')
+    return long.dropna(subset=['value']).reset_index(drop=True)
+
+
+def long_to_wide(long: pd.DataFrame) -> pd.DataFrame:
+    """fact_dhs_metrics rows -> metrics_wide() layout (metrics in first-seen order)."""
+    order = list(dict.fromkeys(long['metric']))
+    wide = long.pivot(index='report_date', columns='metric', values='value')
+    return wide[order].rename_axis(columns=None).reset_index().sort_values('report_date', ignore_index=True)
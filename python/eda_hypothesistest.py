@@ -13,26 +13,27 @@ DATA SOURCES
 Database: nyc_demolitions.db
 
 Tables Used:
-- fact_demolitions : demolition and construction job records
-- dim_ownership    : ownership classification lookup table
-- fact_shelters    : NYC shelter reporting records
+- agg_demolitions_monthly : monthly rollup of fact_demolitions
+                            (month x borough x ownership x job type)
+- dim_ownership           : ownership classification lookup table
+- fact_shelters           : NYC shelter reporting records
 
 WORKFLOW OVERVIEW:
-1. Connect to SQLite database and load required tables.
-2. Merge demolition facts with ownership classifications.
-3. Engineer datetime variables for time-based analysis.
-4. Create ownership group categories:
+1. Connect to SQLite database (read-only).
+2. Query the analysis period (2016–2022) through eda_queries.py;
+   date filters, ownership grouping and counting run in SQL against
+   the rollup, so only aggregates are loaded into pandas.
+3. Ownership group categories:
       Government + Non-Profit → Affordable
       Private For-Profit → For-Profit
-5. Label job types (Construction vs Demolition).
-6. Filter analysis period (2016–2022).
-7. Create COVID dummy variables (March 2020 — Dec 2021)
+4. Create COVID dummy variables (March 2020 — Dec 2021)
    for use as exogenous model controls.
-8. Generate demolition indicators for hypothesis testing.
-9. Perform Proportion Z-Test:
+5. Perform Proportion Z-Test:
       Test whether Affordable housing experiences a higher
       demolition rate than For-Profit housing.
-10. Produce time-series visualizations:
+   Then the same test by resampling (resampling.py): permutation
+   p-values and bootstrap CIs per COVID period and stratified.
+6. Produce time-series visualizations:
       - Monthly demolition trends
       - Shelter reporting trends
 
@@ -40,126 +41,47 @@ OUTPUTS
 - Statistical hypothesis test results.
 - Monthly demolition time series plots.
 - Shelter count trend plots.
+  (eda_report.py renders these, the graphs/ figures, per-borough and
+  per-ownership variants and the test table headlessly, in batch.)
 
 NOTES
 COVID period chosen based on NYC operational disruptions
-beginning March 2020 through late recovery phase in 2021.
+beginning March 2020 through late recovery phase in 2021
+(eda_queries.COVID_WINDOW, shared with the model features through
+feature_store.INTERVENTIONS).
 """
 # imports
-import sqlite3
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from statsmodels.stats.proportion import proportions_ztest
+from eda_queries import DB_PATH, connect, monthly_counts, ownership_rate_counts, ownership_ztest_counts, shelter_counts
+from feature_store import intervention_dummies
+from resampling import cached_test
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
 
-# database connections
-DB_PATH = "/Users/Marcy_Student/Desktop/CID_FINAL/TeamHousing/data/processed/nyc_demolitions.db"
-
-conn = sqlite3.connect(DB_PATH)
-
-# load data
-fact_demo = pd.read_sql_query(
-    "SELECT * FROM fact_demolitions",
-    conn
-)
+# Time Filtering
+# 2016 - 2023 (half-open: 2016-01-01 <= date < 2023-01-01)
+START, END = "2016-01-01", "2023-01-01"
 
-dim_owner = pd.read_sql_query(
-    "SELECT * FROM dim_ownership",
-    conn
-)
+conn = connect(DB_PATH)
 
-fact_shelters = pd.read_sql_query(
-    "SELECT * FROM fact_shelters",
-    conn
-)
+# aggregates only: z-test counts, monthly demolitions, shelter counts
+count, nobs = ownership_ztest_counts(conn, START, END)
+rate_counts = ownership_rate_counts(conn, START, END, by="covid_period")
+monthly_demo = monthly_counts(conn, START, END)
+fact_shelters = shelter_counts(conn, START, END).to_frame().reset_index()
 
 conn.close()
 
-
-# merge demolition facts and demolition owner type
-df = fact_demo.merge(
-    dim_owner,
-    on="ownership_id",
-    how="left"
-)
-
-# Date Engineering
-df["month_date"] = pd.to_datetime(df["month_date"])
-df["year"] = df["month_date"].dt.year
-
-fact_shelters["report_date"] = pd.to_datetime(
-    fact_shelters["report_date"]
-)
-fact_shelters["year"] = (
-    fact_shelters["report_date"].dt.year
-)
-
-# Ownership Groups
-# Affordable = Government + Non-Profit
-df["ownership_group"] = df["ownership_clean"].replace({
-    "Government": "Affordable",
-    "Private Non-Profit": "Affordable",
-    "Private For-Profit": "For-Profit"
-})
-
-
-# Job Type Labels
-job_map = {
-    1: "construction",
-    2: "demolition"
-}
-df["job_type"] = df["job_typeid"].map(job_map)
-
-# Time Filtering
-# 2016 - 2023
-df = df[(df["year"] >= 2016) & (df["year"] < 2023)] 
-fact_shelters = fact_shelters[(fact_shelters["year"] >= 2016)
-                              & (fact_shelters["year"] < 2023)]
-
 # checking for weeks where covid affect shelter counts
-# for model exog var
-fact_shelters['covid_dummy'] = 0
-fact_shelters.loc[
-    (fact_shelters['report_date'] >= '2020-03-01') &
-    (fact_shelters['report_date'] <= '2021-12-01'),
-    'covid_dummy'
-] = 1
-
-# Affordable vs For-Profit
-# Demolition Indicator
-df["is_demolition"] = (
-    df["job_typeid"] == 2
-).astype(int)
-
-df["is_affordable"] = (
-    df["ownership_group"] == "Affordable"
-).astype(int)
-
-# added dummy var to signify covid impact in our demolition dataset 
-df['covid_dummy'] = 0
-df.loc[
-    (df['month_date'] >= '2020-03-01') &
-    (df['month_date'] <= '2021-12-01'),
-    'covid_dummy'
-] = 1
+# for model exog var (window defined once, in eda_queries.COVID_WINDOW)
+fact_shelters['covid_dummy'] = intervention_dummies(fact_shelters['report_date'])['covid_dummy'].to_numpy()
 
 # Proportion Z-Test
 # (Thomas Analysis)
-affordable = df[df["is_affordable"] == 1]
-forprofit = df[df["is_affordable"] == 0]
-
-count = np.array([
-    affordable["is_demolition"].sum(),
-    forprofit["is_demolition"].sum()
-])
-
-nobs = np.array([
-    len(affordable),
-    len(forprofit)
-])
-
+# count = demolitions, nobs = all jobs; Affordable first, For-Profit second
 if np.any(nobs == 0):
     print("Error: One group has zero observations.")
 else:
@@ -175,13 +97,14 @@ else:
     print("Z Statistic:", stat)
     print("P Value:", pval)
 
-# Monthly Demolition Trend
-monthly_demo = (
-    df[df["job_type"] == "demolition"]
-    .groupby("month_date")
-    .size()
-)
+    # exact counterpart of the z-test: 20k permutation / bootstrap
+    # replicates within each COVID period (cached by input hash)
+    resampled = cached_test(rate_counts, replicates=20_000, alternative='larger')
+    print("\nPermutation / Bootstrap Results (by COVID period)")
+    print("-------------------------------------------------")
+    print(resampled[['aff_rate', 'fp_rate', 'rate_diff', 'z_pvalue', 'perm_pvalue', 'ci_low', 'ci_high']].round(4))
 
+# Monthly Demolition Trend
 plt.figure()
 
 monthly_demo.plot()
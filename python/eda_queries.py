@@ -0,0 +1,215 @@
+"""
+EDA QUERY LAYER OVER nyc_demolitions.db
+
+PURPOSE
+Answer the EDA questions from the agg_demolitions_monthly rollup
+(maintained by db_loader.py) instead of hydrating every fact_demolitions
+row into pandas. Date-range filters, ownership grouping and aggregation
+all run in SQL; only the aggregated result comes back.
+
+CONVENTIONS
+- Date ranges are half-open: start <= month < end, as 'YYYY-MM-DD' strings
+  (dates are stored as text, so the comparisons use the rollup's key index).
+- Ownership groups follow the analysis: Government + Private Non-Profit are
+  "Affordable", everything else "For-Profit".
+"""
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DB_PATH = Path(__file__).resolve().parents[1] / "data" / "processed" / "nyc_demolitions.db"
+
+CONSTRUCTION = 1
+DEMOLITION = 2
+AFFORDABLE_OWNERSHIP = ("Government", "Private Non-Profit")
+_IS_AFFORDABLE = "o.ownership_clean IN (" + ", ".join(f"'{o}'" for o in AFFORDABLE_OWNERSHIP) + ")"
+
+# first and last month of the COVID disruption (also the model's covid_dummy)
+COVID_WINDOW = ("2020-03-01", "2021-12-01")
+_COVID_END = str((pd.Timestamp(COVID_WINDOW[1]) + pd.offsets.MonthBegin()).date())
+
+# columns of the rollup a caller can break results down by
+DIMENSIONS = {
+    "borough": "a.borough",
+    "ownership_clean": "o.ownership_clean",
+    "ownership_group": f"CASE WHEN {_IS_AFFORDABLE} THEN 'Affordable' ELSE 'For-Profit' END",
+    "job_typeid": "a.job_typeid",
+    "year": "CAST(substr(a.month_date, 1, 4) AS INTEGER)",
+    "covid_period": (
+        f"CASE WHEN a.month_date >= '{COVID_WINDOW[0]}' AND a.month_date < '{_COVID_END}' "
+        "THEN 'COVID' ELSE 'Non-COVID' END"
+    ),
+}
+
+
+def connect(path=DB_PATH) -> sqlite3.Connection:
+    """
+    Read-only connection to the database. Every query here reads the
+    rollup, so a database that predates it is rejected up front.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    found = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agg_demolitions_monthly'"
+    ).fetchone()
+    if found is None:
+        conn.close()
+        raise RuntimeError(
+            f"{path} has no agg_demolitions_monthly rollup; migrate it with "
+            f"`python db_loader.py {path}` or rebuild it with create_schema.py first"
+        )
+    return conn
+
+
+def _where(start=None, end=None, job_typeid=None):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("a.month_date >= ?")
+        params.append(str(start))
+    if end is not None:
+        clauses.append("a.month_date < ?")
+        params.append(str(end))
+    if job_typeid is not None:
+        clauses.append("a.job_typeid = ?")
+        params.append(int(job_typeid))
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _select_by(by):
+    by = [by] if isinstance(by, str) else list(by or [])
+    unknown = set(by) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown dimension(s) {sorted(unknown)}; choose from {sorted(DIMENSIONS)}")
+    return by, [f"{DIMENSIONS[b]} AS {b}" for b in by]
+
+
+# ------------------------------------------------------------------
+# DEMOLITION QUERIES
+# ------------------------------------------------------------------
+def monthly_counts(conn, start=None, end=None, job_typeid=DEMOLITION, by=None):
+    """
+    Jobs per month. Returns a Series indexed by month, or with `by`
+    (e.g. "borough", ["borough", "ownership_group"]) a month x group
+    DataFrame, zero-filled where a group had no jobs.
+    """
+    by, select = _select_by(by)
+    where, params = _where(start, end, job_typeid)
+    sql = f"""
+        SELECT a.month_date AS month_date, {"".join(s + ", " for s in select)}SUM(a.n_jobs) AS n_jobs
+        FROM agg_demolitions_monthly a
+        LEFT JOIN dim_ownership o ON o.ownership_id = a.ownership_id
+        {where}
+        GROUP BY {", ".join(["a.month_date"] + by)}
+        ORDER BY a.month_date
+    """
+    df = pd.read_sql_query(sql, conn, params=params, parse_dates=["month_date"])
+    if not by:
+        return df.set_index("month_date")["n_jobs"]
+    return df.pivot_table(index="month_date", columns=by, values="n_jobs", aggfunc="sum", fill_value=0)
+
+
+def ownership_ztest_counts(conn, start=None, end=None):
+    """
+    (count, nobs) for the proportion z-test: demolitions and total jobs for
+    the Affordable group first, For-Profit second.
+    """
+    where, params = _where(start, end)
+    row = conn.execute(
+        f"""
+        SELECT
+          SUM(CASE WHEN aff = 1 AND a.job_typeid = {DEMOLITION} THEN a.n_jobs ELSE 0 END),
+          SUM(CASE WHEN aff = 0 AND a.job_typeid = {DEMOLITION} THEN a.n_jobs ELSE 0 END),
+          SUM(CASE WHEN aff = 1 THEN a.n_jobs ELSE 0 END),
+          SUM(CASE WHEN aff = 0 THEN a.n_jobs ELSE 0 END)
+        FROM (
+          SELECT a.*, COALESCE({_IS_AFFORDABLE}, 0) AS aff
+          FROM agg_demolitions_monthly a
+          LEFT JOIN dim_ownership o ON o.ownership_id = a.ownership_id
+        ) a
+        {where}
+        """,
+        params,
+    ).fetchone()
+    row = [0 if v is None else int(v) for v in row]
+    return np.array(row[:2]), np.array(row[2:])
+
+
+def ownership_rate_counts(conn, start=None, end=None, by=None) -> pd.DataFrame:
+    """
+    Demolitions and total jobs per ownership group, per stratum of `by`
+    (e.g. ["borough", "year"]): columns aff_demolitions, aff_jobs,
+    fp_demolitions, fp_jobs. Same grouping as ownership_ztest_counts.
+    """
+    by, select = _select_by(by)
+    where, params = _where(start, end)
+    aff = f"COALESCE({_IS_AFFORDABLE}, 0)"
+    df = pd.read_sql_query(
+        f"""
+        SELECT {"".join(s + ", " for s in select)}
+          SUM(CASE WHEN {aff} = 1 AND a.job_typeid = {DEMOLITION} THEN a.n_jobs ELSE 0 END) AS aff_demolitions,
+          SUM(CASE WHEN {aff} = 1 THEN a.n_jobs ELSE 0 END) AS aff_jobs,
+          SUM(CASE WHEN {aff} = 0 AND a.job_typeid = {DEMOLITION} THEN a.n_jobs ELSE 0 END) AS fp_demolitions,
+          SUM(CASE WHEN {aff} = 0 THEN a.n_jobs ELSE 0 END) AS fp_jobs
+        FROM agg_demolitions_monthly a
+        LEFT JOIN dim_ownership o ON o.ownership_id = a.ownership_id
+        {where}
+        {("GROUP BY " + ", ".join(by)) if by else ""}
+        """,
+        conn,
+        params=params,
+    )
+    counts = ["aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs"]
+    df[counts] = df[counts].fillna(0).astype(np.int64)
+    return df.set_index(by) if by else df
+
+
+def duration_stats(conn, start=None, end=None, job_typeid=None, by="job_typeid"):
+    """Completion-time stats (n, mean, std, min, max in days) per group."""
+    by, select = _select_by(by)
+    where, params = _where(start, end, job_typeid)
+    df = pd.read_sql_query(
+        f"""
+        SELECT {"".join(s + ", " for s in select)}
+               SUM(a.n_jobs) AS n,
+               SUM(a.total_days) AS total_days,
+               SUM(a.total_sq_days) AS total_sq_days,
+               MIN(a.min_days) AS min_days,
+               MAX(a.max_days) AS max_days
+        FROM agg_demolitions_monthly a
+        LEFT JOIN dim_ownership o ON o.ownership_id = a.ownership_id
+        {where}
+        {("GROUP BY " + ", ".join(by)) if by else ""}
+        """,
+        conn,
+        params=params,
+    )
+    n = df["n"].astype(float)
+    df["mean_days"] = df["total_days"] / n
+    # sample std from the running sums
+    var = (df["total_sq_days"] - n * df["mean_days"] ** 2) / (n - 1)
+    df["std_days"] = np.sqrt(var.clip(lower=0))
+    df = df.drop(columns=["total_days", "total_sq_days"])
+    return df.set_index(by) if by else df
+
+
+# ------------------------------------------------------------------
+# SHELTER QUERIES
+# ------------------------------------------------------------------
+def shelter_counts(conn, start=None, end=None) -> pd.Series:
+    """Monthly shelter counts in the date range, indexed by report date."""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("report_date >= ?")
+        params.append(str(start))
+    if end is not None:
+        clauses.append("report_date < ?")
+        params.append(str(end))
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    df = pd.read_sql_query(
+        f"SELECT report_date, shelter_count FROM fact_shelters {where} ORDER BY report_date",
+        conn,
+        params=params,
+        parse_dates=["report_date"],
+    )
+    return df.set_index("report_date")["shelter_count"]
@@ -0,0 +1,371 @@
+"""
+BATCH EDA REPORT (FIGURES + TEST STATISTICS)
+
+PURPOSE
+The figures in graphs/ and the plots at the end of eda_hypothesistest.py
+were drawn one at a time with plt.show(). This script regenerates all of
+them, plus per-borough and per-ownership-group variants and the test
+statistics, unattended:
+
+    python eda_report.py                      # -> reports/
+    python eda_report.py --only borough_      # just the borough figures
+
+WORKFLOW
+1. Query aggregates once (eda_queries.py, read-only): jobs per month x job
+   type x borough x ownership group from the rollup, shelter counts.
+2. Every figure is a job (name, plotted data, options). Its key hashes the
+   plotted data (pipeline.digest), the options and the source of the
+   renderer; a figure whose key matches the last run and whose PNG is
+   still there is skipped.
+3. Stale figures are drawn across a process pool. Drawing uses the
+   object-oriented matplotlib API on an Agg canvas (no pyplot, no
+   display), so it runs headless and each worker is independent.
+4. Test statistics: the proportion z-test of eda_hypothesistest.py
+   (whole period, by borough, by COVID period) and the permutation /
+   bootstrap counterpart by COVID period (resampling.cached_test).
+
+OUTPUTS (in --out)
+    <figure>.png      one per figure, same layout as graphs/
+    tests.csv         one row per test and stratum
+    manifest.json     figure keys of the last run
+    index.md          figure list and test table
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from eda_queries import CONSTRUCTION, DB_PATH, DEMOLITION, connect, monthly_counts, ownership_rate_counts, \
+    shelter_counts  # noqa: E402
+from pipeline import digest  # noqa: E402
+from resampling import cached_test, z_test  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+OUT_DIR = ROOT / "reports"
+MANIFEST_NAME = "manifest.json"
+
+# analysis period of eda_hypothesistest.py (half-open) and the year span of
+# the borough figures in graphs/
+START, END = "2016-01-01", "2023-01-01"
+YEARS = (2016, 2024)
+DPI = 300
+JOB_TYPES = {CONSTRUCTION: "New Building", DEMOLITION: "Demolition"}
+
+
+# ---------------------------------------------------
+# DATA
+# ---------------------------------------------------
+def load_data(db_path=DB_PATH) -> dict:
+    """Jobs per month x (job type, borough, ownership group) and monthly shelter counts."""
+    conn = connect(db_path)
+    try:
+        activity = monthly_counts(conn, job_typeid=None, by=["job_typeid", "borough", "ownership_group"])
+        shelters = shelter_counts(conn, START, END)
+    finally:
+        conn.close()
+    return {"activity": activity, "shelters": shelters}
+
+
+def _select(frame, job_typeid=None, borough=None, ownership_group=None):
+    """Columns of the activity frame matching the given job type / borough / ownership group."""
+    keep = np.ones(frame.shape[1], dtype=bool)
+    for level, value in (("job_typeid", job_typeid), ("borough", borough), ("ownership_group", ownership_group)):
+        if value is not None:
+            keep &= frame.columns.get_level_values(level) == value
+    return frame.loc[:, keep]
+
+
+def _by(frame, level) -> pd.DataFrame:
+    return frame.T.groupby(level=level).sum().T
+
+
+def _yearly(frame, years=None) -> pd.DataFrame:
+    yearly = frame.groupby(frame.index.year).sum().rename_axis("year")
+    if years:
+        yearly = yearly.loc[years[0]:years[1]]
+    return yearly
+
+
+def _period(frame):
+    """Rows in the analysis period (START <= month < END)."""
+    return frame[(frame.index >= START) & (frame.index < END)]
+
+
+def _percent(part, whole):
+    return 100 * part / whole.where(whole > 0)
+
+
+# ---------------------------------------------------
+# FIGURE JOBS
+# ---------------------------------------------------
+def _figure(name, data, title, ylabel, xlabel="Year", legend=None, figsize=None, rotate=0):
+    options = {"title": title, "xlabel": xlabel, "ylabel": ylabel, "legend": legend,
+               "figsize": figsize, "rotate": rotate}
+    return name, data, options
+
+
+def _slug(value) -> str:
+    return str(value).lower().replace(" ", "_").replace("-", "_")
+
+
+def figure_jobs(data) -> list:
+    """(name, data, options) for every figure of the report."""
+    activity, shelters = data["activity"], data["shelters"]
+    demolitions = _select(activity, job_typeid=DEMOLITION)
+    boroughs = sorted(set(activity.columns.get_level_values("borough")))
+    groups = sorted(set(activity.columns.get_level_values("ownership_group")))
+
+    def activity_by_type(frame):
+        return _yearly(_by(frame, "job_typeid")).reindex(columns=list(JOB_TYPES), fill_value=0) \
+            .rename(columns=JOB_TYPES).rename_axis(columns=None)
+
+    def demolition_share(frame):
+        jobs = _yearly(_by(frame, "ownership_group"))
+        demos = _yearly(_by(_select(frame, job_typeid=DEMOLITION), "ownership_group")).reindex_like(jobs).fillna(0)
+        return _percent(demos, jobs).rename_axis(columns="ownership")
+
+    by_borough = _yearly(_by(demolitions, "borough"), YEARS)
+    affordable = _yearly(_by(_select(demolitions, ownership_group="Affordable"), "borough"), YEARS) \
+        .reindex_like(by_borough).fillna(0)
+
+    jobs = [
+        # graphs/
+        _figure("borough_total_demolitions", by_borough, "Total Demolitions by Borough", "Count",
+                legend="borough"),
+        _figure("borough_affordable_percentage", _percent(affordable, by_borough),
+                "Affordable Demolition % by Borough", "Percent", legend="borough"),
+        _figure("citywide_construction_vs_demolition", activity_by_type(activity),
+                "Citywide Construction vs Demolition", "Count"),
+        _figure("demolition_percentage_by_ownership", demolition_share(activity),
+                "Demolition % (of Total Activity) by Ownership", "Percent", legend="ownership"),
+        # eda_hypothesistest.py
+        _figure("monthly_demolitions", _period(demolitions).sum(axis=1).rename("n_jobs").to_frame(),
+                "Monthly Demolitions Over Time", "Number of Demolitions", xlabel="Date"),
+        _figure("shelter_counts", shelters.resample("MS").sum().to_frame(),
+                "Shelter Counts Over Time", "Number of Shelter Records", xlabel="Date",
+                figsize=(12, 6), rotate=45),
+    ]
+    for borough in boroughs:
+        frame = _select(activity, borough=borough)
+        slug = _slug(borough)
+        jobs += [
+            _figure(f"borough_{slug}_construction_vs_demolition", activity_by_type(frame),
+                    f"{borough}: Construction vs Demolition", "Count"),
+            _figure(f"borough_{slug}_demolition_percentage_by_ownership", demolition_share(frame),
+                    f"{borough}: Demolition % (of Total Activity) by Ownership", "Percent", legend="ownership"),
+            _figure(f"borough_{slug}_monthly_demolitions",
+                    _period(_by(_select(frame, job_typeid=DEMOLITION), "ownership_group"))
+                    .rename_axis(columns="ownership"),
+                    f"{borough}: Monthly Demolitions by Ownership", "Number of Demolitions", xlabel="Date",
+                    legend="ownership"),
+        ]
+    for group in groups:
+        frame = _select(activity, ownership_group=group)
+        slug = _slug(group)
+        jobs += [
+            _figure(f"ownership_{slug}_demolitions_by_borough",
+                    _yearly(_by(_select(frame, job_typeid=DEMOLITION), "borough"), YEARS),
+                    f"{group}: Total Demolitions by Borough", "Count", legend="borough"),
+            _figure(f"ownership_{slug}_construction_vs_demolition", activity_by_type(frame),
+                    f"{group}: Construction vs Demolition", "Count"),
+        ]
+    return jobs
+
+
+# ---------------------------------------------------
+# RENDER (runs inside the process pool)
+# ---------------------------------------------------
+def render(job):
+    """Draw one figure to <out>/<name>.png; never raises."""
+    name, data, options, out_dir, dpi = job
+    start = time.perf_counter()
+    row = {"figure": name, "error": ""}
+    try:
+        fig = Figure(figsize=options["figsize"])
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        for column in data.columns:
+            ax.plot(data.index, data[column], label=str(column))
+        ax.set_title(options["title"])
+        ax.set_xlabel(options["xlabel"])
+        ax.set_ylabel(options["ylabel"])
+        if data.shape[1] > 1:
+            ax.legend(title=options["legend"])
+        if options["rotate"]:
+            ax.tick_params(axis="x", labelrotation=options["rotate"])
+        fig.tight_layout()
+
+        path = Path(out_dir) / f"{name}.png"
+        tmp = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.png")
+        fig.savefig(tmp, dpi=dpi)
+        os.replace(tmp, path)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def figure_key(data, options, dpi) -> str:
+    """Hash of what a figure shows: plotted data, options, dpi and the renderer's source."""
+    return digest([data, json.dumps(options, sort_keys=True), dpi, inspect.getsource(render)])
+
+
+def render_all(jobs, out_dir=OUT_DIR, dpi=DPI, workers=None, force=False) -> list:
+    """
+    render() every job whose key changed since the last run (or whose PNG is
+    missing), across a process pool. Returns one row per job, in job order,
+    with state "ran", "cached" or "failed".
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    keys = {name: figure_key(data, options, dpi) for name, data, options in jobs}
+    stale = [
+        (name, data, options, str(out_dir), dpi)
+        for name, data, options in jobs
+        if force or manifest.get(name) != keys[name] or not (out_dir / f"{name}.png").is_file()
+    ]
+    if len(stale) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = {row["figure"]: row for row in pool.map(render, stale)}
+    else:
+        rendered = {job[0]: render(job) for job in stale}
+
+    rows = []
+    for name, _, _ in jobs:
+        row = rendered.get(name)
+        if row is None:
+            rows.append({"figure": name, "state": "cached", "seconds": 0.0, "error": ""})
+            continue
+        if row["error"]:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = keys[name]
+        rows.append(dict(row, state="failed" if row["error"] else "ran"))
+
+    tmp = manifest_path.with_name(f"{MANIFEST_NAME}.{uuid.uuid4().hex}")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, manifest_path)
+    return rows
+
+
+# ---------------------------------------------------
+# TEST STATISTICS
+# ---------------------------------------------------
+def z_statistic(counts: pd.DataFrame) -> np.ndarray:
+    """Pooled two-proportion z statistic (Affordable - For-Profit) per row of rate counts."""
+    k_aff, n_aff, k_fp, n_fp = (counts[c].to_numpy(dtype=float)
+                                for c in ("aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs"))
+    pooled = (k_aff + k_fp) / (n_aff + n_fp)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (k_aff / n_aff - k_fp / n_fp) / np.sqrt(pooled * (1 - pooled) * (1 / n_aff + 1 / n_fp))
+
+
+def test_statistics(db_path=DB_PATH, replicates=20_000, workers=None) -> pd.DataFrame:
+    """
+    One row per test and stratum: demolition rates of both ownership groups,
+    z statistic / p-value (alternative: Affordable larger) and, by COVID
+    period, the permutation p-value and bootstrap CI.
+    """
+    conn = connect(db_path)
+    try:
+        strata = {
+            "all": ownership_rate_counts(conn, START, END),
+            "borough": ownership_rate_counts(conn, START, END, by="borough"),
+            "covid_period": ownership_rate_counts(conn, START, END, by="covid_period"),
+        }
+    finally:
+        conn.close()
+
+    frames = []
+    for by, counts in strata.items():
+        counts = counts.reset_index(drop=by == "all")
+        frame = counts.rename(columns={by: "stratum"}) if by != "all" else counts.assign(stratum="all")
+        frame.insert(0, "test", "z_test")
+        frame.insert(1, "by", by)
+        frame["aff_rate"] = frame["aff_demolitions"] / frame["aff_jobs"].where(frame["aff_jobs"] > 0)
+        frame["fp_rate"] = frame["fp_demolitions"] / frame["fp_jobs"].where(frame["fp_jobs"] > 0)
+        frame["rate_diff"] = frame["aff_rate"] - frame["fp_rate"]
+        frame["z_stat"] = z_statistic(frame)
+        frame["z_pvalue"] = z_test(*(frame[c] for c in ("aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs")))
+        frames.append(frame)
+
+    resampled = cached_test(strata["covid_period"], replicates=replicates, alternative="larger", workers=workers)
+    resampled = resampled.rename_axis("stratum").reset_index()
+    resampled.insert(0, "test", "resampling")
+    resampled.insert(1, "by", "covid_period")
+    frames.append(resampled)
+
+    columns = ["test", "by", "stratum", "aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs",
+               "aff_rate", "fp_rate", "rate_diff", "z_stat", "z_pvalue", "perm_pvalue", "ci_low", "ci_high"]
+    return pd.concat(frames, ignore_index=True).reindex(columns=columns)
+
+
+def write_index(out_dir, rows, tests) -> None:
+    """index.md: every figure and the test table, for reading the report as a whole."""
+    lines = ["# EDA report", "", f"Analysis period {START} to {END} (exclusive).", "", "## Figures", ""]
+    for row in rows:
+        if row["state"] != "failed":
+            lines.append(f"![{row['figure']}]({row['figure']}.png)")
+    lines += ["", "## Test statistics", "", "Alternative: Affordable demolition rate larger than For-Profit.", ""]
+    shown = tests.drop(columns=["aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs"])
+    header = "| " + " | ".join(shown.columns) + " |"
+    lines += [header, "|" + "---|" * len(shown.columns)]
+    for values in shown.itertuples(index=False):
+        cells = [f"{v:.4g}" if isinstance(v, float) else str(v) for v in values]
+        lines.append("| " + " | ".join("" if c == "nan" else c for c in cells) + " |")
+    (Path(out_dir) / "index.md").write_text("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--out", type=Path, default=OUT_DIR)
+    parser.add_argument("--only", nargs="+", default=None, help="figure name prefixes (default: all)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=DPI)
+    parser.add_argument("--replicates", type=int, default=20_000, help="permutation / bootstrap replicates")
+    parser.add_argument("--force", action="store_true", help="redraw every figure")
+    parser.add_argument("--no-tests", action="store_true", help="figures only")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    jobs = figure_jobs(load_data(args.db))
+    if args.only:
+        jobs = [job for job in jobs if job[0].startswith(tuple(args.only))]
+        if not jobs:
+            parser.error(f"no figure starts with {', '.join(args.only)}")
+    rows = render_all(jobs, args.out, args.dpi, args.workers, args.force)
+
+    for row in rows:
+        if row["error"]:
+            print(f"  {row['figure']}: {row['error']}")
+    states = pd.Series([row["state"] for row in rows]).value_counts()
+    print(f"{len(rows)} figures: " + ", ".join(f"{n} {state}" for state, n in states.items()))
+
+    if not args.no_tests:
+        tests = test_statistics(args.db, args.replicates, args.workers)
+        tests.to_csv(args.out / "tests.csv", index=False)
+        write_index(args.out, rows, tests)
+        with pd.option_context("display.width", 200, "display.max_rows", 100):
+            print(tests.drop(columns=["aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs"])
+                  .round(4).to_string(index=False))
+    print(f"report in {time.perf_counter() - start:.1f}s -> {args.out}")
+    sys.exit(1 if (states.get("failed", 0)) else 0)
@@ -0,0 +1,195 @@
+"""
+TYPED IN-MEMORY FACT TABLES
+
+PURPOSE
+Every reader of fact_demolitions used to take pandas' default inference:
+borough and the three dates as Python strings (one object per row), ids
+and durations as int64, and labels joined on as more strings. This module
+is the one place that decides how the fact tables look in memory, so the
+ETL, the CSV exports, the columnar cache and the benchmarks all hold the
+same compact frame.
+
+SCHEMA
+    fact_demolitions
+        month_date          datetime64[ns]   first of the completion month
+        bin                 int32            BINs are 7 digits
+        job_typeid          int32            dim_jobtype key
+        ownership_id        int32            dim_ownership key
+        borough             category         codes 0-4 = Boro 1-5
+        date_filed          datetime64[ns]
+        date_completed      datetime64[ns]
+        time_of_completion  int16            days, up to ~89 years
+    fact_shelters
+        report_date         datetime64[ns]
+        shelter_count       int32
+
+Integer casts are checked (OverflowError instead of silent wrap-around).
+Ownership / job type labels are never carried as strings: with_labels()
+decodes the integer keys into categoricals through the dim tables, so a
+"join" is one array lookup on the codes.
+
+PER-ROW FOOTPRINT (fact_demolitions, data/processed/fact_demolitions.csv,
+`python fact_tables.py` prints it for any CSV)
+    column               default inference      typed
+    month_date           object   67 B          8 B
+    bin                  int64     8 B          4 B
+    job_typeid           int64     8 B          4 B
+    ownership_id         int64     8 B          4 B
+    borough              object   65 B          1 B
+    date_filed           object   67 B          8 B
+    date_completed       object   67 B          8 B
+    time_of_completion   int64     8 B          2 B
+    total                        ~298 B        39 B
+with_labels() adds 1 B per label column. 10 million facts are ~390 MB
+typed instead of ~3 GB.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+READ_CHUNKSIZE = 200_000
+
+BOROUGHS = ['Manhattan', 'Bronx', 'Brooklyn', 'Queens', 'Staten Island']
+BOROUGH_DTYPE = pd.CategoricalDtype(BOROUGHS)
+
+DATETIME = 'datetime64[ns]'
+
+SCHEMAS = {
+    'fact_demolitions': {
+        'month_date': DATETIME,
+        'bin': 'int32',
+        'job_typeid': 'int32',
+        'ownership_id': 'int32',
+        'borough': BOROUGH_DTYPE,
+        'date_filed': DATETIME,
+        'date_completed': DATETIME,
+        'time_of_completion': 'int16',
+    },
+    'fact_shelters': {
+        'report_date': DATETIME,
+        'shelter_count': 'int32',
+    },
+}
+
+# label columns with_labels() adds: name -> (key column, dim name column)
+LABELS = {
+    'ownership_group': ('ownership_id', 'ownership_clean'),
+    'job_type': ('job_typeid', 'job_type'),
+}
+
+
+# ------------------------------------------------------------------
+# COLUMN CASTS
+# ------------------------------------------------------------------
+def narrow(values, dtype) -> np.ndarray:
+    """Integer array as `dtype`, raising OverflowError if a value does not fit."""
+    values = np.asarray(values)
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        raise OverflowError(f"values in [{values.min()}, {values.max()}] do not fit {np.dtype(dtype)}")
+    return values.astype(dtype, copy=False)
+
+
+def borough_from_codes(boro) -> pd.Categorical:
+    """DCP Boro codes (1-5) -> borough categorical; anything else is missing."""
+    codes = np.asarray(pd.Series(boro).fillna(0), dtype=np.int64) - 1
+    codes[(codes < 0) | (codes >= len(BOROUGHS))] = -1
+    return pd.Categorical.from_codes(codes, dtype=BOROUGH_DTYPE)
+
+
+def _cast(col: pd.Series, dtype) -> pd.Series:
+    if isinstance(dtype, pd.CategoricalDtype):
+        return col.astype(dtype)
+    if dtype == DATETIME:
+        if pd.api.types.is_datetime64_any_dtype(col):
+            return col.astype(DATETIME)
+        return pd.to_datetime(col, format='ISO8601')
+    if col.dtype == object:
+        # fact_demolitions.bin is a TEXT column in the database
+        col = pd.to_numeric(col)
+    return pd.Series(narrow(col.to_numpy(), dtype), index=col.index, name=col.name)
+
+
+def as_typed(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """`df` with the columns of `table` in their compact dtypes (other columns untouched)."""
+    out = {}
+    for name, col in df.items():
+        dtype = SCHEMAS[table].get(name)
+        out[name] = col if dtype is None or col.dtype == dtype else _cast(col, dtype)
+    return pd.DataFrame(out, index=df.index)
+
+
+# ------------------------------------------------------------------
+# LOADERS
+# ------------------------------------------------------------------
+def read_facts(conn, table: str, where: str = None, params=(), chunksize=READ_CHUNKSIZE) -> pd.DataFrame:
+    """
+    `table` from the database, typed chunk by chunk, so the string form
+    of at most `chunksize` rows exists at once.
+    """
+    columns = list(SCHEMAS[table])
+    sql = f"SELECT {', '.join(columns)} FROM {table}" + (f" WHERE {where}" if where else "")
+    chunks = [as_typed(chunk, table) for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize)]
+    if not chunks:
+        return as_typed(pd.DataFrame({c: pd.Series(dtype=object) for c in columns}), table)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_facts_csv(path, table: str = None) -> pd.DataFrame:
+    """A processed fact CSV, parsed straight into the compact dtypes."""
+    table = table or _table_for(path)
+    # dates are converted afterwards: read_csv's parse_dates falls back to a
+    # slow path whenever `dtype` is also given (~8x on fact_demolitions)
+    dtype = {c: d for c, d in SCHEMAS[table].items() if d != DATETIME}
+    return as_typed(pd.read_csv(path, dtype=dtype), table)
+
+
+def _table_for(path) -> str:
+    stem = Path(path).stem
+    # the processed shelter CSV is fact_shelter.csv
+    return 'fact_shelters' if stem == 'fact_shelter' else stem
+
+
+# ------------------------------------------------------------------
+# LABELS (integer-code joins against the dim tables)
+# ------------------------------------------------------------------
+def decode(keys, dim: pd.DataFrame, id_col: str, name_col: str) -> pd.Categorical:
+    """Dimension ids -> categorical of their names; unknown ids are missing."""
+    ids = dim[id_col].to_numpy(dtype=np.int64)
+    lookup = np.full(ids.max() + 2 if len(ids) else 1, -1, dtype=np.int32)
+    lookup[ids] = np.arange(len(ids))
+    keys = np.asarray(keys, dtype=np.int64)
+    codes = np.where((keys >= 0) & (keys < len(lookup)), lookup[np.clip(keys, 0, len(lookup) - 1)], -1)
+    return pd.Categorical.from_codes(codes, dim[name_col].astype(str).tolist())
+
+
+def with_labels(facts: pd.DataFrame, dim_ownership: pd.DataFrame, dim_jobtype: pd.DataFrame) -> pd.DataFrame:
+    """fact_demolitions plus ownership_group / job_type categoricals decoded from the ids."""
+    dims = {'ownership_group': dim_ownership, 'job_type': dim_jobtype}
+    out = facts.copy(deep=False)
+    for label, (key, name_col) in LABELS.items():
+        out[label] = decode(facts[key], dims[label], key, name_col)
+    return out
+
+
+# ------------------------------------------------------------------
+# FOOTPRINT
+# ------------------------------------------------------------------
+def bytes_per_row(df: pd.DataFrame) -> pd.Series:
+    """Deep memory per row, by column (plus 'total')."""
+    usage = df.memory_usage(deep=True, index=False) / max(len(df), 1)
+    return pd.concat([usage, pd.Series({'total': usage.sum()})])
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or [Path(__file__).resolve().parents[1] / 'data' / 'processed' / 'fact_demolitions.csv']:
+        typed = read_facts_csv(path)
+        report = pd.DataFrame({
+            'default': bytes_per_row(pd.read_csv(path)),
+            'typed': bytes_per_row(typed),
+            'dtype': typed.dtypes.astype(str),
+        })
+        print(f"{path}: bytes per row")
+        print(report.round(1).fillna('').to_string(), end='\n\n')
@@ -0,0 +1,197 @@
+"""
+EXOGENOUS FEATURE STORE
+
+PURPOSE
+deployment/data/datedf.csv (shelter_count + the SARIMAX exogenous columns)
+used to be exported by hand from the training notebook. This module derives
+it from the database instead, as an incremental step of every load.
+
+HOW IT WORKS
+- Base features are monthly demolition counts, kept in the database table
+  feature_demolitions_monthly (month_date, feature, value; created by
+  db_loader.ensure_schema() with the other tables):
+      affordable_demo               citywide affordable demolitions
+      affordable_demo_<borough>     the same, split by borough
+  "Affordable" is Government + Private Non-Profit ownership, as in the EDA.
+- refresh_features(conn, months) recomputes only the given months (those
+  db_loader.refresh_rollups() just refreshed) from agg_demolitions_monthly.
+- feature_frame() assembles the model frame over a month range:
+      shelter_count, affordable_demo,
+      intervention dummies (INTERVENTIONS, e.g. covid_dummy),
+      aff_demo_lag<k> for k in LAGS,
+      aff_demo_roll<w> (rolling sums) for w in ROLLING_WINDOWS,
+      aff_demo_<borough> borough splits.
+  Lags and rolling sums are computed inside the range with missing history
+  counted as 0, matching the training notebook.
+- write_datedf() writes that frame to datedf.csv only when its content
+  changed, so the app's columnar cache and forecast cache invalidate
+  exactly when the features do.
+
+USAGE
+    python feature_store.py                       # refresh features + datedf.csv
+    python feature_store.py --db path/to.db --out path/to/datedf.csv --full
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from eda_queries import AFFORDABLE_OWNERSHIP, COVID_WINDOW, DB_PATH, DEMOLITION  # noqa: E402
+from forecasting import EXOG_PATH  # noqa: E402
+
+START = "2016-01-01"
+END = "2022-12-01"            # last month included
+LAGS = (1, 2)
+ROLLING_WINDOWS = (3, 12)
+BOROUGHS = ["Bronx", "Brooklyn", "Manhattan", "Queens", "Staten Island"]
+
+# name -> (first month, last month) the dummy is 1
+INTERVENTIONS = {
+    "covid_dummy": COVID_WINDOW,
+}
+
+def borough_slug(borough: str) -> str:
+    return borough.lower().replace(" ", "_")
+
+
+# ------------------------------------------------------------------
+# BASE FEATURES (stored, refreshed per month)
+# ------------------------------------------------------------------
+def refresh_features(conn, months=None) -> int:
+    """
+    Recompute the base features for `months` (all months when None or when
+    the table is still empty). Returns the number of months refreshed.
+    The table comes from db_loader.ensure_schema().
+    """
+    empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM feature_demolitions_monthly)").fetchone()[0]
+    if months is None or empty:
+        months = [r[0] for r in conn.execute("SELECT DISTINCT month_date FROM agg_demolitions_monthly")]
+    months = sorted(set(months))
+    if not months:
+        return 0
+
+    selected = "SELECT value FROM json_each(?)"
+    params = (json.dumps(months),)
+    affordable = ", ".join(f"'{o}'" for o in AFFORDABLE_OWNERSHIP)
+
+    conn.execute(f"DELETE FROM feature_demolitions_monthly WHERE month_date IN ({selected})", params)
+    conn.execute(
+        f"""
+        INSERT INTO feature_demolitions_monthly (month_date, feature, value)
+        WITH affordable AS (
+          SELECT a.month_date, a.borough, a.n_jobs
+          FROM agg_demolitions_monthly a
+          JOIN dim_ownership o ON o.ownership_id = a.ownership_id
+          WHERE a.job_typeid = {DEMOLITION}
+            AND o.ownership_clean IN ({affordable})
+            AND a.month_date IN ({selected})
+        )
+        SELECT month_date, 'affordable_demo', SUM(n_jobs)
+        FROM affordable GROUP BY month_date
+        UNION ALL
+        SELECT month_date, 'affordable_demo_' || LOWER(REPLACE(borough, ' ', '_')), SUM(n_jobs)
+        FROM affordable WHERE borough IS NOT NULL GROUP BY month_date, borough
+        """,
+        params,
+    )
+    return len(months)
+
+
+def _base_features(conn, index) -> pd.DataFrame:
+    df = pd.read_sql_query(
+        "SELECT month_date, feature, value FROM feature_demolitions_monthly "
+        "WHERE month_date >= ? AND month_date < ?",
+        conn,
+        params=(str(index[0].date()), str((index[-1] + pd.offsets.MonthBegin()).date())),
+        parse_dates=["month_date"],
+    )
+    wide = df.pivot_table(index="month_date", columns="feature", values="value", aggfunc="sum")
+    columns = ["affordable_demo"] + [f"affordable_demo_{borough_slug(b)}" for b in BOROUGHS]
+    # months without an affordable demolition have no rows: they are 0
+    return wide.reindex(index=index, columns=columns).fillna(0.0)
+
+
+# ------------------------------------------------------------------
+# MODEL FRAME
+# ------------------------------------------------------------------
+def intervention_dummies(index, interventions=INTERVENTIONS) -> pd.DataFrame:
+    """0/1 dummy per intervention window, over any monthly DatetimeIndex."""
+    index = pd.DatetimeIndex(index)
+    return pd.DataFrame(
+        {
+            name: ((index >= pd.Timestamp(first)) & (index <= pd.Timestamp(last))).astype(np.int64)
+            for name, (first, last) in interventions.items()
+        },
+        index=index,
+    )
+
+
+def feature_frame(conn, start=START, end=END, lags=LAGS, windows=ROLLING_WINDOWS,
+                  boroughs=True, interventions=INTERVENTIONS) -> pd.DataFrame:
+    """Monthly target + exogenous features for start..end (both months included)."""
+    index = pd.date_range(start, end, freq="MS", name="month_date")
+    base = _base_features(conn, index)
+
+    shelters = pd.read_sql_query(
+        "SELECT report_date, shelter_count FROM fact_shelters WHERE report_date >= ? AND report_date < ?",
+        conn,
+        params=(str(index[0].date()), str((index[-1] + pd.offsets.MonthBegin()).date())),
+        parse_dates=["report_date"],
+    )
+    shelter_count = (
+        shelters.drop_duplicates(subset="report_date")
+        .groupby(shelters["report_date"].dt.to_period("M").dt.start_time)["shelter_count"]
+        .sum()
+        .reindex(index)
+    )
+
+    aff = base["affordable_demo"]
+    frame = pd.DataFrame({"affordable_demo": aff, "shelter_count": shelter_count}, index=index)
+    frame = frame.join(intervention_dummies(index, interventions))
+    for k in lags:
+        frame[f"aff_demo_lag{k}"] = aff.shift(k).fillna(0.0)
+    for w in windows:
+        frame[f"aff_demo_roll{w}"] = aff.rolling(w, min_periods=1).sum()
+    if boroughs:
+        for b in BOROUGHS:
+            frame[f"aff_demo_{borough_slug(b)}"] = base[f"affordable_demo_{borough_slug(b)}"]
+
+    if frame["shelter_count"].notna().all():
+        frame["shelter_count"] = frame["shelter_count"].astype(np.int64)
+    return frame
+
+
+def write_datedf(conn, path=EXOG_PATH, **spec) -> bool:
+    """Write feature_frame() to `path` if it changed. Returns True when written."""
+    path = Path(path)
+    content = feature_frame(conn, **spec).to_csv(date_format="%Y-%m-%d")
+    if path.exists() and path.read_text() == content:
+        return False
+    tmp = path.with_suffix(".csv.tmp")
+    tmp.write_text(content)
+    tmp.replace(path)
+    return True
+
+
+if __name__ == "__main__":
+    from db_loader import connect, ensure_schema, refresh_rollups, transaction
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--out", default=str(EXOG_PATH))
+    parser.add_argument("--full", action="store_true", help="recompute every month, not only pending ones")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    ensure_schema(conn)
+    with transaction(conn):
+        months = refresh_rollups(conn)
+        n = refresh_features(conn, None if args.full else months)
+    changed = write_datedf(conn, args.out)
+    conn.close()
+    print(f"refreshed {n} months; {args.out} {'updated' if changed else 'unchanged'}")
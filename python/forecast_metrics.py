@@ -0,0 +1,186 @@
+"""
+FORECASTS FOR EVERY DHS DASHBOARD METRIC
+
+PURPOSE
+The deployed models forecast one series (FWC unique individuals). The
+DHS dashboard carries dozens more: census by household type, single
+adults by gender, age bands, race / ethnicity, placements, rates. This
+script forecasts all of them with one shared configuration and writes
+the results to one tidy table, so a new segment needs no script edit.
+
+WORKFLOW
+1. Wide table: data/processed/dhs_metrics.csv (one float column per
+   metric, written by create_schema.py through dhs_etl.py), or --raw to
+   parse a dashboard export directly. Reindexed to one row per month;
+   missing months stay missing (the Kalman filter skips them).
+2. Series with fewer than two seasons of observations before the holdout
+   are skipped.
+3. Per series, across a process pool: SARIMAX with the shared spec fit on
+   all but the last --holdout months and scored on them (RMSE, MAPE),
+   then extended with the held-out months (same parameters, no refit) and
+   forecast --horizon months past its last observation.
+4. deployment/data/dhs_metric_forecasts.csv, one row per metric and month:
+       metric, unit, month_date, forecast, lower, upper,
+       holdout_rmse, holdout_mape
+   Counts are clipped at 0 and rates (unit = percent) to [0, 100].
+
+USAGE
+    python forecast_metrics.py --horizon 12 --workers 4
+    python forecast_metrics.py --metrics sa_avg_daily_census_individual_in_shelter_total --order 1 1 0
+    python forecast_metrics.py --raw ../data/DHS_Data_Dashboard.csv
+"""
+import argparse
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from columnar_cache import read_table  # noqa: E402
+from dhs_etl import metric_unit, metrics_wide  # noqa: E402
+from forecasting import MODEL_DIR, PROCESSED_DIR  # noqa: E402
+
+METRICS_PATH = PROCESSED_DIR / "dhs_metrics.csv"
+OUTPUT_PATH = MODEL_DIR / "dhs_metric_forecasts.csv"
+
+ORDER = (1, 0, 0)
+SEASONAL_ORDER = (1, 1, 0, 12)
+TREND = None
+HOLDOUT = 12
+ALPHA = 0.05
+
+
+# ---------------------------------------------------
+# DATA
+# ---------------------------------------------------
+def load_metrics(path=METRICS_PATH, raw=None) -> pd.DataFrame:
+    """Month x metric floats, one row per month from the first to the last report."""
+    wide = metrics_wide(pd.read_csv(raw)) if raw else read_table(path)
+    wide = wide.set_index("report_date").sort_index()
+    wide.index = wide.index.to_period("M").to_timestamp()
+    wide = wide[~wide.index.duplicated(keep="last")]
+    return wide.asfreq("MS").rename_axis("month_date")
+
+
+# ---------------------------------------------------
+# FIT + FORECAST (runs inside the process pool)
+# ---------------------------------------------------
+def forecast_series(job):
+    """Holdout score and forecast for one metric; never raises."""
+    name, series, spec, holdout, horizon, alpha = job
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    start = time.perf_counter()
+    row = {"metric": name, "error": "", "warnings": ""}
+    try:
+        series = series.loc[series.first_valid_index():series.last_valid_index()]
+        train, test = series.iloc[:-holdout], series.iloc[-holdout:]
+        season = spec["seasonal_order"][3]
+        if train.count() < 2 * season:
+            raise ValueError(f"{train.count()} observations before the holdout, need {2 * season}")
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            res = SARIMAX(
+                train,
+                order=tuple(spec["order"]),
+                seasonal_order=tuple(spec["seasonal_order"]),
+                trend=spec["trend"],
+                enforce_stationarity=False,
+            ).fit(disp=False)
+            predicted = res.get_forecast(steps=len(test)).predicted_mean
+            fc = res.append(test).get_forecast(steps=horizon)
+
+        actual = test.to_numpy(dtype=float)
+        err = actual - predicted.to_numpy()
+        seen = ~np.isnan(actual)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ape = np.abs(err[seen] / actual[seen])
+        conf = fc.conf_int(alpha=alpha)
+        row.update(
+            index=fc.predicted_mean.index,
+            forecast=fc.predicted_mean.to_numpy(),
+            lower=conf.iloc[:, 0].to_numpy(),
+            upper=conf.iloc[:, 1].to_numpy(),
+            holdout_rmse=float(np.sqrt(np.mean(err[seen] ** 2))) if seen.any() else np.nan,
+            holdout_mape=float(np.mean(ape[np.isfinite(ape)])) if np.isfinite(ape).any() else np.nan,
+            converged=bool(res.mle_retvals.get("converged", False)),
+            warnings="; ".join(sorted({type(w.message).__name__ for w in caught})),
+        )
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def forecast_all(wide, spec, holdout=HOLDOUT, horizon=12, alpha=ALPHA, workers=None):
+    """forecast_series() for every column of `wide`, in column order."""
+    jobs = [(name, wide[name], spec, holdout, horizon, alpha) for name in wide.columns]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(forecast_series, jobs))
+
+
+def forecast_table(rows) -> pd.DataFrame:
+    """One tidy row per metric and forecast month (failed metrics are left out)."""
+    frames = []
+    for row in rows:
+        if row["error"]:
+            continue
+        unit = metric_unit(row["metric"])
+        upper_bound = 100.0 if unit == "percent" else np.inf
+        frames.append(pd.DataFrame({
+            "metric": row["metric"],
+            "unit": unit,
+            "month_date": row["index"],
+            "forecast": np.clip(row["forecast"], 0.0, upper_bound),
+            "lower": np.clip(row["lower"], 0.0, upper_bound),
+            "upper": np.clip(row["upper"], 0.0, upper_bound),
+            "holdout_rmse": row["holdout_rmse"],
+            "holdout_mape": row["holdout_mape"],
+        }))
+    columns = ["metric", "unit", "month_date", "forecast", "lower", "upper", "holdout_rmse", "holdout_mape"]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", type=Path, default=METRICS_PATH, help="processed wide metrics CSV")
+    parser.add_argument("--raw", type=Path, default=None, help="parse this dashboard export instead")
+    parser.add_argument("--metrics", nargs="+", default=None, help="only these metrics (default: all)")
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--holdout", type=int, default=HOLDOUT, help="months scored out of sample")
+    parser.add_argument("--order", type=int, nargs=3, default=list(ORDER))
+    parser.add_argument("--seasonal-order", type=int, nargs=4, default=list(SEASONAL_ORDER))
+    parser.add_argument("--trend", default=TREND)
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", type=Path, default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    wide = load_metrics(args.data, args.raw)
+    if args.metrics:
+        unknown = sorted(set(args.metrics) - set(wide.columns))
+        if unknown:
+            parser.error(f"unknown metrics: {', '.join(unknown)}")
+        wide = wide[args.metrics]
+    spec = {"order": args.order, "seasonal_order": args.seasonal_order, "trend": args.trend}
+
+    start = time.perf_counter()
+    rows = forecast_all(wide, spec, args.holdout, args.horizon, args.alpha, args.workers)
+    table = forecast_table(rows)
+    table.to_csv(args.out, index=False, date_format="%Y-%m-%d")
+
+    summary = pd.DataFrame(rows).set_index("metric")
+    failed = summary[summary["error"] != ""]
+    for name, error in failed["error"].items():
+        print(f"  {name}: {error}")
+    ok = summary[summary["error"] == ""]
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        print(ok[["holdout_rmse", "holdout_mape", "converged", "seconds"]].round(3).to_string())
+    print(f"{len(ok)} of {len(summary)} metrics forecast {args.horizon} months in "
+          f"{time.perf_counter() - start:.1f}s ({ok['converged'].sum()} converged) -> {args.out}")
@@ -0,0 +1,290 @@
+"""
+BOROUGH x OWNERSHIP DEMOLITION FORECASTS WITH RECONCILIATION
+
+PURPOSE
+Every deployed model forecasts one citywide series. Planners want the
+same view per borough and ownership group, so this script forecasts the
+monthly demolition counts of a three-level hierarchy:
+
+    total                                  citywide
+    <borough>                              5 boroughs
+    <borough> / <Affordable|For-Profit>    10 bottom series
+
+and reconciles the forecasts so that the groups add up to their borough
+and the boroughs add up to the city.
+
+WORKFLOW
+1. Read the monthly counts per borough x ownership group from the
+   agg_demolitions_monthly rollup (eda_queries.monthly_counts); the upper
+   levels are sums of the bottom series.
+2. Fit one SARIMAX per series across a process pool. Each fit is cached
+   as its own compact artifact in deployment/data/hierarchy/, and the
+   manifest records a hash of the series it was fit on: only series whose
+   data (or spec) changed are refit.
+3. Forecast every series from its artifact and reconcile:
+      bottom_up : bottom forecasts summed up the hierarchy
+      ols       : y~ = S (S'S)^-1 S' y^
+      wls       : y~ = S (S'W^-1 S)^-1 S'W^-1 y^ with W = diag(in-sample
+                  residual variance), so noisy series move the most
+   Intervals use the reconciled covariance S G Sigma_h G' S', with Sigma_h
+   the (assumed independent) base forecast variances at horizon h.
+4. Write deployment/data/borough_forecasts.csv (one row per series and
+   month: base forecast, reconciled forecast and interval).
+
+USAGE
+    python hierarchical_forecast.py --db path/to.db --horizon 12 --method wls
+    python hierarchical_forecast.py --force            # refit every series
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from artifacts import from_artifact, to_artifact  # noqa: E402
+from eda_queries import DB_PATH, DEMOLITION, connect, monthly_counts  # noqa: E402
+from feature_store import END, START  # noqa: E402
+from forecasting import MODEL_DIR  # noqa: E402
+
+HIERARCHY_DIR = MODEL_DIR / "hierarchy"
+MANIFEST_PATH = HIERARCHY_DIR / "manifest.json"
+OUTPUT_PATH = MODEL_DIR / "borough_forecasts.csv"
+
+ORDER = (1, 0, 0)
+SEASONAL_ORDER = (1, 0, 0, 12)
+TREND = "c"
+METHODS = ("bottom_up", "ols", "wls")
+TOTAL = "total"
+
+
+# ---------------------------------------------------
+# HIERARCHY
+# ---------------------------------------------------
+def load_bottom(conn, start=START, end=END) -> pd.DataFrame:
+    """Month x (borough, ownership_group) demolition counts, zero-filled."""
+    index = pd.date_range(start, end, freq="MS", name="month_date")
+    end_excl = str((index[-1] + pd.offsets.MonthBegin()).date())
+    wide = monthly_counts(conn, start, end_excl, job_typeid=DEMOLITION, by=["borough", "ownership_group"])
+    wide = wide.reindex(index, fill_value=0).astype(float)
+    wide.columns = [f"{b} / {g}" for b, g in wide.columns]
+    return wide
+
+
+def summing_matrix(bottom_names) -> pd.DataFrame:
+    """S with one row per series (total, boroughs, bottom) and one column per bottom series."""
+    boroughs = list(dict.fromkeys(name.split(" / ")[0] for name in bottom_names))
+    rows = {TOTAL: np.ones(len(bottom_names))}
+    for b in boroughs:
+        rows[b] = np.array([name.split(" / ")[0] == b for name in bottom_names], dtype=float)
+    for i, name in enumerate(bottom_names):
+        rows[name] = np.eye(len(bottom_names))[i]
+    return pd.DataFrame(rows, index=bottom_names).T
+
+
+def all_series(bottom: pd.DataFrame, S: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(bottom.to_numpy() @ S.to_numpy().T, index=bottom.index, columns=S.index)
+
+
+def series_slug(name: str) -> str:
+    return name.lower().replace(" / ", "__").replace(" ", "_").replace("-", "_")
+
+
+def series_hash(series: pd.Series, spec: dict) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps(spec, sort_keys=True).encode())
+    h.update(str(series.index[0].date()).encode())
+    h.update(np.ascontiguousarray(series.to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+# ---------------------------------------------------
+# FITTING (runs inside the process pool)
+# ---------------------------------------------------
+def fit_series(job):
+    """Fit one series; returns its artifact and residual variance, never raises."""
+    name, series, spec = job
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    start = time.perf_counter()
+    row = {"series": name, "artifact": None, "resid_var": float(series.var()), "warnings": "", "error": ""}
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            res = SARIMAX(
+                series,
+                order=tuple(spec["order"]),
+                seasonal_order=tuple(spec["seasonal_order"]),
+                trend=spec["trend"],
+                enforce_stationarity=False,
+            ).fit(disp=False)
+        # skip the burn-in of the seasonal lags
+        resid = np.asarray(res.resid)[spec["seasonal_order"][3]:]
+        row.update(
+            artifact=to_artifact(res),
+            resid_var=float(np.var(resid)) or row["resid_var"],
+            warnings="; ".join(sorted({type(w.message).__name__ for w in caught})),
+        )
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def read_manifest(path=MANIFEST_PATH) -> dict:
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def fit_hierarchy(series, spec, workers=None, force=False, out_dir=HIERARCHY_DIR):
+    """
+    Fit every series whose data or spec changed since its cached fit.
+    Returns the updated manifest (series -> hash, resid_var, artifact file).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_PATH.name
+    manifest = read_manifest(manifest_path)
+
+    hashes = {name: series_hash(series[name], spec) for name in series.columns}
+    stale = [
+        name for name in series.columns
+        if force
+        or manifest.get(name, {}).get("hash") != hashes[name]
+        or not (out_dir / manifest[name].get("artifact", "")).is_file()
+    ]
+    print(f"{len(series.columns) - len(stale)} series cached, fitting {len(stale)}")
+
+    jobs = [(name, series[name].asfreq("MS"), spec) for name in stale]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for row in pool.map(fit_series, jobs):
+            name = row["series"]
+            entry = {"hash": hashes[name], "resid_var": row["resid_var"], "seconds": row["seconds"],
+                     "warnings": row["warnings"], "error": row["error"], "artifact": ""}
+            if row["artifact"] is not None:
+                entry["artifact"] = f"{series_slug(name)}.json"
+                (out_dir / entry["artifact"]).write_text(json.dumps(row["artifact"]))
+            else:
+                print(f"  {name}: {row['error']} (falling back to the series mean)")
+            manifest[name] = entry
+
+    manifest = {name: manifest[name] for name in series.columns}
+    tmp = manifest_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(manifest_path)
+    return manifest
+
+
+# ---------------------------------------------------
+# FORECAST + RECONCILIATION
+# ---------------------------------------------------
+def base_forecasts(series, manifest, horizon, out_dir=HIERARCHY_DIR):
+    """(index, mean, var) with mean / var of shape (horizon, n_series) in series order."""
+    index = pd.date_range(series.index[-1] + pd.offsets.MonthBegin(), periods=horizon, freq="MS")
+    mean = np.empty((horizon, len(series.columns)))
+    var = np.empty_like(mean)
+    for j, name in enumerate(series.columns):
+        entry = manifest[name]
+        if entry["artifact"]:
+            model = from_artifact(json.loads((out_dir / entry["artifact"]).read_text()))
+            fc = model.get_forecast(steps=int(horizon))
+            mean[:, j] = fc.predicted_mean.to_numpy()
+            var[:, j] = np.asarray(fc.var_pred_mean)
+        else:
+            mean[:, j] = series[name].mean()
+            var[:, j] = entry["resid_var"]
+    return index, mean, var
+
+
+def reconciliation_matrix(S, method="wls", resid_var=None):
+    """G such that reconciled bottom = G @ base, so reconciled = S @ G @ base."""
+    S = np.asarray(S, dtype=float)
+    n, m = S.shape
+    if method == "bottom_up":
+        return np.hstack([np.zeros((m, n - m)), np.eye(m)])
+    if method == "ols":
+        w_inv = np.ones(n)
+    elif method == "wls":
+        w_inv = 1.0 / np.maximum(np.asarray(resid_var, dtype=float), 1e-8)
+    else:
+        raise ValueError(f"Unknown method {method!r}; choose from {METHODS}")
+    StW = S.T * w_inv
+    return np.linalg.solve(StW @ S, StW)
+
+
+def reconcile(S, mean, var, method="wls", resid_var=None, alpha=0.05):
+    """
+    Reconciled (mean, lower, upper), each (horizon, n_series). Lower bounds
+    are clipped at 0 (these are counts); the means are not, so the levels
+    still add up exactly.
+    """
+    S = np.asarray(S, dtype=float)
+    P = S @ reconciliation_matrix(S, method, resid_var)
+    rec_mean = mean @ P.T
+    # diag(P diag(var_h) P') for every horizon at once
+    rec_sd = np.sqrt(var @ (P ** 2).T)
+    z = norm.ppf(1 - alpha / 2)
+    return rec_mean, np.maximum(rec_mean - z * rec_sd, 0.0), rec_mean + z * rec_sd
+
+
+def forecast_frame(S, index, base, rec_mean, lower, upper) -> pd.DataFrame:
+    names = list(S.index)
+    frames = []
+    for j, name in enumerate(names):
+        borough, _, group = name.partition(" / ")
+        level = "total" if name == TOTAL else ("bottom" if group else "borough")
+        frames.append(pd.DataFrame({
+            "month_date": index,
+            "series": name,
+            "level": level,
+            "borough": "" if level == "total" else borough,
+            "ownership_group": group,
+            "base_forecast": base[:, j],
+            "forecast": rec_mean[:, j],
+            "lower": lower[:, j],
+            "upper": upper[:, j],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--start", default=START)
+    parser.add_argument("--end", default=END, help="last month included")
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--method", choices=METHODS, default="wls")
+    parser.add_argument("--order", type=int, nargs=3, default=list(ORDER))
+    parser.add_argument("--seasonal-order", type=int, nargs=4, default=list(SEASONAL_ORDER))
+    parser.add_argument("--trend", default=TREND)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="refit every series")
+    parser.add_argument("--cache-dir", type=Path, default=HIERARCHY_DIR)
+    parser.add_argument("--out", type=Path, default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    bottom = load_bottom(conn, args.start, args.end)
+    conn.close()
+    S = summing_matrix(list(bottom.columns))
+    series = all_series(bottom, S)
+    spec = {"order": args.order, "seasonal_order": args.seasonal_order, "trend": args.trend}
+
+    start = time.perf_counter()
+    manifest = fit_hierarchy(series, spec, args.workers, args.force, args.cache_dir)
+    index, base, var = base_forecasts(series, manifest, args.horizon, args.cache_dir)
+    resid_var = [manifest[name]["resid_var"] for name in series.columns]
+    rec_mean, lower, upper = reconcile(S, base, var, args.method, resid_var)
+
+    frame = forecast_frame(S, index, base, rec_mean, lower, upper)
+    frame.to_csv(args.out, index=False, date_format="%Y-%m-%d")
+    boroughs = [j for j, name in enumerate(S.index) if name != TOTAL and " / " not in name]
+    gap = np.abs(rec_mean[:, 0] - rec_mean[:, boroughs].sum(axis=1)).max()
+    print(f"{len(series.columns)} series, {args.horizon} months, {args.method} reconciliation "
+          f"in {time.perf_counter() - start:.1f}s (max city - sum(boroughs) gap {gap:.2e}) -> {args.out}")
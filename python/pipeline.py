@@ -0,0 +1,285 @@
+"""
+STAGE RUNNER WITH MEMOIZED OUTPUTS
+
+PURPOSE
+create_schema.py used to run top to bottom: any change re-parsed both raw
+extracts and reloaded everything, and the demolition and DHS branches ran
+one after the other. This module runs a pipeline of named stages instead:
+
+    Stage("demo.filter", filter_stage, deps=["demo.read", "state"])
+
+HOW IT WORKS
+- A stage is func(*outputs of deps, **files, **params). `files` are input
+  paths (hashed by content), `params` plain values, `outputs` the files
+  the stage writes, `code` extra functions it depends on.
+- Its key hashes the stage name, the source of func and `code`, params,
+  input file contents and the content hashes of its dependencies'
+  outputs. A stage whose key matches the last run is skipped; a stage
+  that reruns and produces the same output leaves its dependents cached.
+- Outputs are pickled to <cache dir>/<stage>.pkl and recorded in
+  manifest.json (key, content hash, seconds). A cached output is only
+  unpickled when a dependent actually has to run.
+- Stages with `outputs` also rerun when one of those files was changed
+  or removed since; memo=False stages (e.g. reading the database state)
+  always run.
+- Ready stages run concurrently on a thread pool, so independent branches
+  overlap.
+- File hashes are remembered by (size, mtime) like columnar_cache.py,
+  so unchanged inputs are not re-read just to be hashed.
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from columnar_cache import file_sha256, stat_key
+
+MANIFEST_NAME = "manifest.json"
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), files=None, params=None, outputs=(), code=(), memo=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.files = dict(files or {})
+        self.params = dict(params or {})
+        self.outputs = [str(p) for p in outputs]
+        self.code = list(code)
+        self.memo = memo
+
+    @property
+    def description(self) -> str:
+        return (inspect.getdoc(self.func) or "").split("\n")[0]
+
+    def code_hash(self) -> str:
+        h = hashlib.sha256()
+        for func in [self.func] + self.code:
+            try:
+                h.update(inspect.getsource(func).encode())
+            except (OSError, TypeError):
+                h.update(getattr(func, "__qualname__", repr(func)).encode())
+        return h.hexdigest()
+
+
+# ---------------------------------------------------
+# CONTENT HASHES
+# ---------------------------------------------------
+def digest(value) -> str:
+    """Content hash of a stage output (frames hashed row-wise, containers recursively)."""
+    h = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        h.update(repr([(str(c), str(t)) for c, t in value.dtypes.items()]).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(f"{value.name}:{value.dtype}".encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        for k in sorted(value, key=str):
+            h.update(f"{k!r}={digest(value[k])};".encode())
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            h.update(f"{digest(item)};".encode())
+    else:
+        h.update(pickle.dumps(value, protocol=4))
+    return h.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------
+# RUNNER
+# ---------------------------------------------------
+class Pipeline:
+    def __init__(self, stages, cache_dir, workers=2):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            unknown = [d for d in stage.deps if d not in self.stages]
+            if unknown:
+                raise ValueError(f"{stage.name}: unknown dependencies {unknown}")
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._values = {}
+        self._digests = {}
+        self.manifest = self._read_manifest()
+
+    # -- manifest --------------------------------------------------------
+    def _read_manifest(self) -> dict:
+        try:
+            manifest = json.loads((self.cache_dir / MANIFEST_NAME).read_text())
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        manifest.setdefault("stages", {})
+        manifest.setdefault("files", {})
+        return manifest
+
+    def _save_manifest(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self.manifest, indent=1, default=str).encode()
+        _write_atomic(self.cache_dir / MANIFEST_NAME, data)
+
+    def file_hash(self, path) -> str:
+        path = str(path)
+        size, mtime_ns = stat_key(path)
+        with self._lock:
+            known = self.manifest["files"].get(path)
+        if known and known["size"] == size and known["mtime_ns"] == mtime_ns:
+            return known["sha256"]
+        sha = file_sha256(path)
+        with self._lock:
+            self.manifest["files"][path] = {"size": size, "mtime_ns": mtime_ns, "sha256": sha}
+        return sha
+
+    # -- graph -----------------------------------------------------------
+    def order(self, targets=None) -> list:
+        """Stage names in dependency order: `targets` and everything upstream (default: all)."""
+        ordered, seen = [], set()
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"dependency cycle: {' -> '.join(path + (name,))}")
+            if name in seen:
+                return
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            seen.add(name)
+            ordered.append(name)
+
+        for name in targets or self.stages:
+            if name not in self.stages:
+                raise KeyError(f"unknown stage {name!r} (stages: {', '.join(self.stages)})")
+            visit(name)
+        return ordered
+
+    # -- one stage -------------------------------------------------------
+    def key(self, stage) -> str:
+        h = hashlib.sha256()
+        h.update(stage.name.encode())
+        h.update(stage.code_hash().encode())
+        h.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+        for name, path in sorted(stage.files.items()):
+            h.update(f"{name}={self.file_hash(path)};".encode())
+        for dep in stage.deps:
+            h.update(f"{dep}={self._digests[dep]};".encode())
+        return h.hexdigest()
+
+    def _artifact(self, name) -> Path:
+        return self.cache_dir / f"{name}.pkl"
+
+    def _outputs_fresh(self, stage, entry) -> bool:
+        recorded = entry.get("outputs", {})
+        for path in stage.outputs:
+            if not os.path.exists(path) or list(stat_key(path)) != recorded.get(path):
+                return False
+        return True
+
+    def is_cached(self, stage, key) -> bool:
+        entry = self.manifest["stages"].get(stage.name)
+        return (
+            stage.memo
+            and entry is not None
+            and entry["key"] == key
+            and self._artifact(stage.name).is_file()
+            and self._outputs_fresh(stage, entry)
+        )
+
+    def value(self, name):
+        """Output of a stage that has been run or found cached (unpickled on first use)."""
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+        value = pickle.loads(self._artifact(name).read_bytes())
+        with self._lock:
+            self._values[name] = value
+        return value
+
+    def _run_stage(self, name, force) -> dict:
+        stage = self.stages[name]
+        key = self.key(stage)
+        if not force and self.is_cached(stage, key):
+            with self._lock:
+                self._digests[name] = self.manifest["stages"][name]["digest"]
+            return {"stage": name, "state": "cached", "seconds": 0.0}
+
+        args = [self.value(dep) for dep in stage.deps]
+        start = time.perf_counter()
+        value = stage.func(*args, **stage.files, **stage.params)
+        seconds = time.perf_counter() - start
+
+        entry = {"key": key, "digest": digest(value), "seconds": round(seconds, 3),
+                 "outputs": {path: list(stat_key(path)) for path in stage.outputs if os.path.exists(path)}}
+        if stage.memo:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self._artifact(name), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._values[name] = value
+            self._digests[name] = entry["digest"]
+            self.manifest["stages"][name] = entry
+        self._save_manifest()
+        return {"stage": name, "state": "ran", "seconds": seconds}
+
+    # -- whole pipeline --------------------------------------------------
+    def run(self, targets=None, force=(), log=print) -> list:
+        """
+        Run `targets` (default: every stage) and whatever they need, skipping
+        cached stages; `force` names stages to rerun regardless ("all" for
+        every stage). Returns one row per stage in completion order.
+        """
+        names = self.order(targets)
+        force = set(names) if "all" in force else set(force)
+        unknown = force - set(self.stages)
+        if unknown:
+            raise KeyError(f"unknown stages {sorted(unknown)}")
+
+        done, rows, running = set(), [], {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while len(done) < len(names):
+                for name in names:
+                    if name in done or name in running.values():
+                        continue
+                    if all(dep in done for dep in self.stages[name].deps):
+                        running[pool.submit(self._run_stage, name, name in force)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        row = future.result()
+                    except BaseException:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    done.add(name)
+                    rows.append(row)
+                    if log:
+                        timing = f"{row['seconds']:.2f}s" if row["state"] == "ran" else ""
+                        log(f"  {name:<18} {row['state']:<7} {timing}")
+        return rows
+
+    def status(self) -> pd.DataFrame:
+        """Last recorded run of every stage (no stage is run)."""
+        rows = []
+        for name in self.order():
+            stage, entry = self.stages[name], self.manifest["stages"].get(name, {})
+            rows.append({
+                "stage": name,
+                "deps": ", ".join(stage.deps),
+                "memo": stage.memo,
+                "last_seconds": entry.get("seconds"),
+                "stored": self._artifact(name).is_file(),
+                "description": stage.description,
+            })
+        return pd.DataFrame(rows).set_index("stage")
@@ -0,0 +1,243 @@
+"""
+SCHEDULED WARM-STARTED REFITS
+
+PURPOSE
+train_models.py searches orders from scratch and overwrites the files in
+deployment/data. Between searches, the deployed variants only need their
+parameters re-estimated when DHS publishes new months. This job does that
+and publishes every improvement as a new version in the model registry
+(deployment/app/model_registry.py), which the app switches to on its next
+rerun.
+
+WORKFLOW
+1. New data: the latest month in fact_shelters is compared with the data
+   each variant's serving version was fit on (the deployment/data files
+   count as fit on datedf.csv). Variants that are up to date are skipped.
+2. Frame: feature_store.feature_frame() from --start through that month,
+   split 80/20 like the app.
+3. Candidate: the serving version's spec (order, seasonal order, trend,
+   exog) refit on the train split, starting from its parameters. The
+   parameter covariance is skipped until a candidate is published. A warm
+   start that does not converge, or ends below the likelihood it started
+   from, is redone from statsmodels' default start values.
+4. Incumbent: its parameters filtered (not re-estimated) over the same
+   train split and scored on the same holdout.
+5. A candidate whose holdout RMSE is within --tolerance of the
+   incumbent's is published and activated; otherwise the incumbent stays.
+   Variants are fit in a process pool.
+
+Run it after create_schema.py --incremental (e.g. from the same cron job).
+Rollback: python ../deployment/app/model_registry.py <name> --rollback
+
+USAGE
+    python refit_models.py                      # refit variants with new months
+    python refit_models.py --force --compare-cold
+    python refit_models.py --dry-run --tolerance 0.05
+"""
+import argparse
+import json
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from artifacts import build_model, to_artifact  # noqa: E402
+from eda_queries import DB_PATH, connect  # noqa: E402
+from feature_store import START, feature_frame  # noqa: E402
+from forecasting import (  # noqa: E402
+    EXOG_COLS,
+    MODEL_NAMES,
+    REGISTRY,
+    load_data,
+    model_path,
+    rmse,
+)
+from model_registry import ModelRegistry  # noqa: E402
+from train_models import split_frame  # noqa: E402
+
+
+# ---------------------------------------------------
+# INCUMBENTS
+# ---------------------------------------------------
+def incumbent(registry, covid, affordable):
+    """(artifact, version, data_through) of the model served for this combination."""
+    name = MODEL_NAMES[(covid, affordable)]
+    version = registry.current(name)
+    if version is not None:
+        meta = registry.meta(name, version)
+        artifact = json.loads(registry.artifact_path(name, version).read_text())
+        return artifact, version, pd.Timestamp(meta["data_through"])
+
+    path = model_path(covid, affordable, None)
+    if path.suffix == ".json":
+        artifact = json.loads(path.read_text())
+    else:
+        import joblib
+        artifact = to_artifact(joblib.load(path))
+    _, exog = load_data()
+    return artifact, None, exog.index[-1]
+
+
+def latest_month(conn) -> pd.Timestamp:
+    latest = conn.execute("SELECT MAX(report_date) FROM fact_shelters").fetchone()[0]
+    return pd.Timestamp(latest).to_period("M").to_timestamp()
+
+
+# ---------------------------------------------------
+# REFIT (runs inside the process pool)
+# ---------------------------------------------------
+def _exog(frame, spec):
+    return frame[spec["exog_names"]] if spec["exog_names"] else None
+
+
+def refit(job):
+    """Warm-started refit of one variant, scored against its incumbent; never raises."""
+    name, artifact, train, test, compare_cold = job
+    spec = artifact["spec"]
+    row = {"name": name, "error": ""}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = build_model(spec, train["shelter_count"], _exog(train, spec))
+            if list(model.param_names) != artifact["param_names"]:
+                raise ValueError(f"parameters {model.param_names} do not match the incumbent's")
+            start_params = np.asarray(artifact["params"], dtype=float)
+            if compare_cold:
+                # untimed: the first fit in a worker pays one-off setup that neither timing should include
+                model.fit(start_params=start_params, cov_type="none", disp=False)
+
+            start = time.perf_counter()
+            res = model.fit(start_params=start_params, cov_type="none", disp=False)
+            warm = bool(res.mle_retvals.get("converged", False) and res.llf >= model.loglike(start_params) - 1e-6)
+            if not warm:
+                res = model.fit(cov_type="none", disp=False)
+            row["fit_s"] = time.perf_counter() - start
+
+            if compare_cold:
+                start = time.perf_counter()
+                cold = model.fit(cov_type="none", disp=False)
+                row.update(cold_s=time.perf_counter() - start, cold_llf=float(cold.llf))
+
+            held = model.filter(start_params, cov_type="none")
+            steps = len(test)
+            forecast = res.get_forecast(steps=steps, exog=_exog(test, spec)).predicted_mean
+            baseline = held.get_forecast(steps=steps, exog=_exog(test, spec)).predicted_mean
+
+        row.update(
+            params=res.params.tolist(),
+            warm_start=warm,
+            iterations=int(res.mle_retvals.get("iterations", -1)),
+            converged=bool(res.mle_retvals.get("converged", False)),
+            llf=float(res.llf),
+            rmse=rmse(test["shelter_count"].values, forecast.values),
+            incumbent_rmse=rmse(test["shelter_count"].values, baseline.values),
+        )
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def publish(registry, row, artifact, frame, train, **meta):
+    """Re-filter the accepted parameters with a covariance (for the summary) and publish."""
+    spec = artifact["spec"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = build_model(spec, train["shelter_count"], _exog(train, spec))
+        results = model.filter(np.asarray(row["params"]))
+    columns = ["shelter_count"] + list(dict.fromkeys(EXOG_COLS + spec["exog_names"]))
+    return registry.publish(
+        row["name"],
+        to_artifact(results),
+        frame[columns],
+        dict(
+            meta,
+            rmse=row["rmse"],
+            incumbent_rmse=row["incumbent_rmse"],
+            warm_start=row["warm_start"],
+            iterations=row["iterations"],
+            fit_seconds=round(row["fit_s"], 4),
+            llf=row["llf"],
+            train_through=str(train.index[-1].date()),
+        ),
+    )
+
+
+# ---------------------------------------------------
+# SCHEDULER
+# ---------------------------------------------------
+def run(db=DB_PATH, start=START, registry=REGISTRY, tolerance=0.0, force=False,
+        dry_run=False, workers=None, compare_cold=False):
+    conn = connect(db)
+    through = latest_month(conn)
+    frame = feature_frame(conn, start=start, end=str(through.date())).asfreq("MS")
+    conn.close()
+    train, test = split_frame(frame)
+
+    jobs, incumbents = [], {}
+    for (covid, affordable), name in MODEL_NAMES.items():
+        artifact, version, fit_through = incumbent(registry, covid, affordable)
+        if fit_through >= through and not force:
+            print(f"{name:<14} up to date ({version or 'deployment/data'}, through {fit_through.date()})")
+            continue
+        incumbents[name] = (artifact, version)
+        jobs.append((name, artifact, train, test, compare_cold))
+    if not jobs:
+        return []
+
+    print(f"refitting {len(jobs)} variants on {frame.index[0].date()}..{through.date()} "
+          f"(train {len(train)}, holdout {len(test)})")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(refit, jobs))
+
+    for row in rows:
+        name = row["name"]
+        artifact, version = incumbents[name]
+        if row["error"]:
+            row["action"] = "failed"
+            print(f"{name:<14} failed: {row['error']}")
+            continue
+
+        accepted = row["converged"] and row["rmse"] <= row["incumbent_rmse"] * (1 + tolerance)
+        row["action"] = "keep incumbent"
+        if accepted:
+            row["action"] = "accepted (dry run)"
+            if not dry_run:
+                new_version = publish(
+                    registry, row, artifact, frame, train,
+                    data_through=str(through.date()),
+                    window=[str(frame.index[0].date()), str(through.date())],
+                    incumbent_version=version,
+                )
+                row["action"] = f"published {new_version}"
+
+        timing = f"{1000 * row['fit_s']:.0f} ms {'warm' if row['warm_start'] else 'cold fallback'}"
+        if compare_cold:
+            timing += f" (cold {1000 * row['cold_s']:.0f} ms)"
+        print(f"{name:<14} rmse {row['rmse']:.1f} vs incumbent {row['incumbent_rmse']:.1f} "
+              f"({version or 'deployment/data'}), {timing}, {row['iterations']} iterations -> {row['action']}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--start", default=START, help="first month of the training window")
+    parser.add_argument("--registry", type=Path, default=None, help="registry root (default deployment/data/registry)")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="accept candidates up to this fraction worse than the incumbent's holdout RMSE")
+    parser.add_argument("--force", action="store_true", help="refit even without new months")
+    parser.add_argument("--dry-run", action="store_true", help="evaluate, but publish nothing")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--compare-cold", action="store_true", help="also time a cold fit per variant")
+    args = parser.parse_args()
+
+    registry = REGISTRY if args.registry is None else ModelRegistry(args.registry)
+    start = time.perf_counter()
+    run(args.db, args.start, registry, args.tolerance, args.force, args.dry_run, args.workers, args.compare_cold)
+    print(f"done in {time.perf_counter() - start:.1f}s")
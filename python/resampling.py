@@ -0,0 +1,250 @@
+"""
+PERMUTATION + BOOTSTRAP TESTS FOR THE OWNERSHIP DEMOLITION RATE
+
+PURPOSE
+eda_hypothesistest.py tests "Affordable housing has a higher demolition
+rate than For-Profit" with one asymptotic proportions z-test over the
+whole period. That approximation is shaky on small strata (a borough in
+one year can have a dozen affordable jobs), so this module adds exact
+resampling versions, per stratum and stratified.
+
+HOW IT WORKS
+Each job is a 0/1 outcome (demolition or not) in one of two groups, so a
+stratum is fully described by its 2x2 counts and both resampling schemes
+reduce to one draw per replicate instead of reshuffling every record:
+- permutation : shuffling the group labels of a stratum's N jobs (K of
+                them demolitions) puts Hypergeometric(K, N - K, n_aff)
+                demolitions in the affordable group
+- bootstrap   : resampling each group's n jobs with replacement gives
+                Binomial(n, rate) demolitions
+Replicates are drawn as (strata, replicates) arrays in batches of
+BATCH_SIZE, so 50k replicates over 35 strata is a handful of vectorized
+NumPy calls. Strata can be split across a process pool (--workers);
+every stratum gets its own seed from one SeedSequence, so results do
+not depend on the number of workers.
+
+The stratified ("all") row permutes within strata and bootstraps within
+strata, then compares the pooled rates, i.e. the overall difference
+with the strata held fixed.
+
+Results are cached in data/processed/.resampling/ under a hash of the
+counts and the test settings.
+
+USAGE
+    python resampling.py --by borough year --replicates 50000
+    python resampling.py --by covid_period --alternative two-sided --workers 4
+"""
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from eda_queries import DB_PATH, connect, ownership_rate_counts
+
+CACHE_DIR = DB_PATH.parent / ".resampling"
+CACHE_VERSION = 1
+BATCH_SIZE = 10_000
+ALTERNATIVES = ("larger", "smaller", "two-sided")
+COUNT_COLUMNS = ["aff_demolitions", "aff_jobs", "fp_demolitions", "fp_jobs"]
+
+
+# ---------------------------------------------------
+# RESAMPLING KERNELS (vectorized over strata x replicates)
+# ---------------------------------------------------
+def _rate_diff(k_aff, n_aff, k_fp, n_fp):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return k_aff / n_aff - k_fp / n_fp
+
+
+def _draw(counts, replicates, seeds, batch_size=BATCH_SIZE):
+    """
+    Permuted and bootstrapped affordable / for-profit demolition counts for
+    every stratum. Returns (perm_k_aff, boot_k_aff, boot_k_fp), each of
+    shape (strata, replicates).
+    """
+    k_aff, n_aff, k_fp, n_fp = (counts[:, i] for i in range(4))
+    k_all, n_all = k_aff + k_fp, n_aff + n_fp
+    rngs = [np.random.default_rng(s) for s in seeds]
+
+    perm = np.empty((len(counts), replicates), dtype=np.int64)
+    boot_aff = np.empty_like(perm)
+    boot_fp = np.empty_like(perm)
+    for start in range(0, replicates, batch_size):
+        size = min(batch_size, replicates - start)
+        cols = slice(start, start + size)
+        for i, rng in enumerate(rngs):
+            perm[i, cols] = rng.hypergeometric(k_all[i], n_all[i] - k_all[i], n_aff[i], size=size)
+            boot_aff[i, cols] = rng.binomial(n_aff[i], k_aff[i] / n_aff[i] if n_aff[i] else 0.0, size=size)
+            boot_fp[i, cols] = rng.binomial(n_fp[i], k_fp[i] / n_fp[i] if n_fp[i] else 0.0, size=size)
+    return perm, boot_aff, boot_fp
+
+
+def _draw_job(job):
+    return _draw(*job)
+
+
+def _p_value(observed, replicates, alternative):
+    """Permutation p-value with the +1 correction, per row of `replicates`."""
+    observed = np.asarray(observed, dtype=float)[:, None]
+    if alternative == "larger":
+        extreme = replicates >= observed - 1e-12
+    elif alternative == "smaller":
+        extreme = replicates <= observed + 1e-12
+    else:
+        extreme = np.abs(replicates) >= np.abs(observed) - 1e-12
+    return (1 + extreme.sum(axis=1)) / (1 + replicates.shape[1])
+
+
+def z_test(k_aff, n_aff, k_fp, n_fp, alternative="larger"):
+    """Pooled two-proportion z-test (as proportions_ztest), vectorized over strata."""
+    k_aff, n_aff, k_fp, n_fp = (np.asarray(x, dtype=float) for x in (k_aff, n_aff, k_fp, n_fp))
+    pooled = (k_aff + k_fp) / (n_aff + n_fp)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = _rate_diff(k_aff, n_aff, k_fp, n_fp) / np.sqrt(pooled * (1 - pooled) * (1 / n_aff + 1 / n_fp))
+    if alternative == "larger":
+        return norm.sf(z)
+    if alternative == "smaller":
+        return norm.cdf(z)
+    return 2 * norm.sf(np.abs(z))
+
+
+# ---------------------------------------------------
+# TEST
+# ---------------------------------------------------
+def resample_test(counts: pd.DataFrame, replicates=20_000, alternative="larger",
+                  confidence=0.95, seed=0, workers=None) -> pd.DataFrame:
+    """
+    Permutation p-value and bootstrap CI for rate(Affordable) - rate(For-Profit)
+    in every row (stratum) of `counts`, plus a stratified "all" row.
+    `counts` has the columns of eda_queries.ownership_rate_counts.
+    """
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f"alternative must be one of {ALTERNATIVES}")
+    if counts.index.names == [None]:
+        counts = counts.set_axis(pd.Index(["all"] * len(counts), name="stratum"))
+    data = counts[COUNT_COLUMNS].to_numpy(dtype=np.int64)
+    # strata where one group has no jobs carry no information about the difference
+    usable = (data[:, 1] > 0) & (data[:, 3] > 0)
+    seeds = np.random.SeedSequence(seed).spawn(len(data))
+
+    rows = np.flatnonzero(usable)
+    n_chunks = min(len(rows), workers or 1)
+    chunks = [c for c in np.array_split(rows, n_chunks) if len(c)] if n_chunks else []
+    jobs = [(data[c], replicates, [seeds[i] for i in c]) for c in chunks]
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            drawn = list(pool.map(_draw_job, jobs))
+    else:
+        drawn = [_draw(*job) for job in jobs]
+
+    perm = np.zeros((len(data), replicates), dtype=np.int64)
+    boot_aff = np.zeros_like(perm)
+    boot_fp = np.zeros_like(perm)
+    for c, (p, ba, bf) in zip(chunks, drawn):
+        perm[c], boot_aff[c], boot_fp[c] = p, ba, bf
+
+    k_aff, n_aff, k_fp, n_fp = (data[:, i] for i in range(4))
+    k_all = k_aff + k_fp
+    observed = _rate_diff(k_aff, n_aff, k_fp, n_fp)
+    perm_diff = _rate_diff(perm, n_aff[:, None], k_all[:, None] - perm, n_fp[:, None])
+    boot_diff = _rate_diff(boot_aff, n_aff[:, None], boot_fp, n_fp[:, None])
+
+    # stratified: resample within strata, compare the pooled rates
+    u = usable
+    pooled_obs = _rate_diff(k_aff[u].sum(), n_aff[u].sum(), k_fp[u].sum(), n_fp[u].sum())
+    pooled_perm = _rate_diff(perm[u].sum(axis=0), n_aff[u].sum(),
+                             k_all[u].sum() - perm[u].sum(axis=0), n_fp[u].sum())
+    pooled_boot = _rate_diff(boot_aff[u].sum(axis=0), n_aff[u].sum(), boot_fp[u].sum(axis=0), n_fp[u].sum())
+
+    tail = (1 - confidence) / 2
+    result = counts[COUNT_COLUMNS].copy()
+    result["aff_rate"] = k_aff / np.where(n_aff > 0, n_aff, np.nan)
+    result["fp_rate"] = k_fp / np.where(n_fp > 0, n_fp, np.nan)
+    result["rate_diff"] = observed
+    result["z_pvalue"] = z_test(k_aff, n_aff, k_fp, n_fp, alternative)
+    result["perm_pvalue"] = np.where(usable, _p_value(observed, perm_diff, alternative), np.nan)
+    result["ci_low"] = np.where(usable, np.quantile(boot_diff, tail, axis=1), np.nan)
+    result["ci_high"] = np.where(usable, np.quantile(boot_diff, 1 - tail, axis=1), np.nan)
+
+    total = data[u].sum(axis=0)
+    all_row = dict(zip(COUNT_COLUMNS, total))
+    all_row.update(
+        aff_rate=total[0] / total[1],
+        fp_rate=total[2] / total[3],
+        rate_diff=pooled_obs,
+        z_pvalue=float(z_test(*total, alternative)),
+        perm_pvalue=float(_p_value([pooled_obs], pooled_perm[None, :], alternative)[0]),
+        ci_low=float(np.quantile(pooled_boot, tail)),
+        ci_high=float(np.quantile(pooled_boot, 1 - tail)),
+    )
+    if len(result) > 1:
+        key = ("all",) * result.index.nlevels if result.index.nlevels > 1 else "all"
+        index = pd.MultiIndex.from_tuples([key], names=result.index.names) if result.index.nlevels > 1 \
+            else pd.Index([key], name=result.index.name)
+        result = pd.concat([result, pd.DataFrame([all_row], index=index)])
+    result[COUNT_COLUMNS] = result[COUNT_COLUMNS].astype(np.int64)
+    return result
+
+
+# ---------------------------------------------------
+# CACHE
+# ---------------------------------------------------
+def cache_key(counts: pd.DataFrame, **settings) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps({"version": CACHE_VERSION, **settings}, sort_keys=True, default=str).encode())
+    h.update(counts.reset_index().to_csv(index=False).encode())
+    return h.hexdigest()
+
+
+def cached_test(counts: pd.DataFrame, cache_dir=CACHE_DIR, **settings) -> pd.DataFrame:
+    """resample_test() with results stored under a hash of the counts and settings."""
+    settings = {"replicates": 20_000, "alternative": "larger", "confidence": 0.95, "seed": 0, **settings}
+    workers = settings.pop("workers", None)
+    path = Path(cache_dir) / f"{cache_key(counts, **settings)}.csv"
+    index_cols = list(range(counts.index.nlevels))
+    if path.exists():
+        return pd.read_csv(path, index_col=index_cols)
+
+    result = resample_test(counts, workers=workers, **settings)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".csv.tmp")
+    result.to_csv(tmp)
+    tmp.replace(path)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--start", default="2016-01-01")
+    parser.add_argument("--end", default="2023-01-01", help="exclusive")
+    parser.add_argument("--by", nargs="*", default=["borough"],
+                        help="strata: borough, year, covid_period, ... (none = whole period)")
+    parser.add_argument("--replicates", type=int, default=20_000)
+    parser.add_argument("--alternative", choices=ALTERNATIVES, default="larger")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    counts = ownership_rate_counts(conn, args.start, args.end, by=args.by or None)
+    conn.close()
+
+    settings = dict(replicates=args.replicates, alternative=args.alternative,
+                    confidence=args.confidence, seed=args.seed)
+    start = time.perf_counter()
+    if args.no_cache:
+        result = resample_test(counts, workers=args.workers, **settings)
+    else:
+        result = cached_test(counts, workers=args.workers, **settings)
+    with pd.option_context("display.width", 200, "display.max_rows", 500):
+        print(result.round(4).to_string())
+    print(f"\n{len(counts)} strata x {args.replicates} replicates in {time.perf_counter() - start:.2f}s")
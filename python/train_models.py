@@ -0,0 +1,273 @@
+"""
+SARIMAX ORDER + EXOG SUBSET SEARCH (TRAINING CLI)
+
+PURPOSE
+Refit the deployed SARIMAX models whenever a new month of DHS data lands,
+instead of re-running the training notebook by hand.
+
+WORKFLOW
+1. Load deployment/data/datedf.csv (shelter_count + exogenous columns,
+   generated from the database by feature_store.py).
+2. Enumerate (p,d,q)(P,D,Q,s) grids crossed with every subset of
+   covid_dummy, affordable_demo, aff_demo_lag1, aff_demo_lag2. With
+   --hints the grid is centred on the orders the ACF / PACF and
+   stationarity diagnostics of the train split suggest
+   (deployment/app/series_diagnostics.py) instead of the full default.
+3. Fit each candidate on the same 80/20 split the app uses, across a
+   process pool, with a per-fit timeout and captured convergence
+   warnings.
+4. Rank by AIC, BIC and holdout RMSE and write a leaderboard.
+5. Refit the winners and write compact artifacts:
+      sarimax_both / sarimax_covid / sarimax_aff / sarimax_none
+      (best model for each covid_dummy / affordable_demo combination
+       the app exposes) and sarimax_best (best overall).
+
+USAGE
+    python train_models.py                                  # full default grid
+    python train_models.py --p 1 --d 0 --q 0 --P 1 --D 1 --Q 0 \\
+        --exog covid_dummy affordable_demo --rank-by aic
+    python train_models.py --hints --P 1 --D 1          # diagnostics hints, seasonal part pinned
+"""
+import argparse
+import ast
+import itertools
+import signal
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "deployment" / "app"))
+
+from artifacts import save_artifact  # noqa: E402
+from columnar_cache import read_table  # noqa: E402
+from forecasting import EXOG_PATH, MODEL_DIR, MODEL_NAMES, TRAIN_RATIO  # noqa: E402
+from series_diagnostics import diagnose_all, hint_grid  # noqa: E402
+
+EXOG_CANDIDATES = ['covid_dummy', 'affordable_demo', 'aff_demo_lag1', 'aff_demo_lag2']
+ORDER_GRID = {"p": [0, 1, 2], "d": [0, 1], "q": [0, 1], "P": [0, 1], "D": [0, 1], "Q": [0, 1]}
+APP_EXOG = ['covid_dummy', 'affordable_demo']
+LEADERBOARD_PATH = MODEL_DIR / "model_search.csv"
+
+
+# ---------------------------------------------------
+# DATA
+# ---------------------------------------------------
+def load_frame(path=EXOG_PATH):
+    frame = read_table(path)
+    frame = frame.set_index("month_date").sort_index().asfreq("MS")
+    return frame.loc["2016-01-01":"2022-12-31"]
+
+
+def split_frame(frame, ratio=TRAIN_RATIO):
+    split = int(len(frame) * ratio)
+    return frame.iloc[:split], frame.iloc[split:]
+
+
+# ---------------------------------------------------
+# SEARCH SPACE
+# ---------------------------------------------------
+def order_grid(p, d, q, P, D, Q, s):
+    return [
+        ((a, b, c), (A, B, C, s))
+        for a, b, c, A, B, C in itertools.product(p, d, q, P, D, Q)
+    ]
+
+
+def order_hints(frame):
+    """order_grid() arguments around the orders the diagnostics suggest for the train split."""
+    train, _ = split_frame(frame)
+    result = diagnose_all({"shelter_count": train["shelter_count"]})["shelter_count"]
+    if result["error"]:
+        raise SystemExit(f"diagnostics failed: {result['error']}")
+    hints = hint_grid(result)
+    print(f"diagnostics suggest {tuple(result['hints']['order'])}{tuple(result['hints']['seasonal_order'])}"
+          f"{' (cached)' if result['cached'] else ''}; searching {hints}")
+    return hints
+
+
+def exog_subsets(columns):
+    return [
+        list(combo)
+        for k in range(len(columns) + 1)
+        for combo in itertools.combinations(columns, k)
+    ]
+
+
+# ---------------------------------------------------
+# SINGLE FIT (runs inside the process pool)
+# ---------------------------------------------------
+class FitTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout()
+
+
+def fit_sarimax(train, exog_cols, order, seasonal_order, enforce_stationarity=False):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(
+        train["shelter_count"],
+        exog=train[exog_cols] if exog_cols else None,
+        order=order,
+        seasonal_order=seasonal_order,
+        enforce_stationarity=enforce_stationarity,
+    )
+    return model.fit(disp=False)
+
+
+def evaluate_candidate(job):
+    """Fit one candidate and return a leaderboard row; never raises."""
+    train, test, exog_cols, order, seasonal_order, timeout, enforce_stationarity = job
+    row = {
+        "order": str(order),
+        "seasonal_order": str(seasonal_order),
+        "exog": ",".join(exog_cols) or "none",
+        "aic": np.nan,
+        "bic": np.nan,
+        "rmse": np.nan,
+        "converged": False,
+        "warnings": "",
+        "error": "",
+    }
+
+    # SIGALRM gives a hard per-fit timeout on POSIX; elsewhere fits run unbounded
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    start = time.perf_counter()
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            res = fit_sarimax(train, exog_cols, order, seasonal_order, enforce_stationarity)
+            forecast = res.get_forecast(
+                steps=len(test), exog=test[exog_cols] if exog_cols else None
+            ).predicted_mean
+
+        row.update(
+            aic=res.aic,
+            bic=res.bic,
+            rmse=float(np.sqrt(np.mean((test["shelter_count"].values - forecast.values) ** 2))),
+            converged=bool(res.mle_retvals.get("converged", False)),
+            warnings="; ".join(sorted({type(w.message).__name__ for w in caught})),
+        )
+    except FitTimeout:
+        row["error"] = f"timeout after {timeout}s"
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+# ---------------------------------------------------
+# SEARCH + RANKING
+# ---------------------------------------------------
+def search(frame, grid, subsets, workers=None, timeout=60, enforce_stationarity=False):
+    train, test = split_frame(frame)
+    jobs = [
+        (train, test, cols, order, seasonal, timeout, enforce_stationarity)
+        for cols in subsets
+        for order, seasonal in grid
+    ]
+    print(f"fitting {len(jobs)} candidates ({len(grid)} orders x {len(subsets)} exog sets)")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(evaluate_candidate, jobs, chunksize=max(1, len(jobs) // 64)))
+
+    board = pd.DataFrame(rows)
+    for metric in ("aic", "bic", "rmse"):
+        board[f"{metric}_rank"] = board[metric].rank(method="min")
+    return board
+
+
+def pick_winner(board, exog, rank_by):
+    """Best converged candidate for exactly this exog set (any fit if none converged)."""
+    rows = board[(board["exog"] == (",".join(exog) or "none")) & (board["error"] == "")]
+    if rows["converged"].any():
+        rows = rows[rows["converged"]]
+    if rows.empty:
+        return None
+    return rows.sort_values(rank_by).iloc[0]
+
+
+def write_winners(frame, board, rank_by, enforce_stationarity=False, out_dir=MODEL_DIR):
+    train, _ = split_frame(frame)
+    targets = {
+        name: [col for col, flag in zip(APP_EXOG, flags) if flag]
+        for flags, name in MODEL_NAMES.items()
+    }
+
+    written = {}
+    for name, exog in targets.items():
+        winner = pick_winner(board, exog, rank_by)
+        if winner is not None:
+            written[name] = winner
+
+    valid = board[(board["error"] == "") & board["converged"]]
+    if not valid.empty:
+        written["sarimax_best"] = valid.sort_values(rank_by).iloc[0]
+
+    for name, row in written.items():
+        exog = [] if row["exog"] == "none" else row["exog"].split(",")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            res = fit_sarimax(
+                train,
+                exog,
+                ast.literal_eval(row["order"]),
+                ast.literal_eval(row["seasonal_order"]),
+                enforce_stationarity,
+            )
+        path = save_artifact(res, out_dir / f"{name}.json")
+        print(
+            f"{name:<14} {row['order']}{row['seasonal_order']} exog={row['exog']:<40} "
+            f"aic={row['aic']:.1f} bic={row['bic']:.1f} rmse={row['rmse']:.1f} -> {path.name}"
+        )
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel SARIMAX order and exog-subset search.")
+    parser.add_argument("--data", type=Path, default=EXOG_PATH)
+    for name in ORDER_GRID:
+        parser.add_argument(f"--{name}", type=int, nargs="+", default=None,
+                            help=f"default {ORDER_GRID[name]} (or the diagnostics hint with --hints)")
+    parser.add_argument("--s", type=int, default=12)
+    parser.add_argument("--hints", action="store_true",
+                        help="search around the orders series_diagnostics.py suggests for the train split")
+    parser.add_argument("--exog", nargs="+", default=EXOG_CANDIDATES,
+                        help="exog columns to take subsets of")
+    parser.add_argument("--rank-by", choices=["aic", "bic", "rmse"], default="aic")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per fit")
+    parser.add_argument("--enforce-stationarity", action="store_true")
+    args = parser.parse_args()
+
+    frame = load_frame(args.data)
+    orders = dict(ORDER_GRID, s=args.s)
+    if args.hints:
+        orders.update(order_hints(frame))
+    orders.update({name: getattr(args, name) for name in ORDER_GRID if getattr(args, name) is not None})
+    grid = order_grid(**orders)
+    subsets = exog_subsets(args.exog)
+
+    start = time.perf_counter()
+    board = search(frame, grid, subsets, args.workers, args.timeout, args.enforce_stationarity)
+    board.sort_values(args.rank_by).to_csv(LEADERBOARD_PATH, index=False)
+    print(f"search finished in {time.perf_counter() - start:.1f}s, "
+          f"{board['converged'].sum()} converged, {(board['error'] != '').sum()} failed "
+          f"-> {LEADERBOARD_PATH.name}")
+
+    write_winners(frame, board, args.rank_by, args.enforce_stationarity)
@@ -1,20 +1,20 @@
 -- Dimension table for each ownership within demolition data
-CREATE TABLE dim_ownership (
+CREATE TABLE IF NOT EXISTS dim_ownership (
   ownership_id INTEGER PRIMARY KEY, -- Surrogate Key
   ownership_clean TEXT UNIQUE -- contains each unique construction/demolition ownership
 );
 
 
 -- Dimension  table for the job types within demolition data
-CREATE TABLE dim_jobtype (
+CREATE TABLE IF NOT EXISTS dim_jobtype (
   job_typeid TEXT PRIMARY KEY,
   job_type TEXT UNIQUE
 );
 
 -- Central fact table for demolitions
-CREATE TABLE fact_demolitions (
+CREATE TABLE IF NOT EXISTS fact_demolitions (
   month_date DATE, --contains the month and year of event
-  job_number TEXT PRIMARY KEY,
+  bin TEXT PRIMARY KEY, -- building identification number (natural key)
   job_typeid INTEGER,
   ownership_id INTEGER,
   borough TEXT,
@@ -26,9 +26,95 @@ CREATE TABLE fact_demolitions (
   FOREIGN KEY (ownership_id) REFERENCES dim_ownership(ownership_id)
 );
 
-CREATE TABLE fact_shelters (
-  report_date DATETIME,
+CREATE TABLE IF NOT EXISTS fact_shelters (
+  report_date DATETIME PRIMARY KEY, -- one DHS report per month
   shelter_count INT
-)
+);
+
+-- Every metric column of the DHS dashboard, long format (dhs_etl.py)
+CREATE TABLE IF NOT EXISTS fact_dhs_metrics (
+  report_date DATETIME,
+  metric TEXT,   -- dhs_etl.metric_name() of the dashboard column
+  value REAL,    -- counts, or percent for the rate columns
+
+  PRIMARY KEY (report_date, metric)
+);
+
+
+-- Covering index for the monthly demolition aggregations
+-- (month x job type x ownership x borough counts never touch the table)
+CREATE INDEX IF NOT EXISTS ix_fact_demolitions_month
+  ON fact_demolitions (month_date, job_typeid, ownership_id, borough);
+
+-- Natural key (and date-range index) for databases created before
+-- fact_shelters had a primary key
+CREATE UNIQUE INDEX IF NOT EXISTS ux_fact_shelters_report_date
+  ON fact_shelters (report_date);
+
+
+-- Monthly rollup of fact_demolitions (month x borough x ownership group x
+-- job type) so EDA queries aggregate a few hundred rows instead of every job.
+-- Duration sums let callers derive mean / variance without the raw rows.
+CREATE TABLE IF NOT EXISTS agg_demolitions_monthly (
+  month_date DATE,
+  borough TEXT,
+  ownership_id INTEGER,
+  job_typeid INTEGER,
+  n_jobs INTEGER,
+  total_days INTEGER,       -- SUM(time_of_completion)
+  total_sq_days INTEGER,    -- SUM(time_of_completion^2)
+  min_days INTEGER,
+  max_days INTEGER,
+
+  PRIMARY KEY (month_date, borough, ownership_id, job_typeid)
+);
+
+-- Base exogenous features per month (feature_store.py): affordable
+-- demolitions citywide and by borough, recomputed from the rollup for the
+-- months each load refreshed.
+CREATE TABLE IF NOT EXISTS feature_demolitions_monthly (
+  month_date DATE,
+  feature TEXT,   -- affordable_demo, affordable_demo_<borough>
+  value REAL,
+
+  PRIMARY KEY (month_date, feature)
+);
+
+-- Months whose facts changed since the rollup was last refreshed; filled by
+-- the triggers below and drained by db_loader.refresh_rollups().
+-- (The triggers guard with NOT EXISTS rather than INSERT OR IGNORE: an
+-- UPSERT's conflict handling overrides OR clauses inside its triggers.)
+CREATE TABLE IF NOT EXISTS agg_dirty_months (
+  month_date DATE PRIMARY KEY
+);
+
+DROP TRIGGER IF EXISTS trg_fact_demolitions_insert;
+CREATE TRIGGER trg_fact_demolitions_insert
+AFTER INSERT ON fact_demolitions
+BEGIN
+  INSERT INTO agg_dirty_months (month_date)
+  SELECT NEW.month_date WHERE NOT EXISTS (SELECT 1 FROM agg_dirty_months WHERE month_date = NEW.month_date);
+END;
+
+DROP TRIGGER IF EXISTS trg_fact_demolitions_update;
+CREATE TRIGGER trg_fact_demolitions_update
+AFTER UPDATE ON fact_demolitions
+BEGIN
+  INSERT INTO agg_dirty_months (month_date)
+  SELECT OLD.month_date WHERE NOT EXISTS (SELECT 1 FROM agg_dirty_months WHERE month_date = OLD.month_date);
+  INSERT INTO agg_dirty_months (month_date)
+  SELECT NEW.month_date WHERE NOT EXISTS (SELECT 1 FROM agg_dirty_months WHERE month_date = NEW.month_date);
+END;
 
+DROP TRIGGER IF EXISTS trg_fact_demolitions_delete;
+CREATE TRIGGER trg_fact_demolitions_delete
+AFTER DELETE ON fact_demolitions
+BEGIN
+  INSERT INTO agg_dirty_months (month_date)
+  SELECT OLD.month_date WHERE NOT EXISTS (SELECT 1 FROM agg_dirty_months WHERE month_date = OLD.month_date);
+END;
 
+-- Backfill: databases loaded before the rollup existed get every month queued
+INSERT OR IGNORE INTO agg_dirty_months (month_date)
+SELECT DISTINCT month_date FROM fact_demolitions
+WHERE NOT EXISTS (SELECT 1 FROM agg_demolitions_monthly);